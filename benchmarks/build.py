@@ -0,0 +1,243 @@
+"""End-to-end benchmark of catalog builds from synthetic OMEGA data, working offline.
+
+A synthetic PSUP `mex_omega_c_proj_ddr` source collection is generated for each number of items: a source collection
+JSON file holding OMEGA_C_PROJ records, and OMEGA_C_Channel_Proj-like NetCDF data files with swath-shaped valid-data
+masks (including data gaps), NaN-holding `tau`, `watericelin` and `icecloudindex` variables and a `reflectance` cube
+making file sizes range from about 1 MB to 30 MB. Items data files are symbolic links to a pool of distinct generated
+files, so that disk usage and generation time stay bounded at 10k items.
+
+Each run then times, in a separate process so as to report its own peak RSS, the following stages:
+
+    read        parsing and validation of the source collection file
+    footprint   NetCDF footprints extraction
+    statistics  NetCDF statistics properties extraction
+    transform   STAC items creation (footprint, statistics and season included)
+    build       complete `build_catalog` run, including save and indexes
+    save        saving of the built catalog with the fast serialization backend
+    index       spatial and properties indexes writing
+
+Timings of the instrumented pipeline stages and transformers hooks (see `labtools.metrics`) are included in the JSON
+results.
+
+Stages that cannot run in the current environment (eg: missing `pymarsseason` required by the OMEGA_C_PROJ
+transformer) are reported with their error. Data files are read from the page cache once generated.
+
+Usage:
+    $ python benchmarks/build.py
+    $ python benchmarks/build.py --n-items 100 1000 10000 --n-files 32 --output build.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import netCDF4
+import numpy as np
+
+N_ITEMS = [100, 1000, 10000]
+N_FILES = 32  # number of distinct generated NetCDF files
+N_SAMPLES = 128  # OMEGA C channel swath width, in pixels
+N_BANDS = 16  # number of `reflectance` bands, setting files sizes
+COLLECTION_ID = 'mex_omega_c_proj_ddr'
+SCHEMA_NAME = 'OMEGA_C_PROJ'
+DATA_URL = 'http://psup.ias.u-psud.fr/sitools/datastorage/user/storage/omegacubes/cubes_L3'
+DEFINITIONS_FILE = Path(__file__).parents[1] / 'data' / 'definitions' / 'ias' / 'catalog.yaml'
+
+
+def generate_netcdf(netcdf_file, rng: np.random.Generator, n_samples: int = N_SAMPLES, n_bands: int = N_BANDS) -> dict:
+    """Writes an OMEGA_C_Channel_Proj-like NetCDF file, and returns its geographic extent."""
+    n_lines = int(np.exp(rng.uniform(np.log(200), np.log(4000))))
+    south = rng.uniform(-85.0, 80.0 - n_lines * 0.0025)
+    west = rng.uniform(0.0, 355.0)
+    latitudes = np.linspace(south, south + n_lines * 0.0025, n_lines)
+    longitudes = np.linspace(west, west + rng.uniform(2.0, 8.0), n_samples)
+
+    # slanted swath of valid data, with missing lines gaps
+    rows = np.arange(n_lines)[:, None]
+    cols = np.arange(n_samples)[None, :]
+    center = n_samples / 2 + (rows / n_lines - 0.5) * n_samples * rng.uniform(-0.4, 0.4)
+    valid = np.abs(cols - center) < n_samples * rng.uniform(0.25, 0.45)
+    for _ in range(rng.integers(0, 3)):
+        gap_start = rng.integers(0, n_lines - 20)
+        valid[gap_start:gap_start + rng.integers(5, 20)] = False
+
+    with netCDF4.Dataset(netcdf_file, 'w') as nc_dataset:
+        nc_dataset.createDimension('latitude', n_lines)
+        nc_dataset.createDimension('longitude', n_samples)
+        nc_dataset.createDimension('wavelength', n_bands)
+        nc_dataset.createVariable('latitude', 'f4', ('latitude',))[:] = latitudes
+        nc_dataset.createVariable('longitude', 'f4', ('longitude',))[:] = longitudes
+        nc_dataset.createVariable('wavelength', 'f4', ('wavelength',))[:] = np.linspace(0.38, 1.05, n_bands)
+        altitude = rng.normal(-2000.0, 500.0, (n_lines, n_samples)).astype('f4')
+        nc_dataset.createVariable('altitude', 'f4', ('latitude', 'longitude'), fill_value=-9999.0)[:] = \
+            np.ma.masked_array(altitude, mask=~valid)
+        for name, scale in [('incidence_n', 90.0), ('tau', 2.0), ('watericelin', 0.1), ('icecloudindex', 1.0)]:
+            values = (rng.random((n_lines, n_samples)) * scale).astype('f4')
+            values[rng.random((n_lines, n_samples)) < 0.1] = np.nan
+            variable = nc_dataset.createVariable(name, 'f4', ('latitude', 'longitude'), fill_value=-9999.0,
+                                                 chunksizes=(min(64, n_lines), n_samples))
+            variable[:] = np.ma.masked_array(values, mask=~valid)
+        nc_dataset.createVariable('reflectance', 'f4', ('wavelength', 'latitude', 'longitude'), fill_value=-9999.0)[:] = \
+            rng.random((n_bands, n_lines, n_samples)).astype('f4')
+
+    return {
+        'westernmost_longitude': float(longitudes[0]),
+        'easternmost_longitude': float(longitudes[-1]),
+        'minimum_latitude': float(latitudes[0]),
+        'maximum_latitude': float(latitudes[-1])
+    }
+
+
+def human_file_size(size: int) -> str:
+    return f'{size / 1e6:.1f} MB' if size >= 1e6 else f'{size / 1e3:.1f} KB'
+
+
+def generate_source_collection(source_dir, n_items: int, n_files: int = N_FILES, seed: int = 0) -> Path:
+    """Generates a synthetic PSUP OMEGA_C_PROJ source collection, and returns the source collection file path."""
+    rng = np.random.default_rng(seed)
+    collection_dir = Path(source_dir) / 'mars' / COLLECTION_ID
+    data_dir = collection_dir / 'data'
+    pool_dir = collection_dir / 'pool'
+    data_dir.mkdir(parents=True, exist_ok=True)
+    pool_dir.mkdir(parents=True, exist_ok=True)
+
+    pool = []
+    for i in range(min(n_files, n_items)):
+        pool_file = pool_dir / f'cube_{i:03d}.nc'
+        extent = generate_netcdf(pool_file, rng)
+        pool.append((pool_file, extent, os.path.getsize(pool_file)))
+
+    records = []
+    start_date = datetime(2004, 1, 14)
+    for i in range(n_items):
+        orbit_number, cube_number = 18 + i // 8, i % 8
+        pool_file, extent, size = pool[i % len(pool)]
+        name = f'{orbit_number:04d}_{cube_number}'
+        data_file = data_dir / f'{name}.nc'
+        if not data_file.exists():
+            os.symlink(pool_file, data_file)
+        start = start_date + timedelta(hours=orbit_number * 7.5, minutes=cube_number * 4)
+        records.append({
+            'orbit_number': str(orbit_number),
+            'cube_number': str(cube_number),
+            'download_sav': f'{DATA_URL}/{name}.sav',
+            'sav_human_file_size': human_file_size(size),
+            'download_nc': f'{DATA_URL}/{name}.nc',
+            'nc_human_file_size': human_file_size(size),
+            'start_date': start.isoformat(timespec='milliseconds'),
+            'end_date': (start + timedelta(minutes=4)).isoformat(timespec='milliseconds'),
+            'solar_longitude': str(round((333.063 + orbit_number * 0.26) % 360, 3)),
+            'easternmost_longitude': str(round(extent['easternmost_longitude'], 3)),
+            'westernmost_longitude': str(round(extent['westernmost_longitude'], 3)),
+            'maximum_latitude': str(round(extent['maximum_latitude'], 4)),
+            'minimum_latitude': str(round(extent['minimum_latitude'], 4)),
+            'data_quality_id': str(rng.integers(0, 4))
+        })
+
+    source_collection_file = collection_dir / f'{COLLECTION_ID}.json'
+    with open(source_collection_file, 'w') as f:
+        json.dump({'collection': {'id': COLLECTION_ID, 'schema_name': SCHEMA_NAME, 'n_products': n_items}, 'products': records}, f)
+    return source_collection_file
+
+
+def timed_stage(stages: dict, name: str, n_items: int, function, *args, **kwargs):
+    """Runs a benchmark stage, recording its duration and throughput, or its error."""
+    start_time = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    except Exception as e:
+        stages[name] = {'error': f'{e.__class__.__name__}: {e}'}
+        return None
+    duration = time.perf_counter() - start_time
+    stages[name] = {'time': duration, 'items_per_second': n_items / duration if duration else None}
+    return result
+
+
+def run_benchmark(source_collection_file, stac_dir) -> dict:
+    """Runs all stages on a generated source collection, and returns their timings and the process peak RSS."""
+    from labtools import loader
+    from labtools.definitions import Definitions
+    from labtools.builder import build_catalog
+    from labtools.ias import psup
+    from labtools.ias.netcdf import get_netcdf_footprint, get_netcdf_properties
+    from labtools.index import write_collection_index
+    from labtools.serialization import read_catalog, save_catalog
+    from labtools.transformers import factory as transformer_factory
+    from labtools.metrics import metrics
+
+    metrics.enable()  # fine-grained stages and transformers hooks timings
+    stages = {}
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        loader.load_schemas(['labtools.schemas.pdssp_stac', 'labtools.ias.schemas.omega_c_proj'])
+        definitions = Definitions(yaml_file=str(DEFINITIONS_FILE))
+        collection_definition = definitions.get_collection(f'urn:pdssp:ias:collection:{COLLECTION_ID}')
+        data_path = str(Path(source_collection_file).parent)
+        data_files = [Path(data_path) / 'data' / Path(url).name for url in
+                      [record['download_nc'] for record in json.load(open(source_collection_file))['products']]]
+        n_items = len(data_files)
+
+        products = timed_stage(stages, 'read', n_items, psup.read_products_metadata, source_collection_file)
+        timed_stage(stages, 'footprint', n_items, lambda: [get_netcdf_footprint(data_file) for data_file in data_files])
+        timed_stage(stages, 'statistics', n_items, lambda: [get_netcdf_properties(data_file, SCHEMA_NAME) for data_file in data_files])
+
+        def transform():
+            transformer = transformer_factory.create_transformer(SCHEMA_NAME)
+            return [transformer.create_stac_item(product, definition=collection_definition, collection_id=COLLECTION_ID,
+                                                 data_path=data_path) for product in products]
+        timed_stage(stages, 'transform', n_items, transform)
+
+        timed_stage(stages, 'build', n_items, build_catalog, definitions, [source_collection_file], stac_dir)
+        if 'error' not in stages['build']:
+            root_stac_catalog = read_catalog(stac_dir)
+            stac_collections = list(root_stac_catalog.get_all_collections())
+            for stac_collection in stac_collections:
+                list(stac_collection.get_items())  # resolve items before timing
+            timed_stage(stages, 'save', n_items, save_catalog, root_stac_catalog)
+            timed_stage(stages, 'index', n_items, lambda: [write_collection_index(stac_collection) for stac_collection in stac_collections])
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {'stages': stages, 'peak_rss': peak_rss, 'metrics': metrics.to_dict()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark catalog builds from synthetic OMEGA data.')
+    parser.add_argument('--n-items', type=int, nargs='+', default=N_ITEMS)
+    parser.add_argument('--n-files', type=int, default=N_FILES, help='Number of distinct generated NetCDF files.')
+    parser.add_argument('--work-dir', default=None, help='Working directory for generated data and built catalogs.')
+    parser.add_argument('--output', default=None, help='Output JSON results file.')
+    args = parser.parse_args()
+
+    results = []
+    stage_names = ['read', 'footprint', 'statistics', 'transform', 'build', 'save', 'index']
+    print(f'{"n_items":>8} {"peak RSS (MB)":>14} ' + ' '.join(f'{name:>10}' for name in stage_names) + '   (items/s)')
+    for n_items in args.n_items:
+        with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+            source_collection_file = generate_source_collection(Path(work_dir) / 'source', n_items, n_files=args.n_files)
+            # run in a fresh process, so that peak RSS is the run's own
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(run_benchmark, source_collection_file, Path(work_dir) / 'stac').result()
+        result.update({'n_items': n_items, 'n_files': min(args.n_files, n_items)})
+        results.append(result)
+
+        throughputs = [result['stages'].get(name, {}).get('items_per_second') for name in stage_names]
+        print(f'{n_items:>8} {result["peak_rss"] / 1e6:>14.1f} ' +
+              ' '.join(f'{throughput:>10.1f}' if throughput else f'{"-":>10}' for throughput in throughputs))
+        for name, stage in result['stages'].items():
+            if 'error' in stage:
+                print(f'    {name}: {stage["error"]}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
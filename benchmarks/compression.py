@@ -0,0 +1,107 @@
+"""Benchmark of catalog files compression: output size and write throughput.
+
+A synthetic collection of OMEGA-like items is saved uncompressed, gzip and Zstandard compressed with
+`serialization.save_catalog`, then read back with `serialization.read_catalog`.
+
+Usage:
+    $ python benchmarks/compression.py
+    $ python benchmarks/compression.py --n-items 1000 10000 --output compression.json
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pystac
+
+from labtools.builder import create_layout
+from labtools.serialization import save_catalog, read_catalog, zstandard
+
+N_ITEMS = [1000, 10000]
+
+
+def create_catalog(n_items: int) -> pystac.Catalog:
+    root_stac_catalog = pystac.Catalog('urn:pdssp:ias:catalog', 'Benchmark catalog')
+    extent = pystac.Extent(pystac.SpatialExtent([[-180, -90, 180, 90]]), pystac.TemporalExtent([[datetime(2004, 1, 1), None]]))
+    stac_collection = pystac.Collection('urn:pdssp:ias:collection:benchmark', 'Benchmark collection', extent)
+    root_stac_catalog.add_child(stac_collection)
+    for i in range(n_items):
+        lon = (i * 7.3) % 360 - 180
+        lat = (i * 3.1) % 160 - 80
+        geometry = {'type': 'Polygon', 'coordinates': [[[lon, lat], [lon + 2, lat], [lon + 2, lat + 8], [lon, lat + 8], [lon, lat]]]}
+        properties = {
+            'start_datetime': (datetime(2004, 1, 1) + timedelta(hours=i)).isoformat() + 'Z',
+            'end_datetime': (datetime(2004, 1, 1) + timedelta(hours=i, minutes=5)).isoformat() + 'Z',
+            'mission': 'Mars Express', 'platform': 'MEX', 'instruments': ['OMEGA'], 'ssys:targets': ['Mars'],
+            'orbit_number': i // 8, 'cube_number': i % 8, 'solar_longitude': (i * 0.37) % 360, 'martian_year': 27,
+            'incidence_angle': 30 + (i % 40) / 2
+        }
+        stac_item = pystac.Item(f'ORB{i // 8:05d}_{i % 8}', geometry, [lon, lat, lon + 2, lat + 8], None, properties)
+        stac_item.add_asset('nc_data_file', pystac.Asset(f'http://psup.ias.u-psud.fr/ds/omega/cubes/ORB{i // 8:05d}_{i % 8}.nc',
+                                                         title='OMEGA data cube NetCDF file', media_type='application/x-netcdf',
+                                                         roles=['data']))
+        stac_collection.add_item(stac_item)
+    return root_stac_catalog
+
+
+def directory_size(directory) -> int:
+    return sum(os.path.getsize(os.path.join(dirpath, name)) for dirpath, _, names in os.walk(directory) for name in names)
+
+
+def benchmark_compression(n_items: int, compression, work_dir: Path) -> dict:
+    root_stac_catalog = create_catalog(n_items)
+    root_stac_catalog.normalize_hrefs(str(work_dir), strategy=create_layout(compression=compression))
+
+    start_time = time.perf_counter()
+    n_files = save_catalog(root_stac_catalog)
+    write_time = time.perf_counter() - start_time
+    size = directory_size(work_dir)
+
+    start_time = time.perf_counter()
+    n_read_items = sum(1 for _ in read_catalog(work_dir).get_all_items())
+    read_time = time.perf_counter() - start_time
+    assert n_read_items == n_items
+
+    return {
+        'n_items': n_items,
+        'compression': compression or 'none',
+        'n_files': n_files,
+        'size': size,
+        'write_time': write_time,
+        'write_items_per_second': n_items / write_time,
+        'write_mb_per_second': size / write_time / 1e6,
+        'read_time': read_time,
+        'read_items_per_second': n_items / read_time
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark catalog files compression.')
+    parser.add_argument('--n-items', type=int, nargs='+', default=N_ITEMS)
+    parser.add_argument('--output', default=None, help='Output JSON results file.')
+    args = parser.parse_args()
+
+    compressions = [None, 'gzip'] + (['zstd'] if zstandard is not None else [])
+    results = []
+    print(f'{"n_items":>8} {"compression":<12} {"size (MB)":>10} {"ratio":>6} {"write (s)":>10} {"items/s":>9} {"read (s)":>9}')
+    for n_items in args.n_items:
+        uncompressed_size = None
+        for compression in compressions:
+            with tempfile.TemporaryDirectory() as work_dir:
+                result = benchmark_compression(n_items, compression, Path(work_dir))
+            uncompressed_size = uncompressed_size or result['size']
+            result['ratio'] = uncompressed_size / result['size']
+            results.append(result)
+            print(f'{n_items:>8} {result["compression"]:<12} {result["size"] / 1e6:>10.2f} {result["ratio"]:>6.1f} '
+                  f'{result["write_time"]:>10.2f} {result["write_items_per_second"]:>9.0f} {result["read_time"]:>9.2f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
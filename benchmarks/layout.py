@@ -0,0 +1,106 @@
+"""Benchmark of directory operations on flat and sharded catalog layouts.
+
+For each number of items, small item JSON files are written following the default flat `Layout` and the
+`ShardedLayout` strategies, then the following operations are timed: items creation, listing of the collection
+directory, full recursive walk (as rsync or static file servers do), random item lookups, and removal.
+
+Usage:
+    $ python benchmarks/layout.py
+    $ python benchmarks/layout.py --n-items 10000 50000 100000 --output layout.json
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import pystac
+
+from labtools.builder import layout, ShardedLayout
+
+N_ITEMS = [10000, 50000, 100000]
+N_LOOKUPS = 1000
+
+
+def create_items(n_items: int):
+    geometry = {'type': 'Point', 'coordinates': [0.0, 0.0]}
+    items = []
+    for i in range(n_items):
+        properties = {'orbit_number': i // 8, 'martian_year': 26 + i * 6 // n_items}
+        items.append(pystac.Item(f'ORB{i // 8:05d}_{i % 8}', geometry, [0.0, 0.0, 0.0, 0.0], datetime(2005, 1, 1), properties))
+    return items
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+
+def write_items(hrefs):
+    for href in hrefs:
+        os.makedirs(os.path.dirname(href), exist_ok=True)
+        with open(href, 'w') as f:
+            f.write('{}')
+
+
+def walk_count(directory) -> int:
+    return sum(len(files) for _, _, files in os.walk(directory))
+
+
+def lookup(hrefs):
+    for href in hrefs:
+        os.stat(href)
+
+
+def benchmark_layout(items, layout_strategy, work_dir: Path) -> dict:
+    collection_dir = work_dir / 'collection'
+    hrefs = [layout_strategy.get_item_href(item, str(collection_dir)) for item in items]
+    lookup_hrefs = random.Random(0).sample(hrefs, min(N_LOOKUPS, len(hrefs)))
+    results = {}
+    results['create'], _ = timed(write_items, hrefs)
+    results['list'], entries = timed(os.listdir, collection_dir)
+    results['walk'], n_files = timed(walk_count, collection_dir)
+    results['lookup'], _ = timed(lookup, lookup_hrefs)
+    results['remove'], _ = timed(shutil.rmtree, collection_dir)
+    results['n_top_level_entries'] = len(entries)
+    assert n_files == len(items)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark flat and sharded catalog layouts directory operations.')
+    parser.add_argument('--n-items', type=int, nargs='+', default=N_ITEMS)
+    parser.add_argument('--work-dir', default=None, help='Working directory, on the file system to benchmark.')
+    parser.add_argument('--output', default=None, help='Output JSON results file.')
+    args = parser.parse_args()
+
+    layouts = {
+        'flat': layout,
+        'hash': ShardedLayout('hash'),
+        'orbit': ShardedLayout('orbit'),
+        'martian_year': ShardedLayout('martian_year')
+    }
+    results = []
+    print(f'{"n_items":>8} {"layout":<13} {"entries":>8} {"create":>8} {"list":>8} {"walk":>8} {"lookup":>8} {"remove":>8}')
+    for n_items in args.n_items:
+        items = create_items(n_items)
+        for name, layout_strategy in layouts.items():
+            with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+                result = benchmark_layout(items, layout_strategy, Path(work_dir))
+            result.update({'n_items': n_items, 'layout': name})
+            results.append(result)
+            print(f'{n_items:>8} {name:<13} {result["n_top_level_entries"]:>8} {result["create"]:>8.2f} '
+                  f'{result["list"]:>8.4f} {result["walk"]:>8.2f} {result["lookup"]:>8.4f} {result["remove"]:>8.2f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
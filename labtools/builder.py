@@ -1,11 +1,28 @@
 """STAC catalog builder"""
 import pystac
+import hashlib
+import json
+import os
 import shutil
+import time
+from itertools import islice
 from pathlib import Path
 
+from labtools import loader
 from labtools.transformers import factory as transformer_factory
 from labtools.definitions import Definitions, CatalogDefinition, get_urn_id
 from labtools.ias import psup as psup
+from labtools.index import write_collection_index
+from labtools.export import ParquetItemsWriter
+from labtools.feeds import NDJSONFeedWriter
+from labtools.serialization import save_catalog, read_catalog, CatalogWriter, COMPRESSION_SUFFIXES
+from labtools.summaries import CollectionAggregator
+from labtools.coverage import CoverageAccumulator, PIXELS_PER_DEGREE
+from labtools.metrics import metrics
+from labtools.buildlog import BuildLogWriter, read_build_log, STATUS_CREATED, STATUS_FAILED, STATUS_SKIPPED
+from labtools.quarantine import Quarantine
+from labtools.scheduling import Scheduler, Task, TaskTimeoutError
+from labtools.memory import MemoryBudget, format_memory_size, get_peak_rss, get_rss
 
 def create_stac_catalog(catalog_definition: CatalogDefinition) -> pystac.Catalog:
     return pystac.Catalog(
@@ -94,71 +111,720 @@ class Layout(BestPracticesLayoutStrategy):
 
 layout = Layout()
 
-def build_catalog(definitions, source_collections_files, stac_dir, item_start=0, n_max_items=None):
+SHARD_KEYS = ['hash', 'orbit', 'martian_year']
+HASH_PREFIX_LENGTH = 2  # number of hexadecimal digits of item ID hash shards names (256 shards)
+ORBIT_RANGE = 500  # number of orbits per orbit shard
+N_WORKERS = 1  # number of worker processes transforming source products
+PARTITION_METHODS = ['range', 'hash']  # ways of splitting source products into disjoint partitions
+PARTITION_FILE_NAME = 'partition.json'  # partition description, written at the root of a partitioned build STAC catalog
+
+class ShardedLayout(Layout):
+    """Custom layout bucketing items into shard sub-directories of their collection directory, by item ID hash
+    prefix, orbit number range or Martian year, eg:
+
+        mex_omega_c_proj_ddr/orbit_00500-00999/ORB0512_3/ORB0512_3.json
+
+    Items missing the `orbit_number` or `martian_year` property are bucketed by item ID hash prefix.
+    """
+    def __init__(self, shard_by: str = 'hash', hash_prefix_length: int = HASH_PREFIX_LENGTH, orbit_range: int = ORBIT_RANGE):
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f'Invalid shard key: {shard_by!r}. Expected one of: {SHARD_KEYS}.')
+        super().__init__()
+        self.shard_by = shard_by
+        self.hash_prefix_length = hash_prefix_length
+        self.orbit_range = orbit_range
+
+    def get_shard_name(self, item: pystac.Item) -> str:
+        try:
+            if self.shard_by == 'orbit' and item.properties.get('orbit_number') is not None:
+                first_orbit = int(item.properties['orbit_number']) // self.orbit_range * self.orbit_range
+                return f'orbit_{first_orbit:05d}-{first_orbit + self.orbit_range - 1:05d}'
+            elif self.shard_by == 'martian_year' and item.properties.get('martian_year') is not None:
+                return f'my_{int(float(item.properties["martian_year"])):02d}'
+        except ValueError:
+            pass
+        return hashlib.md5(item.id.encode('utf-8')).hexdigest()[:self.hash_prefix_length]
+
+    def get_item_href(self, item, parent_dir: str) -> str:
+        parsed_parent_dir = safe_urlparse(parent_dir)
+        join_type = JoinType.from_parsed_uri(parsed_parent_dir)
+
+        item_root = join_path_or_url(join_type, parent_dir, self.get_shard_name(item), "{}".format(item.id))
+        return join_path_or_url(join_type, item_root, "{}.json".format(item.id))
+
+
+class CompressedLayout(Layout):
+    """Custom layout appending a compression suffix (eg: `.json.gz`) to the hrefs of another layout, so that catalog
+    files are written compressed and links point to compressed files.
+    """
+    def __init__(self, layout_strategy: Layout, compression: str = 'gzip'):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f'Invalid compression: {compression!r}. Expected one of: {list(COMPRESSION_SUFFIXES)}.')
+        super().__init__()
+        self.layout_strategy = layout_strategy
+        self.suffix = COMPRESSION_SUFFIXES[compression]
+
+    def get_catalog_href(self, cat, parent_dir: str, is_root: bool) -> str:
+        return self.layout_strategy.get_catalog_href(cat, parent_dir, is_root) + self.suffix
+
+    def get_collection_href(self, col, parent_dir, is_root) -> str:
+        return self.layout_strategy.get_collection_href(col, parent_dir, is_root) + self.suffix
+
+    def get_item_href(self, item, parent_dir: str) -> str:
+        return self.layout_strategy.get_item_href(item, parent_dir) + self.suffix
+
+
+def create_layout(shard_by: str = None, compression: str = None) -> Layout:
+    """Returns the catalog layout strategy, sharding items directories if `shard_by` is set, and compressing catalog
+    files if `compression` is set ('gzip' or 'zstd').
+    """
+    layout_strategy = ShardedLayout(shard_by=shard_by) if shard_by else layout
+    if compression:
+        layout_strategy = CompressedLayout(layout_strategy, compression=compression)
+    return layout_strategy
+
+
+def migrate_catalog(stac_dir, layout_strategy: Layout) -> int:
+    """Moves the files of an existing STAC catalog according to a new layout strategy, eg: from the flat default
+    layout to a sharded layout or back, or from uncompressed to compressed files, updating all links, and returns the
+    number of moved files.
+
+    Files are written to their new location before old files and emptied directories are removed, and collections
+    spatial indexes are rewritten.
+    """
+    def get_hrefs(stac_catalog: pystac.Catalog) -> set:
+        hrefs = {stac_catalog.get_self_href()}
+        hrefs.update(item.get_self_href() for item in stac_catalog.get_items())
+        for child in stac_catalog.get_children():
+            hrefs.update(get_hrefs(child))
+        return hrefs
 
     stac_dir = Path(stac_dir)
-    if stac_dir.exists():
-        shutil.rmtree(stac_dir)
+    root_stac_catalog = read_catalog(stac_dir)
+    old_hrefs = get_hrefs(root_stac_catalog)
 
-    # create destination skeleton STAC catalog from catalog definitions
-    root_stac_catalog = create_root_catalog(definitions)
+    root_stac_catalog.normalize_hrefs(str(stac_dir), strategy=layout_strategy)
+    save_catalog(root_stac_catalog, catalog_type=pystac.CatalogType.SELF_CONTAINED)
+    new_hrefs = get_hrefs(root_stac_catalog)
+
+    moved_hrefs = old_hrefs - new_hrefs
+    for href in moved_hrefs:
+        os.remove(href)
+        # remove emptied item and shard directories
+        directory = Path(href).parent
+        while directory != stac_dir and directory.exists() and not any(directory.iterdir()):
+            directory.rmdir()
+            directory = directory.parent
+
+    for stac_collection in root_stac_catalog.get_all_collections():
+        write_collection_index(stac_collection)
+
+    return len(moved_hrefs)
+
+
+def get_product_id(transformer, product_metadata) -> str:
+    """Returns the STAC item ID of a source product, or its string representation if it cannot be derived."""
+    try:
+        return transformer.get_item_id(product_metadata)
+    except Exception:
+        return str(product_metadata)[:200]
+
+
+def get_data_path(source_collection_file, urn_collection_id: str) -> str:
+    """Returns the directory of the data files of a source collection."""
+    data_path = str(Path(source_collection_file).parent)
+    if urn_collection_id == 'urn:pdssp:ias:collection:mex_omega_cubes_rdr':  # temporary patch
+        # data_path = '/Users/nmanaud/workspace/pdssp/data/ias/source/mars/mex_omega_c_proj_ddr'
+        data_path = '/Volumes/Data/pdssp/psup/source/mars/mex_omega_c_proj_ddr'
+    return data_path
+
+
+def slice_products(products: list, item_start: int = 0, n_max_items: int = None) -> list:
+    """Returns the `n_max_items` source products starting at `item_start`, or all following products if not set."""
+    if n_max_items and not item_start:
+        products = products[0:n_max_items]
+    elif n_max_items and item_start:
+        products = products[item_start:item_start+n_max_items]
+    elif not n_max_items and item_start:
+        products = products[item_start:]
+    return products
+
+
+def get_partition_bucket(item_id: str, n_partitions: int) -> int:
+    """Returns the hash bucket of an item ID, stable across runs, machines and source products order."""
+    return int(hashlib.md5(item_id.encode('utf-8')).hexdigest(), 16) % n_partitions
+
+
+def check_partition(partition: tuple, partition_by: str) -> None:
+    k, n_partitions = partition
+    if partition_by not in PARTITION_METHODS:
+        raise ValueError(f'Invalid partition method: {partition_by!r}. Expected one of: {PARTITION_METHODS}.')
+    if not 0 <= k < n_partitions:
+        raise ValueError(f'Invalid partition: {k}/{n_partitions}.')
+
+
+def select_partition(transformer, indexed_products: list, partition: tuple, partition_by: str = 'range') -> list:
+    """Returns the `(index, product_metadata)` source products of partition `(k, n)`, that is the k-th (0-based) of n
+    contiguous ranges of products, or the products whose item ID falls in the k-th of n hash buckets.
+    """
+    check_partition(partition, partition_by)
+    k, n_partitions = partition
+    if partition_by == 'hash':
+        return [(index, product_metadata) for index, product_metadata in indexed_products
+                if get_partition_bucket(get_product_id(transformer, product_metadata), n_partitions) == k]
+    n_products = len(indexed_products)
+    return indexed_products[k * n_products // n_partitions:(k + 1) * n_products // n_partitions]
+
+
+class CollectionBuilder:
+    """Builds the STAC collection of a source collection file, added to its parent catalog of the skeleton STAC
+    catalog. Created items are added to the collection, collection extent, summaries, coverage map and exports as
+    they are created, and failed products to the quarantine list.
+    """
 
-    for source_collection_file in source_collections_files:
-        stac_collection = None  # to free memory (test)
-        n_items = 0
+    def __init__(self, definitions, source_collection_file, root_stac_catalog, stac_dir, layout_strategy=layout, parquet=False,
+                 feeds=False, coverage=False, coverage_resolution=PIXELS_PER_DEGREE, log_writer=None, quarantine=None):
+        self.source_collection_file = source_collection_file
+        self.layout_strategy = layout_strategy
+        self.log_writer = log_writer
+        self.quarantine = quarantine
 
         # create STAC collection corresponding to input collection ID and add to STAC catalog
         source_collection_metadata = psup.read_collection_metadata(source_collection_file)
-        collection_id = source_collection_metadata.id
-        urn_collection_id = f'urn:pdssp:ias:collection:{collection_id}'  # temporary patch
-        print(f'creating and adding STAC collection: {urn_collection_id}.')
-        transformer = transformer_factory.create_transformer(source_collection_metadata.schema_name)
-        collection_definition = definitions.get_collection(urn_collection_id)
-        stac_collection = transformer.create_stac_collection(source_collection_metadata, definition=collection_definition)
-
-        # read product metadata from source collection file
-        data_path = str(Path(source_collection_file).parent)
-        if urn_collection_id == 'urn:pdssp:ias:collection:mex_omega_cubes_rdr':  # temporary patch
-            # data_path = '/Users/nmanaud/workspace/pdssp/data/ias/source/mars/mex_omega_c_proj_ddr'
-            data_path = '/Volumes/Data/pdssp/psup/source/mars/mex_omega_c_proj_ddr'
-        products = psup.read_products_metadata(source_collection_file)
-        if n_max_items and not item_start:
-            products = products[0:n_max_items]
-        elif n_max_items and item_start:
-            products = products[item_start:item_start+n_max_items]
-        elif not n_max_items and item_start:
-            products = products[item_start:]
-
-        for product_metadata in products:
-            n_items += 1
-            if urn_collection_id == 'urn:pdssp:ias:collection:mex_omega_cubes_rdr':
-                product_id = Path(product_metadata.download_nc).name
-                data_file = Path(data_path) / Path('data/' + product_id)
-                if not data_file.exists():
-                    print(f'No corresponding OMEGA_C_PROJ NetCDF file for {product_id}: {data_file}.')
+        self.collection_id = source_collection_metadata.id
+        self.urn_collection_id = f'urn:pdssp:ias:collection:{self.collection_id}'  # temporary patch
+        print(f'creating and adding STAC collection: {self.urn_collection_id}.')
+        self.schema_name = source_collection_metadata.schema_name
+        self.transformer = transformer_factory.create_transformer(self.schema_name)
+        self.collection_definition = definitions.get_collection(self.urn_collection_id)
+        self.stac_collection = self.transformer.create_stac_collection(source_collection_metadata, definition=self.collection_definition)
+
+        # add collection to its parent catalog, setting its href, so that items hrefs are set as they are added
+        stac_catalog = root_stac_catalog.get_child(get_urn_id(self.collection_definition.path))
+        stac_catalog.add_child(self.stac_collection, strategy=layout_strategy)
+        self.collection_dir = os.path.dirname(self.stac_collection.get_self_href())
+        self.data_path = get_data_path(source_collection_file, self.urn_collection_id)
+
+        # collection extent and summaries, aggregated as items are created
+        self.aggregator = CollectionAggregator()
+        self.item_indexes = {}  # source product index of items, by item ID, if not added in source order
+
+        # collection coverage count map, rasterized from items footprints
+        self.coverage_accumulator = None
+        if coverage:
+            self.coverage_accumulator = CoverageAccumulator(pixels_per_degree=coverage_resolution)
+
+        # export collection items to GeoParquet, by row groups written along the build
+        self.parquet_writer = None
+        if parquet:
+            self.parquet_writer = ParquetItemsWriter(Path(stac_dir) / 'parquet' / f'{self.collection_id}.parquet')
+
+        # write collection items NDJSON feed, for bulk loading to a catalog server
+        self.feed_writer = None
+        if feeds:
+            self.feed_writer = NDJSONFeedWriter(Path(stac_dir) / 'feeds' / self.collection_id, self.collection_id)
+
+    def read_products(self, item_start: int = 0, n_max_items: int = None, partition: tuple = None, partition_by: str = 'range') -> list:
+        """Reads source products metadata from the source collection file, and returns the selected ones as
+        `(index, product_metadata)` tuples, `index` being the position of the product in the source collection file.
+        """
+        with metrics.timer('build.read'):
+            products = psup.read_products_metadata(self.source_collection_file)
+        item_start = item_start or 0
+        products = slice_products(products, item_start=item_start, n_max_items=n_max_items)
+        indexed_products = list(enumerate(products, start=item_start))
+        if partition:
+            indexed_products = select_partition(self.transformer, indexed_products, partition, partition_by=partition_by)
+        return indexed_products
+
+    def iter_products(self, item_start: int = 0, n_max_items: int = None, partition: tuple = None, partition_by: str = 'range'):
+        """Yields the same `(index, product_metadata)` tuples as `read_products`, parsing products from the source
+        collection file one at a time instead of loading them all.
+        """
+        item_start = item_start or 0
+        item_stop = item_start + n_max_items if n_max_items else None
+        if partition:
+            check_partition(partition, partition_by)
+        if partition and partition_by == 'range':  # count products to derive the partition range
+            n_source_products = sum(1 for key, _ in psup.iter_source_collection(self.source_collection_file) if key == 'products')
+            n_products = len(range(n_source_products)[item_start:item_stop])
+            k, n_partitions = partition
+            item_start, item_stop = item_start + k * n_products // n_partitions, item_start + (k + 1) * n_products // n_partitions
+        products = islice(enumerate(psup.iter_products_metadata(self.source_collection_file)), item_start, item_stop)
+        for index, product_metadata in products:
+            if partition and partition_by == 'hash' and \
+                    get_partition_bucket(get_product_id(self.transformer, product_metadata), partition[1]) != partition[0]:
+                continue
+            yield index, product_metadata
+
+    def get_skip_reason(self, product_metadata) -> str:
+        """Returns why a source product cannot be transformed yet, if so (eg: missing data file), or None."""
+        if self.urn_collection_id == 'urn:pdssp:ias:collection:mex_omega_cubes_rdr':
+            product_id = Path(product_metadata.download_nc).name
+            data_file = Path(self.data_path) / Path('data/' + product_id)
+            if not data_file.exists():
+                print(f'No corresponding OMEGA_C_PROJ NetCDF file for {product_id}: {data_file}.')
+                return f'No OMEGA_C_PROJ NetCDF file: {data_file}'
+        return None
+
+    def new_record(self, index: int, product_metadata) -> dict:
+        """Returns the build record of a source product, or None if no build log is written."""
+        if not self.log_writer:
+            return None
+        record = {'collection': self.collection_id, 'id': get_product_id(self.transformer, product_metadata),
+                  'index': index, 'status': STATUS_CREATED}
+        record['input_size'] = psup.get_product_size(product_metadata, self.data_path)
+        return record
+
+    def write_record(self, record: dict, duration: float = None, stages: dict = None) -> None:
+        if record is None:
+            return
+        record['time'] = time.time()
+        if duration is not None:
+            record.update({'duration': duration, 'stages': stages or {}})
+        self.log_writer.write(record)
+
+    def create_item(self, product_metadata) -> pystac.Item:
+        with metrics.timer('build.transform'):
+            return self.transformer.create_stac_item(product_metadata, definition=self.collection_definition,
+                                                     collection_id=self.collection_id, data_path=self.data_path)
+
+    def add_item(self, stac_item: pystac.Item, index: int = None) -> None:
+        """Adds a created STAC item to the collection, setting its href, and to extent, summaries, coverage and exports.
+        The source product `index` is required if items are not added in source order (eg: by a parallel build).
+        """
+        # set item href first, so that the root catalog caches the item by href, and releases it with `release_item`
+        stac_item.set_self_href(self.layout_strategy.get_href(stac_item, self.collection_dir))
+        self.stac_collection.add_item(stac_item, strategy=self.layout_strategy)
+        if index is not None:
+            self.item_indexes[stac_item.id] = index
+        with metrics.timer('build.aggregate'):
+            self.aggregator.update(stac_item)
+        if self.coverage_accumulator:
+            with metrics.timer('build.coverage'):
+                self.coverage_accumulator.update(stac_item)
+        if self.parquet_writer:
+            with metrics.timer('build.parquet'):
+                self.parquet_writer.write_item(stac_item)
+        if self.feed_writer:
+            with metrics.timer('build.feeds'):
+                self.feed_writer.write_item(stac_item)
+        metrics.count('items.created')
+
+    def add_skipped(self, record: dict, reason: str) -> None:
+        metrics.count('items.skipped')
+        if record is not None:
+            record.update({'status': STATUS_SKIPPED, 'error': reason})
+            self.write_record(record)
+
+    def add_failure(self, index: int, product_metadata, error: Exception, record: dict = None) -> None:
+        """Reports a source product that could not be transformed, and adds it to the quarantine list."""
+        metrics.count('items.failed')
+        print(error)
+        if self.quarantine is not None:
+            self.quarantine.add(self.collection_id, index, get_product_id(self.transformer, product_metadata),
+                                self.source_collection_file, error)
+        if record is not None:  # details are recorded in the build log
+            print(f'WARNING: Source product {record["id"]!r} could not be transformed; not added to collection.')
+            record.update({'status': STATUS_FAILED, 'error_class': error.__class__.__name__, 'error': str(error)})
+        else:
+            print(f'WARNING: The following source product could not be transformed; not added to collection:')
+            print(product_metadata)
+
+    def process_product(self, index: int, product_metadata) -> pystac.Item:
+        """Transforms a source product at position `index` of the source collection file, and adds the created item to
+        the collection. Returns the created item, or None if skipped or failed.
+        """
+        record = self.new_record(index, product_metadata)
+        if record is not None:
+            metrics.start_span()
+            start_time = time.perf_counter()
+        skip_reason = self.get_skip_reason(product_metadata)
+        if skip_reason:
+            if record is not None:
+                metrics.end_span()
+            self.add_skipped(record, skip_reason)
+            return None
+        stac_item = None
+        try:
+            stac_item = self.create_item(product_metadata)
+            self.add_item(stac_item)
+        except Exception as e:
+            stac_item = None
+            self.add_failure(index, product_metadata, e, record)
+        if record is not None:
+            self.write_record(record, duration=time.perf_counter() - start_time, stages=metrics.end_span())
+        return stac_item
+
+    def release_item(self, stac_item: pystac.Item) -> None:
+        """Replaces the link to a written item by its href, and removes it from the root catalog resolved objects, so
+        that the item can be freed.
+        """
+        item_href = stac_item.get_self_href()
+        stac_item.set_root(None)
+        for link in reversed(self.stac_collection.links):  # added last
+            if link.rel == 'item' and link.is_resolved() and link.target is stac_item:
+                link.target = item_href
+                break
+
+    def sort_item_links(self) -> None:
+        """Orders the item links of the collection by source product index, rather than by completion order."""
+        if not self.item_indexes:
+            return
+        item_links = sorted(self.stac_collection.get_links('item'), key=lambda link: self.item_indexes.get(link.target.id, 0))
+        self.stac_collection.links = [link for link in self.stac_collection.links if link.rel != 'item'] + item_links
+
+    def close(self) -> pystac.Collection:
+        """Closes exports, writes the coverage map, and sets the collection extent and summaries."""
+        self.sort_item_links()
+        if self.parquet_writer:
+            self.parquet_writer.close()
+            print(f'exported {self.parquet_writer.n_items} items to: {self.parquet_writer.parquet_file}')
+        if self.feed_writer:
+            self.feed_writer.close()
+            print(f'written {self.feed_writer.n_items} items to {len(self.feed_writer.chunk_files)} feed files in: {self.feed_writer.feed_dir}')
+
+        if self.coverage_accumulator:
+            coverage_files = self.coverage_accumulator.write(self.collection_dir, stac_collection=self.stac_collection)
+            print(f'written coverage of {self.coverage_accumulator.n_items} items to: {coverage_files[0]}')
+
+        # set collection extent and summaries from aggregated items metadata
+        self.aggregator.apply(self.stac_collection, summaries=self.collection_definition.summaries)
+        return self.stac_collection
+
+
+def init_worker(schema_modules: list) -> None:
+    """Loads metadata schemas and transformers in a worker process, unless inherited from the parent process."""
+    if not transformer_factory.transformer_creation_funcs:
+        loader.load_schemas(schema_modules)
+
+
+_transformers = {}  # transformers of a worker process, by schema name
+
+
+def transform_product(schema_name, product_metadata, collection_definition, collection_id, data_path, record_stages=False) -> tuple:
+    """Creates the STAC item of a source product in a worker process, and returns it as a dictionary, along with the
+    transformation duration, and stages durations if `record_stages` is set.
+    """
+    transformer = _transformers.get(schema_name)
+    if transformer is None:
+        transformer = _transformers[schema_name] = transformer_factory.create_transformer(schema_name)
+    if record_stages:
+        metrics.enable()
+        metrics.start_span()
+    start_time = time.perf_counter()
+    try:
+        with metrics.timer('build.transform'):
+            stac_item = transformer.create_stac_item(product_metadata, definition=collection_definition,
+                                                     collection_id=collection_id, data_path=data_path)
+    finally:
+        stages = metrics.end_span()
+    return stac_item.to_dict(include_self_link=False, transform_hrefs=False), time.perf_counter() - start_time, stages
+
+
+class CostEstimator:
+    """Estimates the transformation cost of source products, in seconds: their last recorded duration in past build
+    logs if any, or their data file size scaled by the median duration per byte of past builds. Without build logs,
+    costs are data files sizes, only their order being meaningful.
+    """
+
+    def __init__(self, build_logs: list = None):
+        self.durations = {}  # by collection ID and item ID
+        seconds_per_byte = []
+        for build_log in build_logs or []:
+            for record in read_build_log(build_log):
+                if record.get('duration') is None:
                     continue
-            print(f'{n_items}/{len(products)}')
-            try:
-                stac_item = transformer.create_stac_item(product_metadata, definition=collection_definition, collection_id=collection_id, data_path=data_path)
-                stac_collection.add_item(stac_item)
-            except Exception as e:
-                print(e)
-                print(f'WARNING: The following source product could not be transformed; not added to collection:')
-                print(product_metadata)
+                self.durations[(record.get('collection'), record.get('id'))] = record['duration']
+                if record.get('input_size'):
+                    seconds_per_byte.append(record['duration'] / record['input_size'])
+        self.seconds_per_byte = sorted(seconds_per_byte)[len(seconds_per_byte) // 2] if seconds_per_byte else 1.0
+
+    def estimate(self, collection_builder: CollectionBuilder, product_metadata) -> float:
+        if self.durations:
+            duration = self.durations.get((collection_builder.collection_id, get_product_id(collection_builder.transformer, product_metadata)))
+            if duration is not None:
+                return duration
+        size = psup.get_product_size(product_metadata, collection_builder.data_path)
+        return (size or 0) * self.seconds_per_byte
+
+
+def transform_products_in_parallel(collection_builders: list, item_start=0, n_max_items=None, n_workers=N_WORKERS, item_timeout=None,
+                                   cost_logs=None, schema_modules=None, profile=None, profile_dir=None, partition=None,
+                                   partition_by='range') -> None:
+    """Transforms the source products of all collections with a shared pool of `n_workers` worker processes, by
+    decreasing estimated cost, and adds created items to their collections as they complete. Products whose
+    transformation exceeds `item_timeout` seconds are quarantined, their worker process being replaced.
+    """
+    cost_estimator = CostEstimator(cost_logs)
+    tasks = []
+    products = {}
+    for builder_index, collection_builder in enumerate(collection_builders):
+        for index, product_metadata in collection_builder.read_products(item_start=item_start, n_max_items=n_max_items,
+                                                                        partition=partition, partition_by=partition_by):
+            skip_reason = collection_builder.get_skip_reason(product_metadata)
+            if skip_reason:
+                collection_builder.add_skipped(collection_builder.new_record(index, product_metadata), skip_reason)
+                continue
+            key = (builder_index, index)
+            products[key] = product_metadata
+            tasks.append(Task(key, cost_estimator.estimate(collection_builder, product_metadata), transform_product,
+                              (collection_builder.schema_name, product_metadata, collection_builder.collection_definition,
+                               collection_builder.collection_id, collection_builder.data_path, metrics.enabled)))
+
+    print(f'transforming {len(tasks)} source products of {len(collection_builders)} collections with {n_workers} worker processes.')
+    scheduler = Scheduler(n_workers, task_timeout=item_timeout, initializer=init_worker, initargs=(schema_modules or [],),
+                          profile=profile, profile_dir=profile_dir or 'profiles')
+    for n_done, (key, result, error) in enumerate(scheduler.run(tasks), start=1):
+        builder_index, index = key
+        collection_builder = collection_builders[builder_index]
+        product_metadata = products.pop(key)
+        print(f'{n_done}/{len(tasks)}')
+        record = collection_builder.new_record(index, product_metadata)
+        duration = stages = None
+        try:
+            if error is not None:
+                raise error
+            item_dict, duration, stages = result
+            metrics.observe_span(stages)
+            collection_builder.add_item(pystac.Item.from_dict(item_dict, preserve_dict=False), index=index)
+        except Exception as e:
+            if isinstance(e, TaskTimeoutError):
+                duration = item_timeout
+                metrics.count('items.timeout')
+            collection_builder.add_failure(index, product_metadata, e, record)
+        collection_builder.write_record(record, duration=duration, stages=stages)
+
+    if scheduler.n_timeouts or scheduler.n_worker_errors:
+        print(f'WARNING: {scheduler.n_timeouts} source products timed out, and {scheduler.n_worker_errors} crashed their worker process.')
+
+
+def transform_products_in_batches(collection_builder: CollectionBuilder, memory_budget: MemoryBudget, catalog_writer: CatalogWriter,
+                                  item_start=0, n_max_items=None, partition=None, partition_by='range') -> None:
+    """Transforms the source products of a collection in batches sized by the memory budget, parsing products from
+    the source collection file as needed, and writing and releasing items as soon as they are created.
+    """
+    n_done = 0
+    products = collection_builder.iter_products(item_start=item_start, n_max_items=n_max_items, partition=partition,
+                                                partition_by=partition_by)
+    for batch in memory_budget.batches(products):
+        for index, product_metadata in batch:
+            stac_item = collection_builder.process_product(index, product_metadata)
+            if stac_item is not None:
+                with metrics.timer('build.save'):
+                    catalog_writer.write_item(stac_item)
+                collection_builder.release_item(stac_item)
+        with metrics.timer('build.save'):
+            catalog_writer.stac_io.flush()
+        n_done += len(batch)
+        print(f'{n_done} source products processed (batch of {len(batch)}, RSS: {format_memory_size(get_rss())}).')
+
+
+def build_catalog(definitions, source_collections_files, stac_dir, item_start=0, n_max_items=None, parquet=False, feeds=False,
+                  layout_strategy=layout, coverage=False, coverage_resolution=PIXELS_PER_DEGREE, build_log=None,
+                  n_workers=N_WORKERS, item_timeout=None, cost_logs=None, schema_modules=None, profile=None, profile_dir=None,
+                  partition=None, partition_by='range', max_memory=None):
+    """Builds the STAC catalog of source collections files.
+
+    If `n_workers` is greater than 1, or `item_timeout` is set, source products are transformed by worker processes
+    (loading `schema_modules` if not inherited, and profiled if `profile` is set), shared by all collections, largest
+    estimated cost first (from data files sizes, or durations recorded in `cost_logs` build logs).
+
+    If `partition` is set to `(k, n)`, only the k-th of n disjoint partitions of each collection source products
+    (contiguous ranges, or item IDs hash buckets, depending on `partition_by`) is built, so that partitions can be
+    built separately into staging directories, and assembled with `labtools.merge.merge_catalogs`.
+
+    If `max_memory` is set (in bytes), source products are parsed and transformed serially in batches sized to keep
+    the process resident memory under this ceiling, and items are written and released as soon as created.
+    """
+    stac_dir = Path(stac_dir)
+    if stac_dir.exists():
+        shutil.rmtree(stac_dir)
+
+    # per-item build records, holding stages durations recorded by the build instrumentation
+    log_writer = None
+    if build_log:
+        log_writer = BuildLogWriter(build_log)
+        metrics.enable()
 
-        # update collection extent from items
-        stac_collection.update_extent_from_items()
+    # source products that could not be transformed, to be retried with `retry_failed_items`
+    quarantine = Quarantine()
 
-        # add collection to the output STAC catalog
-        stac_catalog = root_stac_catalog.get_child(get_urn_id(collection_definition.path))
-        stac_catalog.add_child(stac_collection)
+    # create destination skeleton STAC catalog from catalog definitions, and set catalogs hrefs
+    root_stac_catalog = create_root_catalog(definitions)
+    root_stac_catalog.normalize_hrefs(str(stac_dir), strategy=layout_strategy)
+
+    def create_collection_builder(source_collection_file) -> CollectionBuilder:
+        return CollectionBuilder(definitions, source_collection_file, root_stac_catalog, stac_dir, layout_strategy=layout_strategy,
+                                 parquet=parquet, feeds=feeds, coverage=coverage, coverage_resolution=coverage_resolution,
+                                 log_writer=log_writer, quarantine=quarantine)
+
+    catalog_writer = memory_budget = None
+    if max_memory:
+        if n_workers > 1 or item_timeout:
+            print('WARNING: Memory-bounded builds are serial; number of workers and item timeout ignored.')
+        memory_budget = MemoryBudget(max_memory)
+        catalog_writer = CatalogWriter()
+        for source_collection_file in source_collections_files:
+            collection_builder = create_collection_builder(source_collection_file)
+            transform_products_in_batches(collection_builder, memory_budget, catalog_writer, item_start=item_start,
+                                          n_max_items=n_max_items, partition=partition, partition_by=partition_by)
+            collection_builder.close()
+            print()
+    elif n_workers > 1 or item_timeout:
+        collection_builders = [create_collection_builder(source_collection_file) for source_collection_file in source_collections_files]
+        transform_products_in_parallel(collection_builders, item_start=item_start, n_max_items=n_max_items, n_workers=n_workers,
+                                       item_timeout=item_timeout, cost_logs=cost_logs, schema_modules=schema_modules,
+                                       profile=profile, profile_dir=profile_dir, partition=partition, partition_by=partition_by)
+        for collection_builder in collection_builders:
+            collection_builder.close()
         print()
+    else:
+        for source_collection_file in source_collections_files:
+            collection_builder = create_collection_builder(source_collection_file)
+
+            # read product metadata from source collection file
+            products = collection_builder.read_products(item_start=item_start, n_max_items=n_max_items, partition=partition,
+                                                        partition_by=partition_by)
+            for i, (index, product_metadata) in enumerate(products):
+                print(f'{i + 1}/{len(products)}')
+                collection_builder.process_product(index, product_metadata)
+
+            collection_builder.close()
+            print()
 
     # save STAC catalog
     print()
     print(f'saving to: {str(stac_dir)}')
     Path.mkdir(stac_dir, parents=True, exist_ok=True)
-    root_stac_catalog.normalize_hrefs(str(stac_dir), strategy=layout)
-    root_stac_catalog.save(catalog_type=pystac.CatalogType.SELF_CONTAINED)
+    with metrics.timer('build.save'):
+        if catalog_writer:  # items already written
+            catalog_writer.save(root_stac_catalog, catalog_type=pystac.CatalogType.SELF_CONTAINED, write_items=False)
+        else:
+            save_catalog(root_stac_catalog, catalog_type=pystac.CatalogType.SELF_CONTAINED)
+
+    # write collections spatial indexes
+    for stac_catalog in root_stac_catalog.get_all_collections():
+        with metrics.timer('build.index'):
+            index_file = write_collection_index(stac_catalog)
+        print(f'written spatial index: {index_file}')
+
+    if log_writer:
+        log_writer.close()
+        print(f'written {log_writer.n_records} build records to: {log_writer.log_file}')
+
+    if len(quarantine):
+        print(f'WARNING: {len(quarantine)} source products could not be transformed; quarantined in: {quarantine.save(stac_dir)}')
+
+    if partition:
+        partition_file = stac_dir / PARTITION_FILE_NAME
+        with open(partition_file, 'w') as f:
+            json.dump({'partition': partition[0], 'n_partitions': partition[1], 'partition_by': partition_by}, f, indent=2)
+        print(f'built partition {partition[0]}/{partition[1]} (by {partition_by}); to be merged with the other partitions.')
+
+    if memory_budget:
+        print(f'peak RSS: {format_memory_size(get_peak_rss())} (max memory: {format_memory_size(max_memory)}, '
+              f'{memory_budget.n_batches} batches).')
+        if memory_budget.n_exceeded:
+            print(f'WARNING: Max memory exceeded after {memory_budget.n_exceeded} batches.')
+
+    print('Done.')
+
+
+def find_product(transformer, products, entry) -> object:
+    """Returns the source product of a quarantine entry, at its recorded index if its ID is unchanged, or searched by
+    ID otherwise (eg: the source collection file has been updated since).
+    """
+    index = entry['index']
+    if 0 <= index < len(products) and get_product_id(transformer, products[index]) == entry['id']:
+        return products[index]
+    for product_metadata in products:
+        if get_product_id(transformer, product_metadata) == entry['id']:
+            return product_metadata
+    return None
+
+
+def retry_failed_items(definitions, stac_dir, layout_strategy=layout):
+    """Transforms again the source products quarantined by a previous build, and patches the created items into the
+    existing STAC catalog, without rebuilding anything else.
+
+    Collections extents, summaries and coverage maps are updated from the new items, starting from their current
+    values, and only the new items and patched collections files are written. Products still failing are kept in
+    quarantine with their new error.
+    """
+    stac_dir = Path(stac_dir)
+    quarantine = Quarantine.load(stac_dir)
+    if not len(quarantine):
+        print(f'No quarantined source products in: {stac_dir}')
+        return
+
+    root_stac_catalog = read_catalog(stac_dir)
+    stac_collections = {stac_collection.id.split(':')[-1]: stac_collection for stac_collection in root_stac_catalog.get_all_collections()}
+
+    for collection_id in quarantine.get_collections_ids():
+        entries = quarantine.get_entries(collection_id)
+        stac_collection = stac_collections.get(collection_id)
+        if stac_collection is None:
+            print(f'WARNING: Collection {collection_id!r} not found in {stac_dir}; quarantined source products not retried.')
+            continue
+        print(f'retrying {len(entries)} quarantined source products of STAC collection: {stac_collection.id}.')
+
+        source_collection_file = entries[0]['source_collection_file']
+        source_collection_metadata = psup.read_collection_metadata(source_collection_file)
+        urn_collection_id = f'urn:pdssp:ias:collection:{collection_id}'  # temporary patch
+        transformer = transformer_factory.create_transformer(source_collection_metadata.schema_name)
+        collection_definition = definitions.get_collection(urn_collection_id)
+        data_path = get_data_path(source_collection_file, urn_collection_id)
+        with metrics.timer('build.read'):
+            products = psup.read_products_metadata(source_collection_file)
+
+        # start from the current collection extent, summaries and coverage map
+        n_items = len(stac_collection.get_links('item'))
+        aggregator = CollectionAggregator()
+        aggregator.seed(stac_collection, n_items=n_items)
+        coverage_accumulator = None
+        if 'coverage' in stac_collection.assets:
+            coverage_accumulator = CoverageAccumulator.load(stac_collection.assets['coverage'].get_absolute_href())
+
+        stac_items = []
+        for entry in entries:
+            product_metadata = find_product(transformer, products, entry)
+            if product_metadata is None:
+                print(f'WARNING: Source product {entry["id"]!r} not found in {source_collection_file}; removed from quarantine.')
+                quarantine.remove(collection_id, entry['index'])
+                continue
+            try:
+                with metrics.timer('build.transform'):
+                    stac_item = transformer.create_stac_item(product_metadata, definition=collection_definition, collection_id=collection_id, data_path=data_path)
+                stac_collection.add_item(stac_item, strategy=layout_strategy)
+                aggregator.update(stac_item)
+                if coverage_accumulator:
+                    coverage_accumulator.update(stac_item)
+                stac_items.append(stac_item)
+                quarantine.remove(collection_id, entry['index'])
+                metrics.count('items.created')
+            except Exception as e:
+                metrics.count('items.failed')
+                print(e)
+                print(f'WARNING: Source product {entry["id"]!r} could not be transformed; kept in quarantine.')
+                quarantine.add(collection_id, entry['index'], entry['id'], source_collection_file, e)
+
+        if not stac_items:
+            continue
+
+        if coverage_accumulator:
+            coverage_accumulator.write(os.path.dirname(stac_collection.get_self_href()), stac_collection=stac_collection)
+        aggregator.apply(stac_collection, summaries=stac_collection.summaries.to_dict() if stac_collection.summaries else None)
+
+        # write new items and patched collection only
+        with metrics.timer('build.save'):
+            CatalogWriter().save_objects(stac_items + [stac_collection], catalog_type=pystac.CatalogType.SELF_CONTAINED)
+        with metrics.timer('build.index'):
+            index_file = write_collection_index(stac_collection)
+        print(f'added {len(stac_items)} items to {stac_collection.get_self_href()}, and written spatial index: {index_file}')
+        print()
 
+    quarantine.save(stac_dir)
+    if len(quarantine):
+        print(f'WARNING: {len(quarantine)} source products still quarantined in: {stac_dir}')
     print('Done.')
\ No newline at end of file
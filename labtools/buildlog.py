@@ -0,0 +1,213 @@
+"""Structured per-item build log, and its offline analysis.
+
+During a build, one JSON record per source product is appended to a JSON Lines log file, eg:
+
+    {"time": 1697731200.52, "collection": "mex_omega_c_proj_ddr", "id": "OMEGA_L3_0018_6_CPROJ", "index": 12,
+     "status": "failed", "error_class": "KeyError", "error": "'altitude'", "duration": 0.41,
+     "stages": {"transform.geometry": 0.38, ...}, "input_size": 9751328}
+
+Records are queued and written by a background thread, in buffered batches, so that logging does not slow the build
+down. `summarize_build_log` derives, from one or several logs, the slowest items, failures clustered by error class
+and message pattern, stages total durations and throughput over time, as printed by `labtools report`.
+"""
+from typing import Any, Dict, Iterable, Iterator
+from collections import Counter, defaultdict
+from pathlib import Path
+import json
+import queue
+import re
+import threading
+
+BUFFER_SIZE = 256  # number of records written at once
+FLUSH_INTERVAL = 1.0  # maximum delay before queued records are written, in seconds
+THROUGHPUT_INTERVAL = 60.0  # throughput time bins, in seconds
+N_SLOWEST = 10
+ENVELOPE_STAGES = ['build.transform']  # stages enclosing finer-grained stages (eg: transformers hooks)
+
+STATUS_CREATED = 'created'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+
+
+class BuildLogWriter:
+    """Appends build records to a JSON Lines file from a background thread."""
+
+    def __init__(self, log_file, buffer_size: int = BUFFER_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.log_file = Path(log_file)
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.n_records = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_records, name='labtools-build-log', daemon=True)
+        self._thread.start()
+
+    def _write_records(self) -> None:
+        closed = False
+        with open(self.log_file, 'ab', buffering=0) as f:  # one write per batch, so that processes can share a log
+            while not closed:
+                lines = []
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                    while True:
+                        if record is None:
+                            closed = True
+                            break
+                        lines.append(json.dumps(record, default=str))
+                        if len(lines) >= self.buffer_size:
+                            break
+                        record = self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                if lines:
+                    f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._queue.put(record)
+        self.n_records += 1
+
+    def close(self) -> None:
+        """Writes queued records, and stops the writing thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def read_build_log(log_file) -> Iterator[Dict[str, Any]]:
+    """Yields the records of a build log file, skipping truncated lines (eg: of an interrupted build)."""
+    with open(log_file) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def get_error_pattern(error: str) -> str:
+    """Returns an error message with numbers, quoted strings and paths replaced by placeholders, so that similar
+    errors are clustered together.
+    """
+    pattern = re.sub(r"'[^']*'|\"[^\"]*\"", "'*'", error or '')
+    pattern = re.sub(r'(/[\w.\-]+)+', '<path>', pattern)
+    pattern = re.sub(r'\d+(\.\d+)?', '<n>', pattern)
+    return pattern[:200]
+
+
+def summarize_build_log(records: Iterable[Dict[str, Any]], n_slowest: int = N_SLOWEST,
+                        throughput_interval: float = THROUGHPUT_INTERVAL) -> Dict[str, Any]:
+    """Returns statuses counts, slowest items, failure clusters, stages total durations and throughput per time bin
+    of `throughput_interval` seconds.
+    """
+    status_counts = Counter()
+    collection_counts = defaultdict(Counter)
+    stages_durations = Counter()
+    failure_clusters: Dict[tuple, Dict[str, Any]] = {}
+    throughput_bins = defaultdict(Counter)  # statuses counts by time bin index
+    slowest = []
+    start_time = end_time = None
+    n_input_bytes = 0
+    items_duration = 0.0
+
+    for record in records:
+        status = record.get('status')
+        status_counts[status] += 1
+        collection_counts[record.get('collection')][status] += 1
+        for stage, duration in (record.get('stages') or {}).items():
+            stages_durations[stage] += duration
+        n_input_bytes += record.get('input_size') or 0
+
+        timestamp = record.get('time')
+        if timestamp is not None:
+            start_time = timestamp if start_time is None else min(start_time, timestamp)
+            end_time = timestamp if end_time is None else max(end_time, timestamp)
+            throughput_bins[int(timestamp // throughput_interval)][status] += 1
+
+        if status == STATUS_FAILED:
+            key = (record.get('error_class'), get_error_pattern(record.get('error')))
+            cluster = failure_clusters.setdefault(key, {'error_class': key[0], 'pattern': key[1], 'count': 0, 'examples': []})
+            cluster['count'] += 1
+            if len(cluster['examples']) < 3:
+                cluster['examples'].append(record.get('id'))
+
+        if record.get('duration') is not None:
+            items_duration += record['duration']
+            slowest.append((record['duration'], record))
+            if len(slowest) > 4 * n_slowest:
+                slowest = sorted(slowest, key=lambda entry: entry[0], reverse=True)[:n_slowest]
+
+    throughput = []
+    if throughput_bins:
+        first_bin = min(throughput_bins)
+        for bin_index in range(first_bin, max(throughput_bins) + 1):
+            counts = throughput_bins.get(bin_index, Counter())
+            throughput.append({
+                'start': (bin_index - first_bin) * throughput_interval,
+                'n_items': sum(counts.values()),
+                'n_failed': counts[STATUS_FAILED],
+                'items_per_second': sum(counts.values()) / throughput_interval
+            })
+
+    slowest = sorted(slowest, key=lambda entry: entry[0], reverse=True)[:n_slowest]
+    duration = (end_time - start_time) if start_time is not None else 0.0
+    n_records = sum(status_counts.values())
+
+    return {
+        'n_records': n_records,
+        'statuses': dict(status_counts),
+        'collections': {collection: dict(counts) for collection, counts in collection_counts.items()},
+        'duration': duration,
+        'items_per_second': n_records / duration if duration else None,
+        'input_bytes': n_input_bytes,
+        'items_duration': items_duration,
+        'stages': dict(stages_durations.most_common()),
+        'slowest': [{key: record.get(key) for key in ['id', 'collection', 'status', 'duration', 'input_size', 'stages']}
+                    for _, record in slowest],
+        'failure_clusters': sorted(failure_clusters.values(), key=lambda cluster: cluster['count'], reverse=True),
+        'throughput': throughput
+    }
+
+
+def print_build_report(summary: Dict[str, Any]) -> None:
+    """Prints a build log summary."""
+    statuses = ', '.join(f'{count} {status}' for status, count in summary['statuses'].items())
+    print(f'{summary["n_records"]} items ({statuses}) in {summary["duration"]:.1f} s', end='')
+    if summary['items_per_second']:
+        print(f', {summary["items_per_second"]:.2f} items/s', end='')
+    print(f', {summary["input_bytes"] / 1e6:.1f} MB of input data')
+    for collection, counts in summary['collections'].items():
+        print(f'  {collection:<40} ' + ', '.join(f'{count} {status}' for status, count in counts.items()))
+
+    if summary['stages']:
+        print()
+        print(f'{"stage":<32} {"total (s)":>10} {"share":>7}  (of items durations, nested stages included)')
+        total = summary['items_duration'] or 1.0
+        for stage, duration in summary['stages'].items():
+            print(f'{stage:<32} {duration:>10.2f} {duration / total * 100:>6.1f}%')
+
+    print()
+    print('slowest items:')
+    for record in summary['slowest']:
+        input_size = f'{record["input_size"] / 1e6:.1f} MB' if record.get('input_size') else '-'
+        stages = record.get('stages') or {}
+        stages = {stage: duration for stage, duration in stages.items() if stage not in ENVELOPE_STAGES} or stages
+        top_stage = max(stages, key=stages.get) if stages else '-'
+        print(f'  {record["duration"]:>8.2f} s  {input_size:>9}  {record["id"]:<40} {record["status"]:<8} (mostly {top_stage})')
+
+    if summary['failure_clusters']:
+        print()
+        print('failures:')
+        for cluster in summary['failure_clusters']:
+            print(f'  {cluster["count"]:>6}  {cluster["error_class"]}: {cluster["pattern"]}')
+            print(f'          eg: {", ".join(str(example) for example in cluster["examples"])}')
+
+    if summary['throughput']:
+        print()
+        print(f'{"time (s)":>10} {"items":>7} {"failed":>7} {"items/s":>8}')
+        for time_bin in summary['throughput']:
+            print(f'{time_bin["start"]:>10.0f} {time_bin["n_items"]:>7} {time_bin["n_failed"]:>7} {time_bin["items_per_second"]:>8.2f}')
@@ -1,10 +1,22 @@
 import click
+import json
 
 from pathlib import Path
 
 from .definitions import Definitions
 import labtools.loader as loader
-from .builder import build_catalog
+from .builder import build_catalog, retry_failed_items, create_layout, migrate_catalog
+from .builder import N_WORKERS as BUILD_N_WORKERS, PARTITION_METHODS
+from .merge import merge_catalogs
+from .memory import parse_memory_size
+from .index import search_catalog
+from .coverage import PIXELS_PER_DEGREE
+from .metrics import metrics
+from .profiling import Profiler, PROFILE_MODES
+from .buildlog import read_build_log, summarize_build_log, print_build_report, N_SLOWEST, THROUGHPUT_INTERVAL
+from .feeds import load_feeds, BATCH_SIZE, N_WORKERS
+from .pipeline import run_pipeline, N_DOWNLOAD_WORKERS, MAX_PENDING
+from .pipeline import N_WORKERS as PIPELINE_N_WORKERS
 from .ias import psup
 from labtools.schemas import factory as metadata_factory
 
@@ -13,15 +25,17 @@ YAML_DEFINITIONS_FILE = '/Users/nmanaud/workspace/pdssp/pdssp-labtools/data/defi
 STAC_DATA_DIR = '/Volumes/Data/pdssp/psup/stac'
 N_MAX_ITEMS = 100  # maximum number of items to process per collection
 
-loader.load_schemas([
+STAC_SCHEMAS = [
     'labtools.schemas.pdssp_stac',
-])
-loader.load_schemas([
+]
+SOURCE_SCHEMAS = [
     'labtools.ias.schemas.omega_c_proj',
     'labtools.ias.schemas.omega_cube',
     'labtools.ias.schemas.omega_map',
     'labtools.ias.schemas.vector_features'
-])
+]
+loader.load_schemas(STAC_SCHEMAS)
+loader.load_schemas(SOURCE_SCHEMAS)
 
 
 @click.group()
@@ -99,7 +113,26 @@ def download(collections_ids, n_max_items, overwrite):
 @click.argument('collections-ids')
 @click.option('--item-start', type=click.INT, help='Item start index.', default=0)
 @click.option('--n-max-items', type=click.INT, help='Maximum number of items to process per collection.', default=N_MAX_ITEMS)
-def build(collections_ids, item_start, n_max_items):
+@click.option('--parquet/--no-parquet', help='Export collections items to GeoParquet files (requires pyarrow).', default=False)
+@click.option('--feeds/--no-feeds', help='Write collections items to gzip-compressed NDJSON feeds.', default=False)
+@click.option('--shard-by', type=click.Choice(['none', 'hash', 'orbit', 'martian_year']), help='Bucket items directories into shards.', default='none')
+@click.option('--compression', type=click.Choice(['none', 'gzip', 'zstd']), help='Compress catalog JSON files.', default='none')
+@click.option('--coverage/--no-coverage', help='Add coverage count map and preview assets to collections.', default=False)
+@click.option('--coverage-resolution', type=click.FLOAT, help='Coverage map resolution, in pixels per degree.', default=PIXELS_PER_DEGREE)
+@click.option('--metrics', 'metrics_file', type=click.Path(), help='Write stages timings and counters to a JSON or Prometheus (.prom) file.', default=None)
+@click.option('--profile', type=click.Choice(['none'] + PROFILE_MODES), help='Profile the build, writing reports to the profile directory.', default='none')
+@click.option('--profile-dir', type=click.Path(), help='Profiling reports output directory.', default='profiles')
+@click.option('--build-log', type=click.Path(), help='Append per-item build records to a JSON Lines file.', default=None)
+@click.option('--retry-failed', is_flag=True, help='Only retry the source products quarantined by the previous build, patching them into the built catalog.', default=False)
+@click.option('--n-workers', type=click.INT, help='Number of worker processes transforming source products of all collections.', default=BUILD_N_WORKERS)
+@click.option('--item-timeout', type=click.FLOAT, help='Quarantine source products whose transformation exceeds this duration, in seconds.', default=None)
+@click.option('--cost-log', 'cost_logs', type=click.Path(exists=True), multiple=True, help='Past build log used to schedule the most expensive products first.')
+@click.option('--partition', help='Only build partition K (0-based) of N disjoint partitions of each collection, as K/N.', default=None)
+@click.option('--partition-by', type=click.Choice(PARTITION_METHODS), help='Split source products into contiguous ranges, or item IDs hash buckets.', default='range')
+@click.option('--stac-dir', type=click.Path(), help='Output STAC catalog directory (eg: a staging directory of a partition).', default=STAC_DATA_DIR)
+@click.option('--max-memory', help='Process source products in batches keeping the resident memory under this size (eg: 4G, 512M).', default=None)
+def build(collections_ids, item_start, n_max_items, parquet, feeds, shard_by, compression, coverage, coverage_resolution, metrics_file,
+          profile, profile_dir, build_log, retry_failed, n_workers, item_timeout, cost_logs, partition, partition_by, stac_dir, max_memory):
     """Build STAC catalog.
 
     Examples:
@@ -108,7 +141,36 @@ def build(collections_ids, item_start, n_max_items):
         $ labtools build all --n-max-items=10
         $ labtools build all --n-max-items=-1
         $ labtools build mex_omega_cubes_rdr --item-start=8921 --n-max-items=1
+        $ labtools build all --n-max-items=-1 --parquet
+        $ labtools build all --n-max-items=-1 --feeds
+        $ labtools build mex_omega_cubes_rdr --n-max-items=-1 --shard-by=orbit
+        $ labtools build all --n-max-items=-1 --compression=zstd
+        $ labtools build mex_omega_c_proj_ddr --n-max-items=-1 --coverage --coverage-resolution=8
+        $ labtools build all --n-max-items=-1 --metrics=build_metrics.json
+        $ labtools build all --n-max-items=-1 --metrics=/var/lib/node_exporter/labtools.prom
+        $ labtools build mex_omega_c_proj_ddr --n-max-items=500 --profile=sampling --profile-dir=profiles
+        $ labtools build all --n-max-items=-1 --build-log=logs/build.jsonl
+        $ labtools build all --retry-failed
+        $ labtools build all --retry-failed --shard-by=orbit --compression=zstd
+        $ labtools build all --n-max-items=-1 --n-workers=4
+        $ labtools build mex_omega_c_proj_ddr --n-max-items=-1 --n-workers=8 --item-timeout=600 --cost-log=logs/build.jsonl
+        $ labtools build all --n-max-items=-1 --partition=0/4 --stac-dir=staging/0
+        $ labtools build all --n-max-items=-1 --partition=3/4 --partition-by=hash --stac-dir=staging/3
+        $ labtools build mex_omega_c_proj_ddr --n-max-items=-1 --max-memory=4G
     """
+    if max_memory is not None:
+        try:
+            max_memory = parse_memory_size(max_memory)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--max-memory')
+    if partition is not None:
+        try:
+            partition = tuple(int(value) for value in partition.split('/'))
+        except ValueError:
+            partition = ()
+        if len(partition) != 2 or not 0 <= partition[0] < partition[1]:
+            raise click.BadParameter('Expected K/N, with 0 <= K < N.', param_hint='--partition')
+
     # set collections IDs to include in STAC catalog
     definitions = Definitions(yaml_file=YAML_DEFINITIONS_FILE)
     collections_ids = collections_ids.split(',')
@@ -130,7 +192,200 @@ def build(collections_ids, item_start, n_max_items):
     # build catalog
     if n_max_items == -1:
         n_max_items = None
-    build_catalog(definitions, source_collections_files, stac_dir=STAC_DATA_DIR, item_start=item_start, n_max_items=n_max_items)
+    if metrics_file:
+        metrics.enable()
+    profiler = None
+    if profile != 'none':
+        profiler = Profiler(profile, profile_dir, name='build')
+        profiler.start()
+    try:
+        layout_strategy = create_layout(None if shard_by == 'none' else shard_by, None if compression == 'none' else compression)
+        if retry_failed:  # quarantined products of all collections are retried, whatever the input collections IDs
+            retry_failed_items(definitions, stac_dir=stac_dir, layout_strategy=layout_strategy)
+        else:
+            build_catalog(definitions, source_collections_files, stac_dir=stac_dir, item_start=item_start, n_max_items=n_max_items,
+                          parquet=parquet, feeds=feeds, layout_strategy=layout_strategy,
+                          coverage=coverage, coverage_resolution=coverage_resolution, build_log=build_log,
+                          n_workers=n_workers, item_timeout=item_timeout, cost_logs=list(cost_logs), schema_modules=STAC_SCHEMAS + SOURCE_SCHEMAS,
+                          profile=None if profile == 'none' else profile, profile_dir=profile_dir,
+                          partition=partition, partition_by=partition_by, max_memory=max_memory)
+    finally:  # reports written even if the build is interrupted
+        if profiler:
+            for report_file in profiler.stop():
+                print(f'written {profile} profile report: {report_file}')
+
+    if metrics_file:
+        print()
+        metrics.print_summary()
+        print(f'written metrics to: {metrics.write(metrics_file)}')
+
+
+@cli.command()
+@click.argument('collections-ids')
+@click.option('--n-max-items', type=click.INT, help='Maximum number of items to process per collection.', default=N_MAX_ITEMS)
+@click.option('--overwrite/--no-overwrite', help='Overwrite existing source collection and data files.', default=False)
+@click.option('--n-workers', type=click.INT, help='Number of transformation worker processes.', default=PIPELINE_N_WORKERS)
+@click.option('--n-download-workers', type=click.INT, help='Number of concurrent downloads.', default=N_DOWNLOAD_WORKERS)
+@click.option('--max-pending', type=click.INT, help='Maximum number of source products in flight, from download to writing.', default=MAX_PENDING)
+@click.option('--parquet/--no-parquet', help='Export collections items to GeoParquet files (requires pyarrow).', default=False)
+@click.option('--feeds/--no-feeds', help='Write collections items to gzip-compressed NDJSON feeds.', default=False)
+@click.option('--shard-by', type=click.Choice(['none', 'hash', 'orbit', 'martian_year']), help='Bucket items directories into shards.', default='none')
+@click.option('--compression', type=click.Choice(['none', 'gzip', 'zstd']), help='Compress catalog JSON files.', default='none')
+@click.option('--coverage/--no-coverage', help='Add coverage count map and preview assets to collections.', default=False)
+@click.option('--coverage-resolution', type=click.FLOAT, help='Coverage map resolution, in pixels per degree.', default=PIXELS_PER_DEGREE)
+@click.option('--build-log', type=click.Path(), help='Append per-item build records to a JSON Lines file.', default=None)
+def pipeline(collections_ids, n_max_items, overwrite, n_workers, n_download_workers, max_pending, parquet, feeds, shard_by, compression,
+             coverage, coverage_resolution, build_log):
+    """Download source collections and build STAC catalog in a single pass, transforming products as soon as their
+    data files are downloaded.
+
+    Examples:
+        $ labtools pipeline all
+        $ labtools pipeline mex_omega_c_proj_ddr --n-max-items=-1 --n-workers=8 --n-download-workers=4
+        $ labtools pipeline all --n-max-items=-1 --max-pending=32 --build-log=logs/pipeline.jsonl
+    """
+    definitions = Definitions(yaml_file=YAML_DEFINITIONS_FILE)
+    collections_ids = collections_ids.split(',')
+    if len(collections_ids) == 1:
+        if collections_ids[0] == 'all':  # download all defined source collections
+            collections_ids = definitions.get_collections_ids()
+            for i, collections_id in enumerate(collections_ids):  # PATCH removing urn tokens
+                collections_ids[i] = collections_id.split(':')[-1]
+
+    # download source collections files, holding products metadata
+    source_collections_files = []
+    for collection_id in collections_ids:
+        collection_id = collection_id.strip()  # remove whitespaces
+        urn_collection_id = f'urn:pdssp:ias:collection:{collection_id}'  # temporary patch
+        collection_definition = definitions.get_collection(urn_collection_id)
+        source_collections_dir = Path(SOURCE_DATA_DIR) / collection_definition.path / collection_id
+        source_collection_file = psup.download_collection(collection_id, collection_definition.source.url,
+                                                          collection_definition.source.metadata_schema,
+                                                          output_dir=source_collections_dir, overwrite=overwrite)
+        if source_collection_file:
+            source_collections_files.append(source_collection_file)
+        print(f'{collection_definition.id:<52} {source_collection_file}')
+
+    if n_max_items == -1:
+        n_max_items = None
+    run_pipeline(definitions, source_collections_files, stac_dir=STAC_DATA_DIR, n_max_items=n_max_items, overwrite=overwrite,
+                 layout_strategy=create_layout(None if shard_by == 'none' else shard_by, None if compression == 'none' else compression),
+                 parquet=parquet, feeds=feeds, coverage=coverage, coverage_resolution=coverage_resolution, build_log=build_log,
+                 schema_modules=STAC_SCHEMAS + SOURCE_SCHEMAS, n_workers=n_workers, n_download_workers=n_download_workers,
+                 max_pending=max_pending)
+
+
+@cli.command()
+@click.argument('staging-dirs', nargs=-1, required=True, type=click.Path(exists=True, file_okay=False))
+@click.option('--stac-dir', type=click.Path(), help='Merged STAC catalog directory.', default=STAC_DATA_DIR)
+@click.option('--move/--copy', help='Move items files from staging directories, instead of copying them.', default=False)
+def merge(staging_dirs, stac_dir, move):
+    """Merge STAC catalogs built into staging directories (eg: by partitioned builds) into a single STAC catalog.
+
+    Examples:
+        $ labtools merge staging/0 staging/1 staging/2 staging/3
+        $ labtools merge staging/* --stac-dir=/Volumes/Data/pdssp/psup/stac --move
+    """
+    merge_catalogs(staging_dirs, stac_dir, move=move)
+    print()
+
+
+@cli.command()
+@click.option('--shard-by', type=click.Choice(['none', 'hash', 'orbit', 'martian_year']), help='Target items directories sharding.', default='hash')
+@click.option('--compression', type=click.Choice(['none', 'gzip', 'zstd']), help='Target catalog JSON files compression.', default='none')
+def migrate(shard_by, compression):
+    """Migrate the built STAC catalog files to another directory layout or compression.
+
+    Examples:
+        $ labtools migrate --shard-by=hash
+        $ labtools migrate --shard-by=none
+        $ labtools migrate --shard-by=none --compression=gzip
+    """
+    layout_strategy = create_layout(None if shard_by == 'none' else shard_by, None if compression == 'none' else compression)
+    n_moved_files = migrate_catalog(STAC_DATA_DIR, layout_strategy)
+    print(f'{n_moved_files} files moved.')
+    print()
+
+
+@cli.command()
+@click.argument('collections-ids', default='all')
+@click.option('--bbox', help='Bounding box, as west,south,east,north longitudes and latitudes.', default=None)
+@click.option('--footprint/--no-footprint', help='Refine matching items using their footprints.', default=True)
+@click.option('--datetime', help='Datetime range, as start/end ISO 8601 datetimes (open ends given as "..").', default=None)
+@click.option('--solar-longitude', '--ls', help='Solar longitude range, as min,max degrees (may wrap around 360).', default=None)
+@click.option('--martian-year', '--my', help='Martian year, or min,max Martian years range.', default=None)
+def search(collections_ids, bbox, footprint, datetime, solar_longitude, martian_year):
+    """Search items of the built STAC catalog intersecting a bounding box, and matching datetime, solar longitude and
+    Martian year ranges.
+
+    Examples:
+        $ labtools search --bbox=-30,-10,30,10
+        $ labtools search mex_omega_cubes_rdr --bbox=170,-20,-170,20
+        $ labtools search mex_omega_cubes_rdr --ls=180,270 --my=27
+        $ labtools search all --datetime=2005-01-01T00:00:00Z/2005-06-30T23:59:59Z --bbox=-30,-10,30,10
+    """
+    if bbox is not None:
+        try:
+            bbox = [float(value) for value in bbox.split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            raise click.BadParameter('Expected 4 comma-separated numbers: west,south,east,north.', param_hint='--bbox')
+    if all(value is None for value in [bbox, datetime, solar_longitude, martian_year]):
+        raise click.UsageError('At least one of --bbox, --datetime, --solar-longitude or --martian-year is required.')
+    collections_ids = None if collections_ids == 'all' else [collection_id.strip() for collection_id in collections_ids.split(',')]
+
+    results = search_catalog(STAC_DATA_DIR, bbox=bbox, collections_ids=collections_ids, footprint=footprint,
+                             datetime=datetime, solar_longitude=solar_longitude, martian_year=martian_year)
+    for result in results:
+        print(f'{result["collection"]:<32} {result["id"]:<52} {result["href"]}')
+    print(f'{len(results)} items found.')
+
+
+@cli.command()
+@click.argument('endpoint-url')
+@click.argument('collections-ids', default='all')
+@click.option('--token', help='Bearer token of the STAC transactions endpoint.', default=None)
+@click.option('--batch-size', type=click.INT, help='Number of items per transaction request.', default=BATCH_SIZE)
+@click.option('--n-workers', type=click.INT, help='Number of concurrent transaction requests.', default=N_WORKERS)
+def load(endpoint_url, collections_ids, token, batch_size, n_workers):
+    """Load collections items NDJSON feeds to a STAC transactions endpoint.
+
+    Examples:
+        $ labtools load https://resto.example.org
+        $ labtools load https://resto.example.org mex_omega_c_proj_ddr --token=$RESTO_TOKEN --batch-size=500
+    """
+    collections_ids = None if collections_ids == 'all' else [collection_id.strip() for collection_id in collections_ids.split(',')]
+    feeds_dir = Path(STAC_DATA_DIR) / 'feeds'
+    results = load_feeds(feeds_dir, endpoint_url, collections_ids=collections_ids, token=token, batch_size=batch_size,
+                         n_workers=n_workers)
+    for result in results:
+        print(f'{result["collection"]:<32} {result["n_loaded"]}/{result["n_items"]} items loaded '
+              f'({result["n_batches"]} batches, {result["items_per_second"] or 0:.1f} items/s)')
+        if result['failed_ids']:
+            print(f'WARNING: {len(result["failed_ids"])} items not loaded: {result["failed_ids"][:10]} ...')
+    print()
+
+
+@cli.command()
+@click.argument('log-files', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--n-slowest', type=click.INT, help='Number of slowest items to report.', default=N_SLOWEST)
+@click.option('--interval', type=click.FLOAT, help='Throughput time bins duration, in seconds.', default=THROUGHPUT_INTERVAL)
+@click.option('--json', 'json_file', type=click.Path(), help='Write the summary to a JSON file.', default=None)
+def report(log_files, n_slowest, interval, json_file):
+    """Summarize build logs: slowest items, failure clusters, stages durations and throughput over time.
+
+    Examples:
+        $ labtools report logs/build.jsonl
+        $ labtools report logs/build-*.jsonl --n-slowest=20 --interval=300 --json=report.json
+    """
+    records = (record for log_file in log_files for record in read_build_log(log_file))
+    summary = summarize_build_log(records, n_slowest=n_slowest, throughput_interval=interval)
+    print_build_report(summary)
+    if json_file:
+        with open(json_file, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f'written summary to: {json_file}')
 
 
 if __name__ == '__main__':
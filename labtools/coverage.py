@@ -0,0 +1,180 @@
+"""Collection coverage rasters, accumulated from items footprints.
+
+A `CoverageAccumulator` holds a global equirectangular grid of items counts, at a configurable number of pixels per
+degree. Each item footprint is rasterized as it is produced, by scanline filling of its polygons exterior rings over
+the footprint window only, so that the cost per item is bounded by the size of its footprint on the grid, and
+never exceeds one pass over the grid.
+
+Once a collection is built, the count map is written as a `coverage.npz` file along with a `coverage.png` preview
+into the collection directory, and both are added as collection assets.
+"""
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import struct
+import zlib
+
+import numpy as np
+import pystac
+
+from labtools.index import get_geometry_rings
+
+PIXELS_PER_DEGREE = 4  # default coverage grid resolution (1440 x 720 pixels)
+COVERAGE_FILE_NAME = 'coverage.npz'
+PREVIEW_FILE_NAME = 'coverage.png'
+
+
+def write_png(png_file, image: np.ndarray) -> None:
+    """Writes a 8-bit grayscale (2D) or grayscale and alpha (3D, 2 bands) image to a PNG file."""
+    height, width = image.shape[:2]
+    color_type = 0 if image.ndim == 2 else 4
+    rows = image.astype(np.uint8).reshape(height, -1)
+    raw_data = np.hstack([np.zeros((height, 1), dtype=np.uint8), rows]).tobytes()  # filter type 0 per row
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+    with open(png_file, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw_data, 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+class CoverageAccumulator:
+    """Global grid counting the number of items footprints covering each pixel."""
+
+    def __init__(self, pixels_per_degree: float = PIXELS_PER_DEGREE):
+        self.pixels_per_degree = pixels_per_degree
+        self.n_rows = int(round(180 * pixels_per_degree))
+        self.n_cols = int(round(360 * pixels_per_degree))
+        self.counts = np.zeros((self.n_rows, self.n_cols), dtype=np.uint32)
+        self.n_items = 0
+
+    def to_col(self, lon):
+        """Returns unwrapped grid column coordinates of longitudes (pixel centers at integer + 0.5)."""
+        return (np.asarray(lon, dtype=float) + 180.0) * self.pixels_per_degree
+
+    def to_row(self, lat):
+        return (90.0 - np.asarray(lat, dtype=float)) * self.pixels_per_degree
+
+    def unwrap(self, cols: np.ndarray) -> np.ndarray:
+        """Unwraps eastwards the columns of a ring crossing the antimeridian with [-180, 180] longitudes, ie: with
+        jumps larger than 180° between vertices not both lying on the antimeridian (eg: global footprints edges).
+        """
+        on_antimeridian = (cols == 0) | (cols == self.n_cols)
+        jumps = (np.abs(np.diff(cols)) > self.n_cols / 2) & ~(on_antimeridian[:-1] & on_antimeridian[1:])
+        if np.any(jumps):
+            return np.where(cols < self.n_cols / 2, cols + self.n_cols, cols)
+        return cols
+
+    def rasterize_ring(self, ring: np.ndarray, col_offset: int, row_offset: int, window: np.ndarray) -> None:
+        """Toggles the window pixels whose center lies inside the ring (even-odd rule), so that holes and overlapping
+        parts of a same footprint are handled consistently.
+        """
+        n_rows, n_cols = window.shape
+        x0, y0 = ring[:-1, 0], ring[:-1, 1]
+        x1, y1 = ring[1:, 0], ring[1:, 1]
+        y = np.arange(n_rows)[:, None] + row_offset + 0.5  # rows centers
+        crosses = (y0 > y) != (y1 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.where(crosses, x0 + (y - y0) * (x1 - x0) / (y1 - y0), np.nan)
+        x = np.sort(x, axis=1)  # NaN sorted last; the number of crossings per row is even
+        starts, ends = x[:, 0::2], x[:, 1::2]
+        rows, pairs = np.nonzero(np.isfinite(ends))
+        if not len(rows):
+            return
+        # first and last pixel columns whose center lies within each [start, end] span
+        first = np.clip(np.ceil(starts[rows, pairs] - 0.5).astype(int) - col_offset, 0, n_cols)
+        last = np.clip(np.floor(ends[rows, pairs] - 0.5).astype(int) - col_offset + 1, 0, n_cols)
+        spans = np.zeros((n_rows, n_cols + 1), dtype=np.int32)
+        np.add.at(spans, (rows, first), 1)
+        np.add.at(spans, (rows, last), -1)
+        window ^= np.cumsum(spans[:, :-1], axis=1) > 0
+
+    def get_mask(self, geometry: Optional[Dict[str, Any]]):
+        """Returns the pixels covered by a footprint geometry as a boolean window, along with its first row and
+        (unwrapped) first column on the grid.
+        """
+        rings = [(self.to_col(np.asarray(coords, dtype=float)[:, 0]), self.to_row(np.asarray(coords, dtype=float)[:, 1]), is_area)
+                 for coords, is_area in get_geometry_rings(geometry) if len(coords)]
+        if not rings:
+            return None, 0, 0
+        rings = [(self.unwrap(cols), rows, is_area) for cols, rows, is_area in rings]
+        all_cols = np.concatenate([cols for cols, _, _ in rings])
+        all_rows = np.concatenate([rows for _, rows, _ in rings])
+
+        col_offset = int(np.floor(all_cols.min()))
+        row_offset = max(int(np.floor(all_rows.min())), 0)
+        n_cols = min(int(np.ceil(all_cols.max())) - col_offset + 1, self.n_cols)
+        n_rows = min(int(np.ceil(all_rows.max())), self.n_rows) - row_offset + 1
+        if n_rows <= 0:
+            return None, 0, 0
+        window = np.zeros((n_rows, n_cols), dtype=bool)
+
+        for cols, rows, is_area in rings:
+            ring_window = np.zeros_like(window)
+            if is_area and len(cols) >= 4:
+                self.rasterize_ring(np.column_stack([cols, rows]), col_offset, row_offset, ring_window)
+            if not ring_window.any():  # points, lines, and footprints smaller than a pixel
+                ring_rows = np.clip(rows.astype(int) - row_offset, 0, n_rows - 1)
+                ring_cols = np.clip(cols.astype(int) - col_offset, 0, n_cols - 1)
+                ring_window[ring_rows, ring_cols] = True
+            window |= ring_window
+        return window, row_offset, col_offset
+
+    def update(self, stac_item: pystac.Item) -> None:
+        """Adds a STAC item footprint to the coverage counts."""
+        window, row_offset, col_offset = self.get_mask(stac_item.geometry)
+        if window is None:
+            return
+        self.n_items += 1
+        rows = np.arange(row_offset, min(row_offset + window.shape[0], self.n_rows))
+        cols = np.arange(col_offset, col_offset + window.shape[1]) % self.n_cols  # wrapped around the antimeridian
+        self.counts[np.ix_(rows, cols)] += window[:len(rows)]
+
+    def get_preview(self) -> np.ndarray:
+        """Returns a grayscale and alpha preview image of the counts, log-scaled, uncovered pixels transparent."""
+        max_count = self.counts.max()
+        gray = np.log1p(self.counts) / np.log1p(max_count) * 255 if max_count else np.zeros(self.counts.shape)
+        alpha = np.where(self.counts > 0, 255, 0)
+        return np.dstack([gray, alpha]).astype(np.uint8)
+
+    def save(self, coverage_file) -> None:
+        np.savez_compressed(coverage_file, counts=self.counts, pixels_per_degree=self.pixels_per_degree,
+                            bbox=np.array([-180.0, -90.0, 180.0, 90.0]), n_items=self.n_items)
+
+    @classmethod
+    def load(cls, coverage_file) -> 'CoverageAccumulator':
+        with np.load(coverage_file) as data:
+            coverage = cls(pixels_per_degree=float(data['pixels_per_degree']))
+            coverage.counts = data['counts']
+            coverage.n_items = int(data['n_items'])
+        return coverage
+
+    def write(self, collection_dir, stac_collection: pystac.Collection = None) -> List[Path]:
+        """Writes the count map and its PNG preview into the collection directory, and adds them as assets of the
+        STAC collection.
+        """
+        collection_dir = Path(collection_dir)
+        collection_dir.mkdir(parents=True, exist_ok=True)
+        self.save(collection_dir / COVERAGE_FILE_NAME)
+        write_png(collection_dir / PREVIEW_FILE_NAME, self.get_preview())
+
+        if stac_collection is not None:
+            stac_collection.add_asset('coverage', pystac.Asset(
+                href=f'./{COVERAGE_FILE_NAME}',
+                title='Coverage count map',
+                description=f'Number of items footprints covering each pixel of a global equirectangular grid at '
+                            f'{self.pixels_per_degree:g} pixels per degree (NumPy `counts` array, north up, from -180° '
+                            f'longitude).',
+                media_type='application/octet-stream',
+                roles=['metadata', 'coverage'],
+                extra_fields={'proj:shape': [self.n_rows, self.n_cols]}
+            ))
+            stac_collection.add_asset('coverage_preview', pystac.Asset(
+                href=f'./{PREVIEW_FILE_NAME}',
+                title='Coverage preview',
+                media_type=pystac.MediaType.PNG,
+                roles=['overview']
+            ))
+        return [collection_dir / COVERAGE_FILE_NAME, collection_dir / PREVIEW_FILE_NAME]
@@ -0,0 +1,240 @@
+"""Columnar export of STAC collections items to GeoParquet files.
+
+Items are buffered and written by row groups while the catalog is built, each row holding item ID, collection ID,
+WKB-encoded geometry, bbox, typed properties columns and assets hrefs, following the stac-geoparquet conventions.
+
+Column types are inferred for each row group, which is spooled to a temporary Arrow file, and the file schema is only
+fixed once all items are written: properties missing or null in some row groups are null in those, integers are
+promoted to floats, and conflicting types fall back to strings (JSON-encoded if needed). Row groups are then cast to
+the unified schema and written to the GeoParquet file, so that no property value is lost, whatever the row group in
+which it first appears.
+
+Requires the optional `pyarrow` dependency (`pip install labtools[parquet]`).
+"""
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from pathlib import Path
+import json
+import shutil
+import struct
+import tempfile
+
+import pystac
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+ROW_GROUP_SIZE = 1000  # number of items per row group
+DATETIME_PROPERTIES = ['datetime', 'created', 'updated', 'start_datetime', 'end_datetime']
+
+_WKB_TYPES = {
+    'Point': 1,
+    'LineString': 2,
+    'Polygon': 3,
+    'MultiPoint': 4,
+    'MultiLineString': 5,
+    'MultiPolygon': 6,
+    'GeometryCollection': 7
+}
+
+
+def _wkb_positions(positions: list) -> bytes:
+    return struct.pack('<I', len(positions)) + b''.join(struct.pack('<2d', position[0], position[1]) for position in positions)
+
+
+def geometry_to_wkb(geometry: Optional[Dict[str, Any]]) -> Optional[bytes]:
+    """Returns the 2D little-endian WKB encoding of a GeoJSON geometry."""
+    if not geometry:
+        return None
+    geometry_type = geometry['type']
+    header = struct.pack('<BI', 1, _WKB_TYPES[geometry_type])
+    coordinates = geometry.get('coordinates')
+    if geometry_type == 'Point':
+        return header + struct.pack('<2d', coordinates[0], coordinates[1])
+    elif geometry_type == 'LineString':
+        return header + _wkb_positions(coordinates)
+    elif geometry_type == 'Polygon':
+        return header + struct.pack('<I', len(coordinates)) + b''.join(_wkb_positions(ring) for ring in coordinates)
+    elif geometry_type == 'MultiPoint':
+        parts = [geometry_to_wkb({'type': 'Point', 'coordinates': point}) for point in coordinates]
+    elif geometry_type == 'MultiLineString':
+        parts = [geometry_to_wkb({'type': 'LineString', 'coordinates': line}) for line in coordinates]
+    elif geometry_type == 'MultiPolygon':
+        parts = [geometry_to_wkb({'type': 'Polygon', 'coordinates': polygon}) for polygon in coordinates]
+    else:
+        parts = [geometry_to_wkb(sub_geometry) for sub_geometry in geometry.get('geometries', [])]
+    return header + struct.pack('<I', len(parts)) + b''.join(parts)
+
+
+def _to_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+def item_to_record(stac_item: pystac.Item) -> Dict[str, Any]:
+    """Returns the row of a STAC item, as a flat dictionary of column values."""
+    record = {
+        'id': stac_item.id,
+        'collection': stac_item.collection_id,
+        'geometry': geometry_to_wkb(stac_item.geometry),
+        'bbox': dict(zip(['xmin', 'ymin', 'xmax', 'ymax'], stac_item.bbox[:4])) if stac_item.bbox else None,
+        'stac_extensions': list(stac_item.stac_extensions or []),
+        'assets': [(key, asset.href) for key, asset in stac_item.assets.items()]
+    }
+    for name, value in stac_item.properties.items():
+        if name in record:
+            continue
+        if name in DATETIME_PROPERTIES:
+            value = _to_datetime(value)
+        elif isinstance(value, dict):  # nested objects are stored as JSON strings
+            value = json.dumps(value)
+        record[name] = value
+    return record
+
+
+def _to_json(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+def to_column(name: str, values: list):
+    """Returns the Arrow array of a column values, with inferred type."""
+    column_type = {'geometry': pa.binary(), 'assets': pa.map_(pa.string(), pa.string())}.get(name)
+    try:
+        column = pa.array(values, type=column_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):  # eg: mixed types values
+        column = pa.array([_to_json(value) for value in values], type=pa.string())
+    if pa.types.is_integer(column.type):  # integer properties may hold float values in other row groups
+        column = column.cast(pa.float64())
+    elif pa.types.is_timestamp(column.type):
+        column = column.cast(pa.timestamp('us', tz='UTC'))
+    return column
+
+
+def unify_types(column_types: list):
+    """Returns the type of a column holding values of given types (eg: of several row groups)."""
+    column_types = list(dict.fromkeys(column_type for column_type in column_types if not pa.types.is_null(column_type)))
+    if not column_types:  # no value in any row group
+        return pa.string()
+    if len(column_types) == 1:
+        return column_types[0]
+    if all(pa.types.is_integer(column_type) or pa.types.is_floating(column_type) for column_type in column_types):
+        return pa.float64()
+    return pa.string()
+
+
+def cast_column(column, column_type):
+    """Returns a column cast to a unified type, JSON-encoding values which cannot be cast to strings."""
+    if column.type == column_type:
+        return column
+    try:
+        return column.cast(column_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):  # eg: lists to strings
+        return pa.array([_to_json(value) for value in column.to_pylist()], type=pa.string())
+
+
+class ParquetItemsWriter:
+    """Writes STAC items of a collection into a GeoParquet file, by row groups of `row_group_size` items."""
+
+    def __init__(self, parquet_file, row_group_size: int = ROW_GROUP_SIZE):
+        if pa is None:
+            raise ImportError('GeoParquet export requires the `pyarrow` package: pip install pyarrow')
+        self.parquet_file = Path(parquet_file)
+        self.row_group_size = row_group_size
+        self.records: List[Dict[str, Any]] = []
+        self.spool_dir = None
+        self.spool_files: List[Path] = []  # row groups Arrow files, with their own schema
+        self.spool_schemas = []
+        self.schema = None
+        self.geometry_types = set()
+        self.n_items = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_item(self, stac_item: pystac.Item) -> None:
+        self.records.append(item_to_record(stac_item))
+        if stac_item.geometry:
+            self.geometry_types.add(stac_item.geometry['type'])
+        if len(self.records) >= self.row_group_size:
+            self.flush()
+
+    def get_schema(self):
+        """Returns the schema unifying the schemas of the written row groups, columns ordered by first appearance."""
+        column_types = {}
+        for schema in self.spool_schemas:
+            for field in schema:
+                column_types.setdefault(field.name, []).append(field.type)
+        return pa.schema([pa.field(name, unify_types(types)) for name, types in column_types.items()])
+
+    def get_geo_metadata(self) -> Dict[str, Any]:
+        """Returns the GeoParquet `geo` file metadata."""
+        return {
+            'version': '1.0.0',
+            'primary_column': 'geometry',
+            'columns': {
+                'geometry': {
+                    'encoding': 'WKB',
+                    'geometry_types': sorted(self.geometry_types),
+                    'crs': None  # planetary body coordinates, undefined in OGC registries
+                }
+            }
+        }
+
+    def flush(self) -> None:
+        """Spools buffered items as a row group."""
+        if not self.records:
+            return
+        names = list(dict.fromkeys(name for record in self.records for name in record))
+        columns = [to_column(name, [record.get(name) for record in self.records]) for name in names]
+        table = pa.Table.from_arrays(columns, names=names)
+
+        if self.spool_dir is None:
+            self.parquet_file.parent.mkdir(parents=True, exist_ok=True)
+            self.spool_dir = Path(tempfile.mkdtemp(prefix=f'.{self.parquet_file.stem}.', dir=self.parquet_file.parent))
+        spool_file = self.spool_dir / f'{len(self.spool_files)}.arrow'
+        with pa.ipc.new_file(spool_file, table.schema) as spool_writer:
+            spool_writer.write_table(table)
+        self.spool_files.append(spool_file)
+        self.spool_schemas.append(table.schema)
+        self.n_items += len(self.records)
+        self.records = []
+
+    def close(self) -> None:
+        """Writes spooled row groups into the GeoParquet file, cast to the unified schema."""
+        self.flush()
+        if not self.spool_files:
+            return
+        self.schema = self.get_schema()
+        with pq.ParquetWriter(self.parquet_file, self.schema) as writer:
+            for spool_file in self.spool_files:
+                with pa.memory_map(str(spool_file)) as source:
+                    table = pa.ipc.open_file(source).read_all()
+                columns = [
+                    cast_column(table.column(field.name), field.type) if field.name in table.column_names
+                    else pa.nulls(table.num_rows, type=field.type)
+                    for field in self.schema
+                ]
+                writer.write_table(pa.Table.from_arrays(columns, schema=self.schema))
+            writer.add_key_value_metadata({'geo': json.dumps(self.get_geo_metadata())})
+        shutil.rmtree(self.spool_dir)
+        self.spool_dir = None
+        self.spool_files = []
+
+
+def read_parquet_items(parquet_file, columns: List[str] = None, filters=None):
+    """Returns the items of a GeoParquet file as a `pyarrow.Table`, with optional columns selection and row filters
+    (see `pyarrow.parquet.read_table`).
+    """
+    if pq is None:
+        raise ImportError('GeoParquet export requires the `pyarrow` package: pip install pyarrow')
+    return pq.read_table(parquet_file, columns=columns, filters=filters)
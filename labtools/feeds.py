@@ -0,0 +1,206 @@
+"""Newline-delimited JSON items feeds, and bulk loading to a STAC transactions endpoint.
+
+Items of each collection are written while the catalog is built, one JSON object per line, into gzip-compressed
+chunks of bounded size (eg: `feeds/mex_omega_c_proj_ddr/mex_omega_c_proj_ddr-00000.ndjson.gz`). Feeds are then
+loaded to a STAC API implementing the Transaction extension (eg: RESTO), by batches of items POSTed as feature
+collections from concurrent workers.
+"""
+from typing import Any, Dict, Iterable, Iterator, List
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import gzip
+import json
+import threading
+import time
+
+import pystac
+import requests
+
+MAX_CHUNK_SIZE = 64 * 1024 * 1024  # maximum number of uncompressed bytes per feed chunk
+BATCH_SIZE = 100  # number of items per transaction request
+N_WORKERS = 4  # number of concurrent transaction requests
+MAX_RETRIES = 3  # maximum number of retries of a failed transaction request
+TIMEOUT = 60  # transaction request timeout, in seconds
+
+# links generated by catalog servers, not loaded
+STRUCTURAL_LINKS_RELS = ['self', 'root', 'parent', 'collection']
+
+
+def get_feed_item_dict(stac_item: pystac.Item) -> Dict[str, Any]:
+    """Returns the dictionary of a STAC item to be loaded to a catalog server, without structural links."""
+    item_dict = stac_item.to_dict(include_self_link=False, transform_hrefs=False)
+    item_dict['links'] = [link for link in item_dict.get('links', []) if link.get('rel') not in STRUCTURAL_LINKS_RELS]
+    if stac_item.collection_id:
+        item_dict['collection'] = stac_item.collection_id
+    return item_dict
+
+
+class NDJSONFeedWriter:
+    """Writes STAC items of a collection into gzip-compressed NDJSON chunks of at most `max_chunk_size` uncompressed
+    bytes.
+    """
+
+    def __init__(self, feed_dir, collection_id: str, max_chunk_size: int = MAX_CHUNK_SIZE):
+        self.feed_dir = Path(feed_dir)
+        self.collection_id = collection_id
+        self.max_chunk_size = max_chunk_size
+        self.chunk_files: List[Path] = []
+        self.n_items = 0
+        self._file = None
+        self._chunk_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open_chunk(self) -> None:
+        self.feed_dir.mkdir(parents=True, exist_ok=True)
+        chunk_file = self.feed_dir / f'{self.collection_id}-{len(self.chunk_files):05d}.ndjson.gz'
+        self._file = gzip.open(chunk_file, 'wb')
+        self._chunk_size = 0
+        self.chunk_files.append(chunk_file)
+
+    def write_item(self, stac_item: pystac.Item) -> None:
+        self.write_dict(get_feed_item_dict(stac_item))
+
+    def write_dict(self, item_dict: Dict[str, Any]) -> None:
+        line = json.dumps(item_dict, separators=(',', ':')).encode('utf-8') + b'\n'
+        if self._file is None or (self._chunk_size and self._chunk_size + len(line) > self.max_chunk_size):
+            self.close()
+            self._open_chunk()
+        self._file.write(line)
+        self._chunk_size += len(line)
+        self.n_items += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def find_feed_files(feeds_dir, collection_id: str = None) -> List[Path]:
+    """Returns the sorted feed chunk files of a feeds directory, optionally restricted to a given collection."""
+    pattern = f'{collection_id}/{collection_id}-*.ndjson.gz' if collection_id else '*/*.ndjson.gz'
+    return sorted(Path(feeds_dir).glob(pattern))
+
+
+def iter_feed_items(feed_files: Iterable) -> Iterator[Dict[str, Any]]:
+    """Yields the item dictionaries of NDJSON feed files, gzip-compressed or not, reading one line at a time."""
+    for feed_file in feed_files:
+        open_file = gzip.open if str(feed_file).endswith('.gz') else open
+        with open_file(feed_file, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkLoader:
+    """Loads STAC items to a STAC API Transaction extension endpoint, POSTing batches of items as feature
+    collections to `{endpoint_url}/collections/{collection_id}/items` from concurrent workers.
+
+    Failed requests (connection errors, 429 and 5xx responses) are retried with exponential backoff; batches still
+    failing afterwards are counted, and their items IDs reported.
+    """
+
+    def __init__(self, endpoint_url: str, token: str = None, batch_size: int = BATCH_SIZE, n_workers: int = N_WORKERS,
+                 max_retries: int = MAX_RETRIES, timeout: float = TIMEOUT):
+        self.endpoint_url = endpoint_url.rstrip('/')
+        self.headers = {'Content-Type': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f'Bearer {token}'
+        self.batch_size = batch_size
+        self.n_workers = n_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _get_session(self) -> requests.Session:
+        if not hasattr(self._local, 'session'):  # one connection pool per worker thread
+            self._local.session = requests.Session()
+            self._local.session.headers.update(self.headers)
+        return self._local.session
+
+    def post_batch(self, collection_id: str, items: List[Dict[str, Any]]) -> bool:
+        """POSTs a batch of items to the collection items endpoint, and returns True if successful."""
+        url = f'{self.endpoint_url}/collections/{collection_id}/items'
+        body = json.dumps({'type': 'FeatureCollection', 'features': items}, separators=(',', ':'))
+        for attempt in range(self.max_retries + 1):
+            try:
+                r = self._get_session().post(url, data=body, timeout=self.timeout)
+                if r.ok:
+                    return True
+                if r.status_code != 429 and r.status_code < 500:
+                    print(f'ERROR: {r.status_code} response from {url}: {r.text[:200]}')
+                    return False
+            except requests.RequestException as e:
+                print(e)
+            if attempt < self.max_retries:
+                time.sleep(0.5 * 2 ** attempt)
+        print(f'ERROR: Could not load batch of {len(items)} items to {url}.')
+        return False
+
+    def load(self, collection_id: str, items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Loads items to a collection, keeping at most twice the number of workers batches in memory, and returns
+        loading statistics.
+        """
+        n_items = 0
+        n_batches = 0
+        failed_ids = []
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            pending = {}
+            for batch in iter_batches(items, self.batch_size):
+                if len(pending) >= 2 * self.n_workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch_ids = pending.pop(future)
+                        if not future.result():
+                            failed_ids.extend(batch_ids)
+                pending[executor.submit(self.post_batch, collection_id, batch)] = [item.get('id') for item in batch]
+                n_items += len(batch)
+                n_batches += 1
+            for future in pending:
+                if not future.result():
+                    failed_ids.extend(pending[future])
+
+        elapsed_time = time.perf_counter() - start_time
+        return {
+            'collection': collection_id,
+            'n_items': n_items,
+            'n_batches': n_batches,
+            'n_loaded': n_items - len(failed_ids),
+            'failed_ids': failed_ids,
+            'elapsed_time': elapsed_time,
+            'items_per_second': n_items / elapsed_time if elapsed_time else None
+        }
+
+
+def load_feeds(feeds_dir, endpoint_url: str, collections_ids: List[str] = None, token: str = None,
+               batch_size: int = BATCH_SIZE, n_workers: int = N_WORKERS) -> List[Dict[str, Any]]:
+    """Loads the NDJSON feeds of a feeds directory to a STAC transactions endpoint, and returns loading statistics
+    per collection.
+    """
+    loader = BulkLoader(endpoint_url, token=token, batch_size=batch_size, n_workers=n_workers)
+    if not collections_ids:
+        collections_ids = sorted(path.name for path in Path(feeds_dir).iterdir() if path.is_dir())
+    results = []
+    for collection_id in collections_ids:
+        feed_files = find_feed_files(feeds_dir, collection_id)
+        if not feed_files:
+            print(f'WARNING: No feed files found for {collection_id!r} collection in {feeds_dir}.')
+            continue
+        results.append(loader.load(collection_id, iter_feed_items(feed_files)))
+    return results
@@ -0,0 +1,164 @@
+"""Footprint extraction from raster valid-data masks.
+
+Valid pixels are grouped into connected regions, holes are filled, and the outer boundary of each region is traced
+along pixel edges. Boundaries are then simplified and converted to geographic coordinates using the pixel centers
+latitudes and longitudes, so as to produce a GeoJSON Polygon or MultiPolygon geometry closely matching the data.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy import ndimage
+
+MIN_REGION_SIZE = 4  # minimum number of valid pixels for a region to be part of the footprint
+SIMPLIFY_TOLERANCE = 1.0  # maximum boundary simplification error, in pixels
+
+# directions of boundary edges in (row, col) corner-grid coordinates: east, south, west, north
+_EDGE_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+
+def label_regions(mask: np.ndarray, min_region_size: int = MIN_REGION_SIZE) -> tuple:
+    """Labels 4-connected regions of valid pixels, and returns the labels array along with the slices and labels
+    of regions at least `min_region_size` pixels large.
+    """
+    labels, n_regions = ndimage.label(mask)
+    if n_regions == 0:
+        return labels, []
+    sizes = np.bincount(labels.ravel(), minlength=n_regions + 1)
+    regions = []
+    for i, region_slice in enumerate(ndimage.find_objects(labels), start=1):
+        if region_slice is not None and sizes[i] >= min_region_size:
+            regions.append((i, region_slice))
+    return labels, regions
+
+
+def trace_boundaries(region_mask: np.ndarray) -> List[np.ndarray]:
+    """Returns the outer boundaries of a connected region as closed rings of (row, col) pixel corners.
+
+    Holes are filled beforehand, and boundary edges are followed clockwise in (row, col) space, always taking the
+    rightmost turn where two edges leave the same corner. Regions whose pixels only touch diagonally are therefore
+    split into several simple rings instead of a single self-touching one.
+    """
+    m = np.pad(ndimage.binary_fill_holes(region_mask), 1)
+    inner = m[1:-1, 1:-1]
+
+    # boundary edges start corners, per heading direction (interior lying on the right-hand side)
+    starts = [
+        np.argwhere(inner & ~m[:-2, 1:-1]),           # top edges, heading east
+        np.argwhere(inner & ~m[1:-1, 2:]) + (0, 1),   # right edges, heading south
+        np.argwhere(inner & ~m[2:, 1:-1]) + (1, 1),   # bottom edges, heading west
+        np.argwhere(inner & ~m[1:-1, :-2]) + (1, 0),  # left edges, heading north
+    ]
+    edges = {}
+    for direction, corners in enumerate(starts):
+        for r, c in corners.tolist():
+            edges.setdefault((r, c), []).append(direction)
+
+    rings = []
+    for r, c in starts[0].tolist():  # every ring has at least one top edge
+        if 0 not in edges.get((r, c), []):
+            continue
+        start = corner = (r, c)
+        direction = 0
+        ring = [start]
+        while True:
+            directions = edges[corner]
+            directions.remove(direction)
+            if not directions:
+                del edges[corner]
+            corner = (corner[0] + _EDGE_STEPS[direction][0], corner[1] + _EDGE_STEPS[direction][1])
+            ring.append(corner)
+            if corner == start:
+                break
+            # rightmost turn first, then straight ahead, then leftmost turn
+            direction = min(edges[corner], key=lambda d: (direction - d + 1) % 4)
+        rings.append(np.array(ring, dtype=float))
+
+    return rings
+
+
+def simplify_ring(ring: np.ndarray, tolerance: float = SIMPLIFY_TOLERANCE) -> np.ndarray:
+    """Simplifies a closed ring using the Douglas-Peucker algorithm, keeping at least four vertices.
+    """
+    # drop collinear corners of staircase runs
+    d_prev = ring[1:-1] - ring[:-2]
+    d_next = ring[2:] - ring[1:-1]
+    keep = np.ones(len(ring), dtype=bool)
+    keep[1:-1] = (d_prev[:, 0] * d_next[:, 1] - d_prev[:, 1] * d_next[:, 0]) != 0
+    ring = ring[keep]
+    if len(ring) <= 5 or tolerance <= 0:
+        return ring
+
+    # split ring at the vertex farthest from the start vertex, and simplify both halves
+    split = int(np.argmax(np.sum((ring - ring[0]) ** 2, axis=1)))
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[[0, split, -1]] = True
+    stack = [(0, split), (split, len(ring) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = ring[last] - ring[first]
+        points = ring[first + 1:last] - ring[first]
+        length = np.hypot(segment[0], segment[1])
+        if length > 0:
+            distances = np.abs(segment[0] * points[:, 1] - segment[1] * points[:, 0]) / length
+        else:
+            distances = np.hypot(points[:, 0], points[:, 1])
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            index = first + 1 + i
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    simplified = ring[keep]
+    if len(simplified) < 4:
+        return ring
+    return simplified
+
+
+def pixel_corners(centers: np.ndarray) -> np.ndarray:
+    """Returns the N+1 pixel corner coordinates given N pixel center coordinates along one axis.
+    """
+    centers = np.asarray(centers, dtype=float)
+    if len(centers) == 1:
+        return np.array([centers[0] - 0.5, centers[0] + 0.5])
+    corners = np.empty(len(centers) + 1)
+    corners[1:-1] = (centers[:-1] + centers[1:]) / 2.0
+    corners[0] = centers[0] - (centers[1] - centers[0]) / 2.0
+    corners[-1] = centers[-1] + (centers[-1] - centers[-2]) / 2.0
+    return corners
+
+
+def get_mask_footprint(mask: np.ndarray, latitudes, longitudes, min_region_size: int = MIN_REGION_SIZE,
+                       tolerance: float = SIMPLIFY_TOLERANCE) -> Optional[Dict[str, Any]]:
+    """Returns the GeoJSON Polygon or MultiPolygon geometry covering the valid pixels of a (latitude, longitude)
+    gridded mask, or None if no valid region is found.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    labels, regions = label_regions(mask, min_region_size=min_region_size)
+    if not regions:
+        return None
+
+    lat_corners = np.clip(pixel_corners(latitudes), -90.0, 90.0)
+    lon_corners = pixel_corners(longitudes)
+
+    polygons: List[list] = []
+    for label, region_slice in regions:
+        region_mask = labels[region_slice] == label
+        for ring in trace_boundaries(region_mask):
+            ring = simplify_ring(ring, tolerance=tolerance)
+            rows = ring[:, 0].astype(int) + region_slice[0].start
+            cols = ring[:, 1].astype(int) + region_slice[1].start
+            lons = lon_corners[cols]
+            lats = lat_corners[rows]
+
+            # exterior rings are counterclockwise (RFC 7946)
+            signed_area = np.sum(lons[:-1] * lats[1:] - lons[1:] * lats[:-1])
+            if signed_area < 0:
+                lons = lons[::-1]
+                lats = lats[::-1]
+            polygons.append([[[float(lon), float(lat)] for lon, lat in zip(lons, lats)]])
+
+    if len(polygons) == 1:
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
@@ -0,0 +1,165 @@
+"""FITS data products metadata extraction.
+
+Headers are read without loading data, and image statistics are accumulated band by band over row slabs of
+memory-mapped data, so that large global maps (eg: 21600x10800 pixels) are never fully loaded in memory.
+"""
+from typing import Any, Dict, Optional
+from functools import lru_cache
+from itertools import product
+
+import numpy as np
+from astropy.io import fits
+
+CHUNK_SIZE = 64 * 1024 * 1024  # maximum number of bytes of data read at once
+
+BITPIX_DATA_TYPES = {
+    8: 'uint8',
+    16: 'int16',
+    32: 'int32',
+    64: 'int64',
+    -32: 'float32',
+    -64: 'float64'
+}
+
+
+def get_image_hdu_index(hdul: fits.HDUList) -> Optional[int]:
+    """Returns the index of the first HDU holding image data, or None if not found."""
+    for i, hdu in enumerate(hdul):
+        if isinstance(hdu, (fits.PrimaryHDU, fits.ImageHDU)) and hdu.header.get('NAXIS', 0) >= 2:
+            return i
+    return None
+
+
+def get_fits_header_metadata(fits_file) -> Dict[str, Any]:
+    """Returns image dimensions, data type, unit and coordinates system of a FITS data product, reading headers only.
+    """
+    with fits.open(fits_file, memmap=True, lazy_load_hdus=True) as hdul:
+        hdu_index = get_image_hdu_index(hdul)
+        if hdu_index is None:
+            raise ValueError(f'No image HDU found in FITS file: {fits_file}')
+        header = hdul[hdu_index].header
+
+        bitpix = header['BITPIX']
+        scale = header.get('BSCALE', 1.0)
+        offset = header.get('BZERO', 0.0)
+        data_type = BITPIX_DATA_TYPES.get(bitpix)
+        if bitpix == 16 and scale == 1 and offset == 32768:  # unsigned integers convention
+            data_type = 'uint16'
+            offset = 0.0
+
+        metadata = {
+            'hdu_index': hdu_index,
+            'n_samples': header['NAXIS1'],
+            'n_lines': header['NAXIS2'],
+            'n_bands': header.get('NAXIS3', 1),
+            'data_type': data_type,
+            'scale': scale,
+            'offset': offset,
+            'unit': header.get('BUNIT'),
+            'nodata': header.get('BLANK'),
+            'ctype': [header.get('CTYPE1'), header.get('CTYPE2')]
+        }
+
+    return metadata
+
+
+def get_fits_statistics(fits_file, hdu_index: int = None, nodata: float = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Returns minimum, maximum, mean, standard deviation and valid pixels percentage of FITS image data.
+
+    Data are memory-mapped and read band by band, by slabs of image rows of at most `chunk_size` bytes (or a single
+    row if larger). Non-finite values, BLANK integer values and optional `nodata` values are excluded.
+    """
+    with fits.open(fits_file, memmap=True, lazy_load_hdus=True, do_not_scale_image_data=True) as hdul:
+        if hdu_index is None:
+            hdu_index = get_image_hdu_index(hdul)
+            if hdu_index is None:
+                raise ValueError(f'No image HDU found in FITS file: {fits_file}')
+        hdu = hdul[hdu_index]
+        header = hdu.header
+        bscale = header.get('BSCALE', 1.0)
+        bzero = header.get('BZERO', 0.0)
+        blank = header.get('BLANK') if header['BITPIX'] > 0 else None
+
+        data = hdu.data  # memory-mapped, not loaded
+        n_lines, n_samples = data.shape[-2:]
+        bands = data.reshape(-1, n_lines, n_samples)  # 2D planes of NAXIS3+ cubes, as a view
+        row_nbytes = max(1, n_samples * data.dtype.itemsize)
+        rows_per_chunk = max(1, chunk_size // row_nbytes)
+
+        count = 0
+        total = 0.0
+        total_sq = 0.0
+        minimum = np.inf
+        maximum = -np.inf
+        for band, start in product(range(bands.shape[0]), range(0, n_lines, rows_per_chunk)):
+            slab = np.asarray(bands[band, start:start + rows_per_chunk])
+            valid = np.isfinite(slab) if slab.dtype.kind == 'f' else np.ones(slab.shape, dtype=bool)
+            if blank is not None:
+                valid &= slab != blank
+            values = slab[valid].astype(np.float64)
+            if bscale != 1.0 or bzero != 0.0:
+                values = values * bscale + bzero
+            if nodata is not None:
+                values = values[values != nodata]
+            if values.size == 0:
+                continue
+            count += values.size
+            total += float(values.sum())
+            total_sq += float(np.square(values).sum())
+            minimum = min(minimum, float(values.min()))
+            maximum = max(maximum, float(values.max()))
+
+        n_pixels = int(np.prod(data.shape))
+        del data, bands
+
+    statistics = {
+        'minimum': None,
+        'maximum': None,
+        'mean': None,
+        'stddev': None,
+        'valid_percent': 100.0 * count / n_pixels if n_pixels else 0.0
+    }
+    if count:
+        mean = total / count
+        statistics.update({
+            'minimum': minimum,
+            'maximum': maximum,
+            'mean': mean,
+            'stddev': float(np.sqrt(max(total_sq / count - mean * mean, 0.0)))
+        })
+    return statistics
+
+
+@lru_cache(maxsize=16)
+def get_fits_metadata(fits_file, nodata: float = None) -> Dict[str, Any]:
+    """Returns FITS header metadata along with image statistics, cached per file."""
+    metadata = get_fits_header_metadata(fits_file)
+    metadata['statistics'] = get_fits_statistics(fits_file, hdu_index=metadata['hdu_index'], nodata=nodata)
+    return metadata
+
+
+def get_fits_properties(fits_file) -> Dict[str, Any]:
+    """Returns a selection of item properties derived from a FITS data product."""
+    metadata = get_fits_metadata(str(fits_file))
+    return {
+        'n_samples': metadata['n_samples'],
+        'n_lines': metadata['n_lines'],
+        'valid_percent': metadata['statistics']['valid_percent']
+    }
+
+
+def get_fits_raster_bands(fits_file) -> list[Dict[str, Any]]:
+    """Returns the STAC raster extension `raster:bands` metadata of a FITS data product."""
+    metadata = get_fits_metadata(str(fits_file))
+    band = {
+        'data_type': metadata['data_type'],
+        'statistics': {key: value for key, value in metadata['statistics'].items() if value is not None}
+    }
+    if metadata['nodata'] is not None:
+        band['nodata'] = metadata['nodata']
+    if metadata['scale'] != 1 or metadata['offset'] != 0:
+        band['scale'] = metadata['scale']
+        band['offset'] = metadata['offset']
+    if metadata['unit']:
+        band['unit'] = metadata['unit']
+    return [band]
@@ -1,103 +1,168 @@
-from typing import Any, Dict, List, Union, Optional
-from pathlib import Path
+from typing import Any, Dict, Optional
 
 import netCDF4
 import numpy as np
-import json
-import geojson
-from geojson import Polygon
-from datetime import datetime
 
 from labtools.utils import utc_to_iso
+from labtools.footprint import get_mask_footprint
+from labtools.metrics import metrics
 
 def get_netcdf_footprint(netcdf_file) -> Optional[Dict[str, Any]]:
     """Returns the GeoJSON Geometry of a OMEGA_C_Channel_Proj NetCDF data product.
+
+    The footprint is a Polygon, or a MultiPolygon if the cube holds several disjoint regions of valid `altitude`
+    values.
     """
     try:
-        nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
+        with metrics.timer('netcdf.open'):
+            nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
     except Exception as e:
         print(e)
         print(f'Unable to read NetCDF data product: {netcdf_file}')
         return None
-    alt = nc_dataset.variables['altitude']
-    latitudes = nc_dataset.variables['latitude']
-    longitudes = nc_dataset.variables['longitude']
-
-    top_pts = []
-    right_pts = []
-    bottom_pts = []
-    left_pts = []
-    for i in range(alt.shape[0]):
-        m = np.where(alt[i, :].mask == False)
-        if len(m[0]) > 0:
-            top_pts.append((i, m[0][0]))
-            bottom_pts.append((i, m[0][-1]))
-
-    for j in range(alt.shape[1]):
-        m = np.where(alt[:, j].mask == False)
-        if len(m[0]) > 0:
-            left_pts.append((m[0][0], j))
-            right_pts.append((m[0][-1], j))
-
-    bottom_pts.reverse()
-    left_pts.reverse()
-
-    poly_pts = []
-    for top_pt in top_pts:
-        poly_pts.append(top_pt)
-    last_poly_pt = poly_pts[-1]
-    for right_pt in right_pts:
-        if right_pt[1] > last_poly_pt[1]:
-            if right_pt not in top_pts:
-                poly_pts.append(right_pt)
-    last_poly_pt = poly_pts[-1]
-    for bottom_pt in bottom_pts:
-        if bottom_pt[0] < last_poly_pt[0]:
-            if bottom_pt not in right_pts:
-                poly_pts.append(bottom_pt)
-    last_poly_pt = poly_pts[-1]
-    for left_pt in left_pts:
-        # if bottom_pt[1] < last_poly_pt[1]: error ??
-        if left_pt[1] < last_poly_pt[1]:
-            if (left_pt not in bottom_pts) and (left_pt not in top_pts):  # top_pts
-                poly_pts.append(left_pt)
-
-    poly_geopts = []  # (lon, lat)
-    for poly_pt in poly_pts:
-        lon = float(longitudes[poly_pt[1]].data)
-        lat = float(latitudes[poly_pt[0]].data)
-        poly_geopts.append((lon, lat))
-    poly_geopts.append(poly_geopts[0])  # close polygon
-
-    geometry = json.loads(geojson.dumps(Polygon([poly_geopts])))
+    with metrics.timer('netcdf.read_mask'):
+        alt = nc_dataset.variables['altitude']
+        latitudes = nc_dataset.variables['latitude'][:]
+        longitudes = nc_dataset.variables['longitude'][:]
+
+        # valid data mask, from which connected regions footprints are traced
+        valid_mask = ~np.ma.getmaskarray(alt[:])
+    with metrics.timer('footprint.trace'):
+        geometry = get_mask_footprint(valid_mask, np.ma.getdata(latitudes), np.ma.getdata(longitudes))
 
     nc_dataset.close()
 
     return geometry
 
 
+CHUNK_SIZE = 16 * 1024 * 1024  # maximum number of bytes of variable data read at once
+SAMPLE_SIZE = 65536  # number of values sampled for percentiles estimation
+PERCENTILES = [5, 50, 95]
+STATISTICS_VARIABLES = ['tau', 'watericelin', 'icecloudindex']
+
+
+class StreamingStatistics:
+    """Accumulates count, sum, minimum, maximum, NaN and masked values counts over successive arrays of values.
+
+    Percentiles are estimated from a fixed-size reservoir sample of valid values, and are exact as long as the number
+    of valid values does not exceed the sample size.
+    """
+    def __init__(self, sample_size: int = SAMPLE_SIZE, seed: int = 0):
+        self.n_values = 0
+        self.count = 0
+        self.n_nan = 0
+        self.n_masked = 0
+        self.sum = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.sample = np.empty(sample_size)
+        self.n_sampled = 0
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values) -> None:
+        masked = np.ma.getmaskarray(values)
+        data = np.ma.getdata(values)
+        self.n_values += data.size
+        self.n_masked += int(masked.sum())
+        nan = np.isnan(data) & ~masked if data.dtype.kind == 'f' else np.zeros(data.shape, dtype=bool)
+        self.n_nan += int(nan.sum())
+        valid = data[~(masked | nan)].astype(np.float64)
+        if valid.size == 0:
+            return
+        self.count += valid.size
+        self.sum += float(valid.sum())
+        self.minimum = min(self.minimum, float(valid.min()))
+        self.maximum = max(self.maximum, float(valid.max()))
+
+        # reservoir sampling: fill the sample first, then replace sampled values with decreasing probability
+        sample_size = len(self.sample)
+        n_fill = min(sample_size - self.n_sampled, valid.size)
+        if n_fill > 0:
+            self.sample[self.n_sampled:self.n_sampled + n_fill] = valid[:n_fill]
+            self.n_sampled += n_fill
+        remaining = valid[n_fill:]
+        if remaining.size:
+            seen = self.count - remaining.size + np.arange(remaining.size)
+            slots = (self.rng.random(remaining.size) * (seen + 1)).astype(np.int64)
+            accepted = slots < sample_size
+            self.sample[slots[accepted]] = remaining[accepted]
+
+    def result(self, percentiles: list = PERCENTILES) -> Dict[str, Any]:
+        statistics = {
+            'count': self.count,
+            'nan_count': self.n_nan,
+            'valid_fraction': self.count / self.n_values if self.n_values else 0.0,
+            'minimum': None,
+            'maximum': None,
+            'mean': None,
+            'percentiles': {}
+        }
+        if self.count:
+            statistics.update({
+                'minimum': self.minimum,
+                'maximum': self.maximum,
+                'mean': self.sum / self.count,
+                'percentiles': {
+                    p: float(v) for p, v in zip(percentiles, np.percentile(self.sample[:self.n_sampled], percentiles))
+                }
+            })
+        return statistics
+
+
+def iter_variable_slabs(variable: netCDF4.Variable, chunk_size: int = CHUNK_SIZE):
+    """Yields successive slabs of a NetCDF variable along its first dimension, aligned on the variable chunks and
+    holding at most `chunk_size` bytes (or a single chunk row).
+    """
+    if variable.ndim == 0:
+        yield variable[...]
+        return
+    n_rows = variable.shape[0]
+    row_nbytes = max(1, int(np.prod(variable.shape[1:])) * variable.dtype.itemsize)
+    chunking = variable.chunking()
+    chunk_rows = 1 if chunking == 'contiguous' else chunking[0]
+    rows = max(chunk_rows, (chunk_size // row_nbytes) // chunk_rows * chunk_rows)
+    for start in range(0, n_rows, rows):
+        yield variable[start:start + rows]
+
+
+def get_variable_statistics(variable: netCDF4.Variable, percentiles: list = PERCENTILES, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Returns NaN-aware statistics of a NetCDF variable, read by chunk-aligned slabs so as to bound memory usage.
+    """
+    statistics = StreamingStatistics()
+    for slab in iter_variable_slabs(variable, chunk_size=chunk_size):
+        statistics.update(slab)
+    return statistics.result(percentiles=percentiles)
+
+
+@metrics.timed('netcdf.statistics')
+def get_statistics_properties(nc_dataset: netCDF4.Dataset) -> Dict[str, Any]:
+    """Returns item properties derived from OMEGA NetCDF variables statistics."""
+    # derive i,e,phase angles from data product
+    props = {'incidence_angle': get_variable_statistics(nc_dataset['incidence_n'])['mean']}
+    for name in STATISTICS_VARIABLES:
+        statistics = get_variable_statistics(nc_dataset[name])
+        props.update({
+            f'mean_{name}': statistics['mean'],
+            f'min_{name}': statistics['minimum'],
+            f'max_{name}': statistics['maximum'],
+            f'median_{name}': statistics['percentiles'].get(50),
+            f'{name}_valid_fraction': statistics['valid_fraction']
+        })
+    return props
+
+
 def get_netcdf_properties(netcdf_file, schema_name):
     """Returns a selection of metadata derived from a OMEGA_C_Channel_Proj NetCDF data product.
     """
     if schema_name == 'OMEGA_C_PROJ':
         try:
-            nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
-            # derive i,e,phase angles from data product
-            incidence_angle = float(np.mean(nc_dataset['incidence_n']).data)
-            mean_tau = float(np.mean(nc_dataset['tau']).data)
-            mean_tau = mean_tau if not np.isnan(mean_tau) else None
-            mean_watericelin = float(np.mean(nc_dataset['watericelin']).data)
-            mean_watericelin = mean_watericelin if not np.isnan(mean_watericelin) else None
-            mean_icecloudindex = float(np.mean(nc_dataset['icecloudindex']).data)
-            mean_icecloudindex = mean_icecloudindex if not np.isnan(mean_icecloudindex) else None
+            with metrics.timer('netcdf.open'):
+                nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
             props = {
                 # 'title': nc_dataset.title,
                 # 'created': nc_dataset.history  # TODO: parse 'Created 28/03/18'
-                'mean_tau': mean_tau, # float(np.mean(nc_dataset['tau']).data),
-                'mean_watericelin': mean_watericelin,  # float(np.mean(nc_dataset['watericelin']).data),
-                'mean_icecloudindex': mean_icecloudindex,  # float(np.mean(nc_dataset['icecloudindex']).data),
-                'incidence_angle': incidence_angle
             }
+            props.update(get_statistics_properties(nc_dataset))
             nc_dataset.close()
             return props
         except Exception as e:
@@ -108,24 +173,14 @@ def get_netcdf_properties(netcdf_file, schema_name):
         # ATTENTION: Currently assuming that a OMEGA_C_PROJ NetCDF file is read so as to retrieve start and stop times
         # mission in OMEGA_CUBE NetCDF files.
         try:
-            nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
-            # derive i,e,phase angles from data product
-            incidence_angle = float(np.mean(nc_dataset['incidence_n']).data)
-            mean_tau = float(np.mean(nc_dataset['tau']).data)
-            mean_tau = mean_tau if not np.isnan(mean_tau) else None
-            mean_watericelin = float(np.mean(nc_dataset['watericelin']).data)
-            mean_watericelin = mean_watericelin if not np.isnan(mean_watericelin) else None
-            mean_icecloudindex = float(np.mean(nc_dataset['icecloudindex']).data)
-            mean_icecloudindex = mean_icecloudindex if not np.isnan(mean_icecloudindex) else None
+            with metrics.timer('netcdf.open'):
+                nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
             props = {
                 'datetime': utc_to_iso(nc_dataset.variables['start_time'].getValue(), timespec='milliseconds'),
                 'start_time': utc_to_iso(nc_dataset.variables['start_time'].getValue(), timespec='milliseconds'),
                 'end_time': utc_to_iso(nc_dataset.variables['stop_time'].getValue(), timespec='milliseconds'),
-                'mean_tau': mean_tau, # float(np.mean(nc_dataset['tau']).data),
-                'mean_watericelin': mean_watericelin,  # float(np.mean(nc_dataset['watericelin']).data),
-                'mean_icecloudindex': mean_icecloudindex,  # float(np.mean(nc_dataset['icecloudindex']).data),
-                'incidence_angle': incidence_angle
             }
+            props.update(get_statistics_properties(nc_dataset))
             nc_dataset.close()
             return props
         except Exception as e:
@@ -133,4 +188,4 @@ def get_netcdf_properties(netcdf_file, schema_name):
             print(f'Unable to read NetCDF data product: {netcdf_file}')
             return {}
     else:
-        raise Exception(f'Unknown schema name: {schema_name}')
\ No newline at end of file
+        raise Exception(f'Unknown schema name: {schema_name}')
@@ -4,18 +4,122 @@ from contextlib import closing
 import requests
 from pathlib import Path
 import json
+import re
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, Optional, Tuple
 from pydantic import BaseModel
 import shutil
 
 import netCDF4
 
 from labtools.schemas import factory
+from labtools.metrics import metrics
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # bytes read at once from download responses
+READ_CHUNK_SIZE = 64 * 1024  # characters read at once from streamed source collection files
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
 
 class PSUP_Collection(BaseModel):
     id: str
     schema_name: str
     n_products: int
 
+
+# PSUP footprint strings, eg: '((-180,-90),(-180,90),(180,90),(180,-90))'
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_POINT = rf'\(\s*({_NUMBER})\s*,\s*({_NUMBER})\s*\)'
+FOOTPRINT_POINT_PATTERN = re.compile(_POINT)
+FOOTPRINT_PATTERN = re.compile(rf'\s*\(\s*{_POINT}(?:\s*,\s*{_POINT})*\s*\)\s*')
+
+
+@lru_cache(maxsize=16384)  # more than the number of products of the largest PSUP collections
+def parse_footprint(footprint: str) -> tuple:
+    """Returns the closed ring of (lon, lat) points of a PSUP footprint string.
+
+    Parsed rings are cached, so that geometry and bbox of a given record are derived from a single parse.
+    """
+    if not FOOTPRINT_PATTERN.fullmatch(footprint):
+        raise ValueError(f'Invalid PSUP footprint: {footprint!r}')
+    ring = tuple((float(lon), float(lat)) for lon, lat in FOOTPRINT_POINT_PATTERN.findall(footprint))
+    if ring[0] != ring[-1]:
+        ring = ring + (ring[0],)
+    return ring
+
+
+def parse_footprints(footprints: Iterable[str]) -> list[Optional[tuple]]:
+    """Returns the closed rings of a sequence of PSUP footprint strings, eg: all footprints of a collection, or None
+    for invalid ones. Each distinct footprint is parsed once, and rings are cached for `parse_footprint`.
+    """
+    footprints = list(footprints)
+    rings = {}
+    for footprint in set(footprints):
+        try:
+            rings[footprint] = parse_footprint(footprint)
+        except ValueError:
+            rings[footprint] = None
+    return [rings[footprint] for footprint in footprints]
+
+
+def get_footprint_geometry(footprint: str) -> dict:
+    """Returns the GeoJSON Polygon geometry of a PSUP footprint string."""
+    ring = parse_footprint(footprint)
+    return {'type': 'Polygon', 'coordinates': [[list(point) for point in ring]]}
+
+
+def get_footprint_bbox(footprint: str) -> list[float]:
+    """Returns the [west, south, east, north] bounding box of a PSUP footprint string."""
+    ring = parse_footprint(footprint)
+    lons = [point[0] for point in ring]
+    lats = [point[1] for point in ring]
+    return [min(lons), min(lats), max(lons), max(lats)]
+
+def get_product_data_file(product_metadata, data_path) -> Optional[Path]:
+    """Returns the local data file of a source product, as expected by transformers, or None if unknown."""
+    if not data_path or not hasattr(product_metadata, 'get_download_url'):
+        return None
+    return Path(data_path) / 'data' / Path(product_metadata.get_download_url()).name
+
+
+def parse_human_file_size(human_file_size: str) -> Optional[int]:
+    """Returns the number of bytes of a PSUP human-readable file size, eg: '9.3 MB', or None if invalid."""
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMG]?B)\s*', human_file_size or '', flags=re.IGNORECASE)
+    if not match:
+        return None
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def get_product_size(product_metadata, data_path) -> Optional[int]:
+    """Returns the size of the data file of a source product: of the local file if downloaded, or as announced by
+    PSUP (eg: `nc_human_file_size`) otherwise, or None if unknown.
+    """
+    data_file = get_product_data_file(product_metadata, data_path)
+    if data_file and data_file.exists():
+        return data_file.stat().st_size
+    return parse_human_file_size(getattr(product_metadata, 'nc_human_file_size', None))
+
+
+def download_data_file(product_metadata, data_dir, overwrite=False) -> Path:
+    """Downloads the data file of a source product into a data directory, unless already downloaded, and returns its
+    path. The file is written under a `.part` suffix and renamed once complete, so that an interrupted download is
+    never taken for a downloaded file.
+    """
+    url = product_metadata.get_download_url()
+    product_path = Path(data_dir) / url.split('/')[-1]
+    if product_path.exists() and not overwrite:
+        return product_path
+
+    Path(data_dir).mkdir(parents=True, exist_ok=True)
+    partial_path = product_path.with_name(product_path.name + '.part')
+    with metrics.timer('download.file'), closing(requests.get(url, allow_redirects=True, stream=True)) as r:
+        if r.status_code != 200:
+            raise ConnectionError(f'could not download {url}\nerror code: {r.status_code}')
+        with open(partial_path, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    os.replace(partial_path, product_path)
+    return product_path
+
+
 def download_collection(collection_id, psup_url, metadata_schema, output_dir='source', overwrite=False):
 
     # set output source collection file name
@@ -69,13 +173,85 @@ def download_collection(collection_id, psup_url, metadata_schema, output_dir='so
 
     return source_collection_file
 
-def read_collection_metadata(source_collection_file):
+class JSONStreamReader:
+    """Reads JSON values from a text file one at a time, holding only the unparsed part of the last read chunk."""
+
+    def __init__(self, f, chunk_size: int = READ_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character, without consuming it, or '' at the end of the file."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} in JSON stream, got {self.peek()!r}.')
+        self.position += 1
+
+    def read_value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self._fill():  # invalid, or truncated JSON
+                    raise
+                continue
+            if end == len(self.buffer) and self._fill():  # eg: number split across chunks
+                continue
+            self.position = end
+            return value
+
+
+def iter_source_collection(source_collection_file, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """Yields the top-level entries of a source collection file as `(key, value)` tuples, as they are parsed, and
+    products one at a time as `('products', product_dict)` tuples, so that the file is never loaded at once.
+    """
     with open(source_collection_file, 'r') as f:
-        json_dict = json.load(f)
+        reader = JSONStreamReader(f, chunk_size=chunk_size)
+        reader.expect('{')
+        while reader.peek() != '}':
+            key = reader.read_value()
+            reader.expect(':')
+            if key == 'products' and reader.peek() == '[':
+                reader.expect('[')
+                while reader.peek() != ']':
+                    yield key, reader.read_value()
+                    if reader.peek() == ',':
+                        reader.expect(',')
+                reader.expect(']')
+            else:
+                yield key, reader.read_value()
+            if reader.peek() == ',':
+                reader.expect(',')
 
-    if 'collection' in json_dict.keys():
-        collection_dict = json_dict['collection']
-    else:
+
+def read_collection_metadata(source_collection_file):
+    collection_dict = None
+    for key, value in iter_source_collection(source_collection_file):
+        if key == 'collection':
+            collection_dict = value
+            break
+
+    if collection_dict is None:
         raise Exception('Not a valid input PSUP source collection JSON file.')
 
     try:
@@ -94,7 +270,7 @@ def read_products_metadata(source_collection_file):
     schema_name = collection_metadata.schema_name
 
     # read source collection file
-    with open(source_collection_file, 'r') as f:
+    with metrics.timer('read.json'), open(source_collection_file, 'r') as f:
         json_dict = json.load(f)
 
     if 'products' in json_dict.keys():
@@ -105,16 +281,45 @@ def read_products_metadata(source_collection_file):
     products = []
     for product_dict in products_dicts:
         try:
-            product_metadata = factory.create_metadata_object(product_dict, schema_name, 'item')
+            with metrics.timer('read.validation'):
+                product_metadata = factory.create_metadata_object(product_dict, schema_name, 'item')
             products.append(product_metadata)
         except Exception as e:
             print(e)
             print(product_dict)
             return
 
+    # parse the footprints of the whole collection at once, so that items geometries and bboxes are derived from the
+    # parse cache (inherited by worker processes)
+    footprints = [product.vector_footprint for product in products if hasattr(product, 'vector_footprint')]
+    if footprints:
+        with metrics.timer('read.footprints'):
+            n_invalid = parse_footprints(footprints).count(None)
+        if n_invalid:
+            print(f'WARNING: {n_invalid} invalid PSUP footprints found in {source_collection_file}.')
+
     return products
 
 
+def iter_products_metadata(source_collection_file) -> Iterator[Any]:
+    """Yields the products metadata of a source collection file one at a time, as they are parsed and validated, so
+    that memory usage does not depend on the number of products. Stops at the first invalid product, as
+    `read_products_metadata`.
+    """
+    schema_name = read_collection_metadata(source_collection_file).schema_name
+    for key, product_dict in iter_source_collection(source_collection_file):
+        if key != 'products':
+            continue
+        try:
+            with metrics.timer('read.validation'):
+                product_metadata = factory.create_metadata_object(product_dict, schema_name, 'item')
+        except Exception as e:
+            print(e)
+            print(product_dict)
+            return
+        yield product_metadata
+
+
 def download_data_files(source_collection_file, overwrite=False, n_max_items=None):
     products = read_products_metadata(source_collection_file)
 
@@ -162,10 +367,7 @@ def download_data_files(source_collection_file, overwrite=False, n_max_items=Non
                 print(f'Downloading from {url} ({product_metadata.nc_human_file_size:<10}) to {product_path} ...')
                 try:
                     # urlretrieve(url, product_path)
-                    r = requests.get(url, allow_redirects=True)
-                    if r.status_code != 200:
-                        raise ConnectionError(f'could not download {url}\nerror code: {r.status_code}')
-                    product_path.write_bytes(r.content)
+                    download_data_file(product_metadata, data_dir, overwrite=True)
 
                     size_str = f"{os.stat(product_path).st_size / (1014*1024):.1f}"
                     print(f'DONE ({size_str} MB)')
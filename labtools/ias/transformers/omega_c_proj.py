@@ -26,6 +26,7 @@ from labtools.transformers import factory as transformer_factory
 from labtools.schemas import factory as metadata_factory
 from labtools.utils import utc_to_iso
 from labtools.ias.netcdf import get_netcdf_footprint, get_netcdf_properties
+from labtools.metrics import metrics
 
 from pymarsseason import PyMarsSeason, Hemisphere
 from astropy.time import Time
@@ -49,7 +50,7 @@ class OMEGA_C_PROJ_STAC_Transformer(AbstractTransformer):
     # def get_item_links(self, metadata: BaseModel, definition: ItemDefinition = None) -> list[Link]:
     #     pass
 
-    def get_item_assets(self, metadata: OMEGA_C_Proj_Record, definition: ItemDefinition = None) -> Dict[str, PDSSP_STAC_Asset]:
+    def get_item_assets(self, metadata: OMEGA_C_Proj_Record, definition: ItemDefinition = None, data_path: str = None) -> Dict[str, PDSSP_STAC_Asset]:
         item_assets = {
             'nc_data_file': PDSSP_STAC_Asset(
                 href=metadata.download_nc,
@@ -115,7 +116,7 @@ class OMEGA_C_PROJ_STAC_Transformer(AbstractTransformer):
     # def get_extent(self, metadata: BaseModel, definition: CollectionDefinition = None) -> Extent:
     #     pass
 
-    def get_bbox(self, metadata: OMEGA_C_Proj_Record, definition: ItemDefinition = None) -> list[float]:
+    def get_bbox(self, metadata: OMEGA_C_Proj_Record, definition: ItemDefinition = None, data_path: str = None) -> list[float]:
         return [
             (float(metadata.westernmost_longitude) + 180.0) % 360.0 - 180.0,
             float(metadata.minimum_latitude),
@@ -182,7 +183,8 @@ class OMEGA_C_PROJ_STAC_Transformer(AbstractTransformer):
 
         # compute season
         utc_time = properties_dict['datetime']  # .isoformat()
-        season = PyMarsSeason().compute_season_from_time(Time(utc_time, format='isot', scale='utc'))
+        with metrics.timer('transform.season'):
+            season = PyMarsSeason().compute_season_from_time(Time(utc_time, format='isot', scale='utc'))
         season_str = season[Hemisphere.NORTH].value  # spring, summer, autumn, winter
         season_keyword['id'] = f'season:{season_str}'
         season_keyword['title'] = season_str.title()  # or 'Northern Hemisphere ' +
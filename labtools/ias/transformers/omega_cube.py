@@ -47,7 +47,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
     # def get_item_links(self, metadata: BaseModel, definition: ItemDefinition = None) -> list[Link]:
     #     pass
 
-    def get_item_assets(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None) -> Dict[str, PDSSP_STAC_Asset]:
+    def get_item_assets(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None, data_path: str = None) -> Dict[str, PDSSP_STAC_Asset]:
         item_assets = {
             'nc_data_file': PDSSP_STAC_Asset(
                 href=metadata.download_nc,
@@ -112,7 +112,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
     # def get_extent(self, metadata: BaseModel, definition: CollectionDefinition = None) -> Extent:
     #     pass
 
-    def get_bbox(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None) -> list[float]:
+    def get_bbox(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None, data_path: str = None) -> list[float]:
         return [
             (float(metadata.westernmost_longitude) + 180.0) % 360.0 - 180.0,
             float(metadata.minimum_latitude),
@@ -2,6 +2,7 @@
 from typing import Any, Dict, List, Union, Optional
 
 from pydantic import BaseModel
+import pystac
 
 from labtools.ias.schemas.omega_map import (
     SCHEMA_NAME,
@@ -21,18 +22,21 @@ from labtools.schemas.pdssp_stac import (
     PDSSP_STAC_SciProperties,
 )
 
-from labtools.definitions import ItemDefinition, CollectionDefinition, CatalogDefinition
+from labtools.definitions import ItemDefinition, CollectionDefinition, CatalogDefinition, get_stac_extension_url
 from labtools.transformers.transformer import AbstractTransformer, InvalidModelObjectTypeError
 from labtools.transformers import factory as transformer_factory
 from labtools.schemas import factory as metadata_factory
-from labtools.utils import utc_to_iso, bbox, bbox_polygon
+from labtools.utils import utc_to_iso, bbox_polygon
 from labtools.ias.netcdf import get_netcdf_footprint, get_netcdf_properties
+from labtools.ias.psup import get_footprint_geometry, get_footprint_bbox
+from labtools.ias.fits import get_fits_properties, get_fits_raster_bands
 
 from datetime import datetime
 from pathlib import Path
-from geojson import Polygon
 import json
 
+GLOBAL_FOOTPRINT = '((-180,-90),(-180,90),(180,90),(180,-90))'  # global maps footprint, in PSUP footprint format
+
 
 class OMEGA_MAP_STAC_Transformer(AbstractTransformer):
 
@@ -49,14 +53,34 @@ class OMEGA_MAP_STAC_Transformer(AbstractTransformer):
     # def get_item_links(self, metadata: BaseModel, definition: ItemDefinition = None) -> list[Link]:
     #     pass
 
-    def get_item_assets(self, metadata: OMEGA_Map_Record, definition: ItemDefinition = None) -> Dict[str, PDSSP_STAC_Asset]:
+    def get_data_file(self, metadata: OMEGA_Map_Record, data_path: str = None) -> Optional[Path]:
+        """Returns the downloaded FITS data file, or None if not available."""
+        if not data_path:
+            return None
+        fits_file = Path(data_path) / 'data' / Path(metadata.download).name
+        if not fits_file.exists():
+            print(f'Source data file not found: {fits_file!r}')
+            return None
+        return fits_file
+
+    def get_item_assets(self, metadata: OMEGA_Map_Record, definition: ItemDefinition = None, data_path: str = None) -> Dict[str, PDSSP_STAC_Asset]:
+        fits_asset_fields = {}
+        fits_file = self.get_data_file(metadata, data_path=data_path)
+        if fits_file:
+            try:
+                fits_asset_fields['raster:bands'] = get_fits_raster_bands(fits_file)
+            except Exception as e:
+                print(e)
+                print(f'Unable to extract raster bands metadata from source FITS file: {fits_file}')
+
         item_assets = {
             'fits_data_file': PDSSP_STAC_Asset(
                 href=metadata.download,
                 title='FITS data file',  #self.get_item_id(metadata, definition=definition),
                 # description='FITS data file',
                 type='application/fits',
-                roles=['data']
+                roles=['data'],
+                **fits_asset_fields
             ),
             'fits_preview_file': PDSSP_STAC_Asset(
                 href=metadata.preview,
@@ -75,16 +99,15 @@ class OMEGA_MAP_STAC_Transformer(AbstractTransformer):
     # def get_collection_assets(self, metadata: BaseModel, definition: CollectionDefinition = None) -> Dict[str, Asset]:
     #     pass
 
-    # def get_stac_extensions(self, metadata: BaseModel, definition: Union[CollectionDefinition, CatalogDefinition] = None) -> list[str]:
-    #     # call parent method to retrieve STAC extensions defined at collection level that are inherited by default
-    #     stac_extensions = super().get_stac_extensions(metadata, definition=definition)
-    #
-    #     # remove 'scientific' and 'processing' extensions
-    #     stac_extensions_copy = stac_extensions.copy()
-    #     for stac_extension in stac_extensions:
-    #         if 'processing' in stac_extension or 'scientific' in stac_extension:
-    #             stac_extensions_copy.remove(stac_extension)
-    #     return stac_extensions_copy
+    def create_stac_item(self, metadata: OMEGA_Map_Record, definition: Union[ItemDefinition, CollectionDefinition] = None, collection_id='', data_path=None) -> pystac.Item:
+        stac_item = super().create_stac_item(metadata, definition=definition, collection_id=collection_id, data_path=data_path)
+
+        # FITS data file assets hold raster bands metadata, if the data file could be read
+        if any('raster:bands' in asset.extra_fields for asset in stac_item.assets.values()):
+            raster_extension = get_stac_extension_url('raster')
+            if raster_extension not in stac_item.stac_extensions:
+                stac_item.stac_extensions.append(raster_extension)
+        return stac_item
 
     # def get_title(self, metadata: BaseModel, definition: CollectionDefinition = None) -> str:
     #     pass
@@ -98,20 +121,13 @@ class OMEGA_MAP_STAC_Transformer(AbstractTransformer):
     def get_geometry(self, metadata: OMEGA_Map_Record, definition: ItemDefinition = None, data_path: str = None) -> Optional[Dict[str, Any]]:
         """Derives and returns footprint geometry from source data file.
         """
-        geometry = {'coordinates': [[[-180, -90],
-                                     [-180, 90],
-                                     [180, 90],
-                                     [180, -90],
-                                     [-180, -90]]],
-                    'type': 'Polygon'}
-        return geometry
+        return get_footprint_geometry(GLOBAL_FOOTPRINT)
 
     # def get_extent(self, metadata: BaseModel, definition: CollectionDefinition = None) -> Extent:
     #     pass
 
-    def get_bbox(self, metadata: OMEGA_Map_Record, definition: ItemDefinition = None) -> list[float]:
-        geometry = self.get_geometry(metadata, definition=definition)
-        return bbox(Polygon(geometry['coordinates']))
+    def get_bbox(self, metadata: OMEGA_Map_Record, definition: ItemDefinition = None, data_path: str = None) -> list[float]:
+        return get_footprint_bbox(GLOBAL_FOOTPRINT)
 
     # def get_providers(self, metadata: BaseModel, definition: CollectionDefinition = None) -> list[Provider]:
     #     pass
@@ -140,6 +156,15 @@ class OMEGA_MAP_STAC_Transformer(AbstractTransformer):
             # extra Vector_Features_Record properties of interest
         }
 
+        # append data file metadata if available
+        fits_file = self.get_data_file(metadata, data_path=data_path)
+        if fits_file:
+            try:
+                properties_dict.update(get_fits_properties(fits_file))
+            except Exception as e:
+                print(e)
+                print(f'Unable to extract and add properties from FITS file: {fits_file}')
+
         return PDSSP_STAC_Properties(**properties_dict)
 
     def get_ssys_properties(self, metadata: OMEGA_Map_Record, definition: ItemDefinition = None) -> PDSSP_STAC_SsysProperties:
@@ -25,16 +25,17 @@ from labtools.definitions import ItemDefinition, CollectionDefinition, CatalogDe
 from labtools.transformers.transformer import AbstractTransformer, InvalidModelObjectTypeError
 from labtools.transformers import factory as transformer_factory
 from labtools.schemas import factory as metadata_factory
-from labtools.utils import utc_to_iso, bbox, bbox_polygon
+from labtools.utils import utc_to_iso, bbox_polygon
 from labtools.ias.netcdf import get_netcdf_footprint, get_netcdf_properties
+from labtools.ias.psup import get_footprint_geometry, get_footprint_bbox
+from labtools.ias.vector import get_geojson_footprint, get_geojson_bbox, get_geojson_properties
 
 from datetime import datetime
 from pathlib import Path
-from geojson import Polygon
-import json
 
 
 class VECTOR_FEATURES_STAC_Transformer(AbstractTransformer):
+    _data_file = (None, None)  # (path, path if it exists) of the data file of the item being transformed
 
     def get_item_id(self, metadata: Vector_Features_Record, definition: ItemDefinition = None) -> str:
         return Path(metadata.vector_name).stem
@@ -49,7 +50,21 @@ class VECTOR_FEATURES_STAC_Transformer(AbstractTransformer):
     # def get_item_links(self, metadata: BaseModel, definition: ItemDefinition = None) -> list[Link]:
     #     pass
 
-    def get_item_assets(self, metadata: Vector_Features_Record, definition: ItemDefinition = None) -> Dict[str, PDSSP_STAC_Asset]:
+    def get_data_file(self, metadata: Vector_Features_Record, data_path: str = None) -> Optional[Path]:
+        """Returns the downloaded GeoJSON data file, or None if not available.
+
+        The file is resolved once per item, as its geometry, bbox and properties are successively derived from it.
+        """
+        if not data_path:
+            return None
+        json_file = Path(data_path) / 'data' / Path(metadata.download).name
+        if self._data_file[0] != json_file:
+            self._data_file = (json_file, json_file if json_file.exists() else None)
+            if not self._data_file[1]:
+                print(f'Source data file not found: {json_file!r}')
+        return self._data_file[1]
+
+    def get_item_assets(self, metadata: Vector_Features_Record, definition: ItemDefinition = None, data_path: str = None) -> Dict[str, PDSSP_STAC_Asset]:
         item_assets = {
             'json_data_file': PDSSP_STAC_Asset(
                 href=metadata.download,
@@ -89,20 +104,34 @@ class VECTOR_FEATURES_STAC_Transformer(AbstractTransformer):
     #     pass
 
     def get_geometry(self, metadata: Vector_Features_Record, definition: ItemDefinition = None, data_path: str = None) -> Optional[Dict[str, Any]]:
-        """Derives and returns footprint geometry from source data file.
+        """Derives and returns footprint geometry from source data file, or from PSUP footprint if not available.
         """
+        json_file = self.get_data_file(metadata, data_path=data_path)
+        if json_file:
+            try:
+                geometry = get_geojson_footprint(json_file)
+                if geometry:
+                    return geometry
+            except Exception as e:
+                print(e)
+                print(f'Unable to extract footprint geometry from source GeoJSON file: {json_file}')
         vector_footprint = metadata.vector_footprint  # '((-180,-90),(-180,90),(180,90),(180,-90))'
-        pts_tuple = eval(vector_footprint[1:-1])
-        coords = [pts_tuple + (pts_tuple[0],)]
-        geometry = json.loads(str(Polygon(coords)))
-        return geometry
+        return get_footprint_geometry(vector_footprint)
 
     # def get_extent(self, metadata: BaseModel, definition: CollectionDefinition = None) -> Extent:
     #     pass
 
-    def get_bbox(self, metadata: Vector_Features_Record, definition: ItemDefinition = None) -> list[float]:
-        geometry = self.get_geometry(metadata, definition=definition)
-        return bbox(Polygon(geometry['coordinates']))
+    def get_bbox(self, metadata: Vector_Features_Record, definition: ItemDefinition = None, data_path: str = None) -> list[float]:
+        json_file = self.get_data_file(metadata, data_path=data_path)
+        if json_file:
+            try:
+                data_bbox = get_geojson_bbox(json_file)
+                if data_bbox:
+                    return data_bbox
+            except Exception as e:
+                print(e)
+                print(f'Unable to extract bounding box from source GeoJSON file: {json_file}')
+        return get_footprint_bbox(metadata.vector_footprint)
 
     # def get_providers(self, metadata: BaseModel, definition: CollectionDefinition = None) -> list[Provider]:
     #     pass
@@ -129,19 +158,14 @@ class VECTOR_FEATURES_STAC_Transformer(AbstractTransformer):
             # extra Vector_Features_Record properties of interest
         }
 
-        # # append data file metadata if available
-        # if data_path:
-        #     json_file = Path(data_path) / 'data' / Path(metadata.download).name
-        #     if json_file.exists():
-        #         try:
-        #             netcdf_metadata_dict = get_netcdf_properties(json_file)
-        #             print(netcdf_metadata_dict)
-        #             properties_dict.update(netcdf_metadata_dict)
-        #         except Exception as e:
-        #             print(e)
-        #             print(f'Unable to extract and add properties from source file: {json_file}')
-        #     else:
-        #         print(f'Source data file not found: {json_file!r}')
+        # append data file metadata if available
+        json_file = self.get_data_file(metadata, data_path=data_path)
+        if json_file:
+            try:
+                properties_dict.update(get_geojson_properties(json_file))
+            except Exception as e:
+                print(e)
+                print(f'Unable to extract and add properties from source file: {json_file}')
 
         return PDSSP_STAC_Properties(**properties_dict)
 
@@ -0,0 +1,199 @@
+"""Streaming analysis of GeoJSON vector features data files.
+
+Features of a FeatureCollection are decoded one at a time from fixed-size chunks of the file, so that large vector
+datasets can be analysed without being fully loaded in memory.
+"""
+from typing import Any, Dict, Iterator, List, Optional
+from functools import lru_cache
+import json
+import re
+
+import numpy as np
+
+CHUNK_SIZE = 1024 * 1024  # number of characters read at once
+HULL_BATCH_SIZE = 100000  # number of points accumulated before updating the convex hull
+
+_FEATURES_ARRAY_PATTERN = re.compile(r'"features"\s*:\s*\[')
+_WHITESPACE = ' \t\n\r,'
+
+
+def iter_geojson_features(geojson_file, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yields the features of a GeoJSON file, decoding one feature at a time.
+
+    FeatureCollection files are streamed; single Feature or Geometry files are read at once and yielded as a single
+    feature.
+    """
+    decoder = json.JSONDecoder()
+    with open(geojson_file, 'r', encoding='utf-8') as f:
+        # read until the start of the "features" array
+        buffer = ''
+        match = None
+        while not match:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            match = _FEATURES_ARRAY_PATTERN.search(buffer, max(0, len(buffer) - len(chunk) - 32))
+
+        if not match:  # not a FeatureCollection
+            geojson_dict = json.loads(buffer)
+            if geojson_dict.get('type') == 'Feature':
+                yield geojson_dict
+            elif geojson_dict.get('type') == 'FeatureCollection':  # empty or without "features" array
+                yield from geojson_dict.get('features') or []
+            else:
+                yield {'type': 'Feature', 'geometry': geojson_dict, 'properties': {}}
+            return
+
+        index = match.end()
+        eof = False
+        while True:
+            # skip separators, reading more data if needed
+            while index < len(buffer) and buffer[index] in _WHITESPACE:
+                index += 1
+            if index >= len(buffer):
+                if eof:
+                    raise ValueError(f'Unterminated "features" array in GeoJSON file: {geojson_file}')
+                buffer = buffer[index:]
+                index = 0
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            if buffer[index] == ']':
+                return
+
+            # decode next feature, reading more data if incomplete
+            try:
+                feature, end = decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                buffer = buffer[index:]
+                index = 0
+                # at least double the buffer before decoding again, so that features larger than chunks are decoded a
+                # logarithmic number of times, instead of once per chunk
+                chunk = f.read(max(chunk_size, len(buffer)))
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield feature
+            index = end
+            if index > chunk_size:  # drop decoded data
+                buffer = buffer[index:]
+                index = 0
+
+
+def iter_geometry_coordinates(geometry: Optional[Dict[str, Any]]) -> Iterator[list]:
+    """Yields the [lon, lat] positions of a GeoJSON geometry, including geometry collections."""
+    if not geometry:
+        return
+    if geometry['type'] == 'GeometryCollection':
+        for sub_geometry in geometry.get('geometries', []):
+            yield from iter_geometry_coordinates(sub_geometry)
+        return
+    stack = [geometry.get('coordinates') or []]
+    while stack:
+        coordinates = stack.pop()
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            yield coordinates
+        else:
+            stack.extend(coordinates)
+
+
+def convex_hull(points: np.ndarray) -> np.ndarray:
+    """Returns the counterclockwise convex hull vertices of an (N, 2) array of points (Andrew's monotone chain)."""
+    points = np.unique(points, axis=0)  # sorted by lon, then lat
+    if len(points) < 3:
+        return points
+
+    def half_hull(pts):
+        hull = []
+        for p in pts:
+            while len(hull) >= 2 and ((hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1])
+                                      - (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0])) <= 0:
+                hull.pop()
+            hull.append((p[0], p[1]))
+        return hull
+
+    pts = points.tolist()
+    lower = half_hull(pts)
+    upper = half_hull(reversed(pts))
+    return np.array(lower[:-1] + upper[:-1])
+
+
+@lru_cache(maxsize=16)
+def analyze_geojson(geojson_file, compute_convex_hull: bool = True) -> Dict[str, Any]:
+    """Returns the extent, number of features, geometry types and optional convex hull of a GeoJSON data file.
+
+    Results are cached per file, so that item geometry, bbox and properties are derived from a single pass.
+    """
+    n_features = 0
+    geometry_types = {}
+    bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+    hull = np.empty((0, 2))
+    batch: List[list] = []
+
+    for feature in iter_geojson_features(geojson_file):
+        n_features += 1
+        geometry = feature.get('geometry')
+        if not geometry:
+            continue
+        geometry_types[geometry['type']] = geometry_types.get(geometry['type'], 0) + 1
+        positions = [position[:2] for position in iter_geometry_coordinates(geometry)]
+        if not positions:
+            continue
+        lons, lats = zip(*positions)
+        bbox = [min(bbox[0], min(lons)), min(bbox[1], min(lats)), max(bbox[2], max(lons)), max(bbox[3], max(lats))]
+        if compute_convex_hull:
+            batch.extend(positions)
+            if len(batch) >= HULL_BATCH_SIZE:
+                hull = convex_hull(np.vstack([hull, np.array(batch, dtype=float)]))
+                batch = []
+
+    if compute_convex_hull and batch:
+        hull = convex_hull(np.vstack([hull, np.array(batch, dtype=float)]))
+
+    return {
+        'n_features': n_features,
+        'geometry_types': geometry_types,
+        'bbox': bbox if n_features and bbox[0] <= bbox[2] else None,
+        'convex_hull': hull.tolist() if compute_convex_hull and len(hull) else None
+    }
+
+
+def get_geojson_footprint(geojson_file) -> Optional[Dict[str, Any]]:
+    """Returns the GeoJSON geometry covering the features of a GeoJSON data file.
+
+    The convex hull of all features is returned as a Polygon, or as a Point or LineString if the hull is degenerate
+    (eg: single point or two points features).
+    """
+    summary = analyze_geojson(str(geojson_file))
+    hull = summary['convex_hull']
+    if not hull:
+        if not summary['bbox']:
+            return None
+        west, south, east, north = summary['bbox']
+        hull = [[west, south], [east, south], [east, north], [west, north]]
+        hull = [list(point) for point in dict.fromkeys(tuple(point) for point in hull)]
+    hull = [[float(lon), float(lat)] for lon, lat in hull]
+    if len(hull) == 1:
+        return {'type': 'Point', 'coordinates': hull[0]}
+    elif len(hull) == 2:
+        return {'type': 'LineString', 'coordinates': hull}
+    return {'type': 'Polygon', 'coordinates': [hull + [hull[0]]]}
+
+
+def get_geojson_bbox(geojson_file) -> Optional[List[float]]:
+    """Returns the [west, south, east, north] bounding box of the features of a GeoJSON data file."""
+    summary = analyze_geojson(str(geojson_file))
+    return [float(value) for value in summary['bbox']] if summary['bbox'] else None
+
+
+def get_geojson_properties(geojson_file) -> Dict[str, Any]:
+    """Returns a selection of metadata derived from a GeoJSON data file."""
+    summary = analyze_geojson(str(geojson_file))
+    return {
+        'n_features': summary['n_features'],
+        'geometry_types': sorted(summary['geometry_types'].keys())
+    }
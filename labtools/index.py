@@ -0,0 +1,476 @@
+"""Spatial and properties indexes of STAC collections items.
+
+Each collection directory of a built STAC catalog holds a `spatial_index.npz` file, storing items IDs, relative
+hrefs, bounding boxes and footprints exterior rings in flat NumPy arrays. Bounding boxes are packed into a
+Sort-Tile-Recursive (STR) R-tree, so that bbox queries only visit a few nodes and are answered without reading any
+item JSON file. Candidate items are then refined against their footprints.
+
+A `properties_index.npz` file holds sorted columns of temporal and seasonal items properties (start and end
+datetimes, solar longitude, Martian year), along with the matching item positions in the spatial index, so that range
+queries are answered by binary search and combined with the spatial filter.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+from datetime import datetime, timezone
+import json
+import math
+import os
+
+import numpy as np
+import pystac
+
+from labtools.serialization import FastStacIO
+
+INDEX_FILE_NAME = 'spatial_index.npz'
+PROPERTIES_INDEX_FILE_NAME = 'properties_index.npz'
+NODE_SIZE = 16  # number of children per R-tree node
+INDEXED_PROPERTIES = ['start_datetime', 'end_datetime', 'solar_longitude', 'martian_year']
+DATETIME_PROPERTIES = ['start_datetime', 'end_datetime']
+
+
+def split_bbox(bbox) -> List[Tuple[float, float, float, float]]:
+    """Returns a list of one or two [west, south, east, north] boxes, splitting input bbox at the antimeridian if its
+    western longitude is greater than its eastern longitude.
+    """
+    west, south, east, north = [float(value) for value in bbox[:4]] if len(bbox) == 4 else \
+        [float(bbox[0]), float(bbox[1]), float(bbox[3]), float(bbox[4])]
+    if west > east:
+        return [(west, south, 180.0, north), (-180.0, south, east, north)]
+    return [(west, south, east, north)]
+
+
+def _boxes_intersect(boxes: np.ndarray, box) -> np.ndarray:
+    return (boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) & (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1])
+
+
+def _segments_intersect_box(p0: np.ndarray, p1: np.ndarray, box) -> bool:
+    """Returns True if any of the (p0, p1) segments intersects the box (Liang-Barsky clipping)."""
+    d = p1 - p0
+    t0 = np.zeros(len(p0))
+    t1 = np.ones(len(p0))
+    for axis, (low, high) in enumerate([(box[0], box[2]), (box[1], box[3])]):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ta = (low - p0[:, axis]) / d[:, axis]
+            tb = (high - p0[:, axis]) / d[:, axis]
+        parallel = d[:, axis] == 0
+        inside = (p0[:, axis] >= low) & (p0[:, axis] <= high)
+        t_enter = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(ta, tb))
+        t_exit = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(ta, tb))
+        t0 = np.maximum(t0, t_enter)
+        t1 = np.minimum(t1, t_exit)
+    return bool(np.any(t0 <= t1))
+
+
+def _point_in_ring(x: float, y: float, ring: np.ndarray) -> bool:
+    """Returns True if the (x, y) point lies inside the closed ring (ray casting)."""
+    xi, yi = ring[:-1, 0], ring[:-1, 1]
+    xj, yj = ring[1:, 0], ring[1:, 1]
+    crosses = (yi > y) != (yj > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = xi + (y - yi) * (xj - xi) / (yj - yi)
+    return bool(np.count_nonzero(crosses & (x < x_cross)) % 2)
+
+
+def ring_intersects_box(ring: np.ndarray, is_area: bool, box) -> bool:
+    """Returns True if a footprint ring (or points/line coordinates if not an area) intersects the box."""
+    for offset in (0.0, -360.0, 360.0):  # footprints longitudes may be expressed in [0, 360]
+        coords = ring + (offset, 0.0) if offset else ring
+        inside = (coords[:, 0] >= box[0]) & (coords[:, 0] <= box[2]) & (coords[:, 1] >= box[1]) & (coords[:, 1] <= box[3])
+        if inside.any():
+            return True
+        if len(coords) > 1 and _segments_intersect_box(coords[:-1], coords[1:], box):
+            return True
+        if is_area and len(coords) >= 4 and _point_in_ring((box[0] + box[2]) / 2, (box[1] + box[3]) / 2, coords):
+            return True
+    return False
+
+
+def get_geometry_rings(geometry: Optional[Dict[str, Any]]) -> List[Tuple[list, bool]]:
+    """Returns the exterior rings of a GeoJSON geometry, as (coordinates, is_area) tuples. Points and lines
+    coordinates are returned as non-area rings.
+    """
+    if not geometry:
+        return []
+    geometry_type = geometry['type']
+    coordinates = geometry.get('coordinates')
+    if geometry_type == 'Polygon':
+        return [(coordinates[0], True)] if coordinates else []
+    elif geometry_type == 'MultiPolygon':
+        return [(polygon[0], True) for polygon in coordinates if polygon]
+    elif geometry_type == 'Point':
+        return [([coordinates], False)]
+    elif geometry_type in ['MultiPoint', 'LineString']:
+        return [(coordinates, False)]
+    elif geometry_type == 'MultiLineString':
+        return [(line, False) for line in coordinates]
+    elif geometry_type == 'GeometryCollection':
+        rings = []
+        for sub_geometry in geometry.get('geometries', []):
+            rings.extend(get_geometry_rings(sub_geometry))
+        return rings
+    return []
+
+
+class SpatialIndex:
+    """STR-packed R-tree of items bounding boxes, with items footprints exterior rings for refinement."""
+
+    def __init__(self, ids: np.ndarray, hrefs: np.ndarray, bboxes: np.ndarray, coords: np.ndarray,
+                 ring_offsets: np.ndarray, ring_is_area: np.ndarray, item_ring_offsets: np.ndarray,
+                 node_bboxes: List[np.ndarray], node_size: int = NODE_SIZE):
+        self.ids = ids
+        self.hrefs = hrefs
+        self.bboxes = bboxes  # items bboxes, in R-tree leaves order
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.ring_is_area = ring_is_area
+        self.item_ring_offsets = item_ring_offsets
+        self.node_bboxes = node_bboxes  # R-tree levels, from leaves parents up to root
+        self.node_size = node_size
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[str, str, list, Optional[Dict[str, Any]]]], node_size: int = NODE_SIZE) -> 'SpatialIndex':
+        """Creates a spatial index from (id, href, bbox, geometry) items tuples."""
+        items = [item for item in items if item[2]]
+        n_items = len(items)
+        bboxes = np.array([item[2][:4] if len(item[2]) == 4 else [item[2][i] for i in (0, 1, 3, 4)] for item in items],
+                          dtype=np.float64).reshape(n_items, 4)
+
+        # indexed boxes: items crossing the antimeridian cover all longitudes, and are refined at query time
+        index_boxes = bboxes.copy()
+        crossing = index_boxes[:, 0] > index_boxes[:, 2]
+        index_boxes[crossing, 0] = -180.0
+        index_boxes[crossing, 2] = 180.0
+
+        # Sort-Tile-Recursive packing: sort by x center in vertical slices, then by y center within slices
+        order = np.arange(n_items)
+        if n_items:
+            n_leaves = math.ceil(n_items / node_size)
+            slice_size = math.ceil(math.sqrt(n_leaves)) * node_size
+            order = np.argsort((index_boxes[:, 0] + index_boxes[:, 2]) / 2, kind='stable')
+            y_centers = (index_boxes[:, 1] + index_boxes[:, 3]) / 2
+            for start in range(0, n_items, slice_size):
+                slice_order = order[start:start + slice_size]
+                order[start:start + slice_size] = slice_order[np.argsort(y_centers[slice_order], kind='stable')]
+
+        # R-tree levels, grouping node_size consecutive boxes per parent node
+        node_bboxes = []
+        level_boxes = index_boxes[order]
+        while len(level_boxes) > 1:
+            starts = np.arange(0, len(level_boxes), node_size)
+            level_boxes = np.column_stack([
+                np.minimum.reduceat(level_boxes[:, 0], starts),
+                np.minimum.reduceat(level_boxes[:, 1], starts),
+                np.maximum.reduceat(level_boxes[:, 2], starts),
+                np.maximum.reduceat(level_boxes[:, 3], starts)
+            ])
+            node_bboxes.append(level_boxes)
+
+        # footprints exterior rings, as flat coordinates arrays
+        coords = []
+        ring_offsets = [0]
+        ring_is_area = []
+        item_ring_offsets = [0]
+        for i in order:
+            for ring, is_area in get_geometry_rings(items[i][3]):
+                ring = [position[:2] for position in ring]
+                coords.extend(ring)
+                ring_offsets.append(ring_offsets[-1] + len(ring))
+                ring_is_area.append(is_area)
+            item_ring_offsets.append(len(ring_is_area))
+
+        return cls(
+            ids=np.array([items[i][0] for i in order], dtype=str),
+            hrefs=np.array([items[i][1] for i in order], dtype=str),
+            bboxes=bboxes[order],
+            coords=np.array(coords, dtype=np.float64).reshape(len(coords), 2),
+            ring_offsets=np.array(ring_offsets, dtype=np.int64),
+            ring_is_area=np.array(ring_is_area, dtype=bool),
+            item_ring_offsets=np.array(item_ring_offsets, dtype=np.int64),
+            node_bboxes=node_bboxes,
+            node_size=node_size
+        )
+
+    @classmethod
+    def from_collection(cls, stac_collection: pystac.Collection, node_size: int = NODE_SIZE) -> 'SpatialIndex':
+        """Creates a spatial index from the items of a saved STAC collection, with hrefs relative to the collection
+        directory.
+        """
+        return cls.from_items([item[:4] for item in get_collection_items(stac_collection)], node_size=node_size)
+
+    def save(self, index_file) -> None:
+        levels = {f'level_{i}': boxes for i, boxes in enumerate(self.node_bboxes)}
+        np.savez(
+            index_file, ids=self.ids, hrefs=self.hrefs, bboxes=self.bboxes, coords=self.coords,
+            ring_offsets=self.ring_offsets, ring_is_area=self.ring_is_area, item_ring_offsets=self.item_ring_offsets,
+            node_size=np.array(self.node_size), n_levels=np.array(len(self.node_bboxes)), **levels
+        )
+
+    @classmethod
+    def load(cls, index_file) -> 'SpatialIndex':
+        with np.load(index_file) as npz:
+            n_levels = int(npz['n_levels'])
+            return cls(
+                ids=npz['ids'], hrefs=npz['hrefs'], bboxes=npz['bboxes'], coords=npz['coords'],
+                ring_offsets=npz['ring_offsets'], ring_is_area=npz['ring_is_area'],
+                item_ring_offsets=npz['item_ring_offsets'],
+                node_bboxes=[npz[f'level_{i}'] for i in range(n_levels)], node_size=int(npz['node_size'])
+            )
+
+    def _query_box(self, box) -> np.ndarray:
+        """Returns the positions of items whose bbox intersects a box not crossing the antimeridian."""
+        m = self.node_size
+        candidates = np.arange(len(self.node_bboxes[-1])) if self.node_bboxes else np.arange(len(self.ids))
+        for level in range(len(self.node_bboxes) - 1, -1, -1):
+            candidates = candidates[_boxes_intersect(self.node_bboxes[level][candidates], box)]
+            n_children = len(self.node_bboxes[level - 1]) if level > 0 else len(self.ids)
+            candidates = (candidates[:, None] * m + np.arange(m)).ravel()
+            candidates = candidates[candidates < n_children]
+
+        # exact bbox test, items crossing the antimeridian being split in two boxes
+        bboxes = self.bboxes[candidates]
+        crossing = bboxes[:, 0] > bboxes[:, 2]
+        east_part = bboxes.copy()
+        east_part[crossing, 2] = 180.0
+        west_part = bboxes.copy()
+        west_part[crossing, 0] = -180.0
+        match = _boxes_intersect(east_part, box) | (crossing & _boxes_intersect(west_part, box))
+        return candidates[match]
+
+    def intersects_footprint(self, position: int, box) -> bool:
+        """Returns True if the footprint of item at given position intersects the box, or if it has no footprint."""
+        first_ring, last_ring = self.item_ring_offsets[position], self.item_ring_offsets[position + 1]
+        if first_ring == last_ring:
+            return True
+        west, south, east, north = self.bboxes[position]
+        if box[0] <= west <= east <= box[2] and box[1] <= south and north <= box[3]:  # bbox within box
+            return True
+        for r in range(first_ring, last_ring):
+            ring = self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]]
+            if ring_intersects_box(ring, self.ring_is_area[r], box):
+                return True
+        return False
+
+    def search(self, bbox, footprint: bool = True) -> np.ndarray:
+        """Returns the sorted positions of items intersecting the input [west, south, east, north] bbox, refined
+        against items footprints unless `footprint` is False.
+        """
+        positions = []
+        for box in split_bbox(bbox):
+            candidates = self._query_box(box)
+            if footprint:
+                candidates = [position for position in candidates if self.intersects_footprint(position, box)]
+            positions.extend(candidates)
+        return np.unique(np.array(positions, dtype=np.int64))
+
+    def get_items(self, positions: Iterable[int]) -> List[Tuple[str, str]]:
+        """Returns (id, href) tuples of items at input positions."""
+        return [(str(self.ids[i]), str(self.hrefs[i])) for i in positions]
+
+
+def to_timestamp(value) -> Optional[float]:
+    """Returns the POSIX timestamp, in seconds, of an ISO 8601 datetime string or datetime object."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        value = value.isoformat()
+    value = str(value).strip()
+    if value.endswith('Z'):
+        value = value[:-1]
+    elif len(value) > 10 and value[-6] in '+-' and value[-3] == ':':  # UTC offset
+        value = datetime.fromisoformat(value).astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+    return float(np.datetime64(value, 'us').astype(np.int64)) / 1e6
+
+
+def parse_range(value) -> Tuple[Optional[float], Optional[float]]:
+    """Returns the (minimum, maximum) tuple of a range given as a tuple, a single value, or a 'min/max' or 'min,max'
+    string, where open ends are given as None, '' or '..'.
+    """
+    if value is None:
+        return None, None
+    if isinstance(value, str):
+        for separator in ['/', ',']:
+            if separator in value:
+                value = value.split(separator)
+                break
+        else:
+            value = [value, value]
+    elif not isinstance(value, (tuple, list)):
+        value = [value, value]
+    minimum, maximum = [None if bound in [None, '', '..'] else bound for bound in value]
+    return minimum, maximum
+
+
+def get_collection_items(stac_collection: pystac.Collection) -> List[tuple]:
+    """Returns (id, href, bbox, geometry, properties) tuples of the items of a saved STAC collection, with hrefs
+    relative to the collection directory, and indexed properties only.
+
+    Items not in memory (eg: released once written by a memory-bounded build) are read from their files one at a
+    time, rather than resolved into the collection.
+    """
+    collection_dir = os.path.dirname(stac_collection.get_self_href())
+    stac_io = FastStacIO()
+    items = []
+    for link in stac_collection.get_links('item'):
+        if link.is_resolved():
+            stac_item = link.target
+            item_href, item_id, bbox, geometry, properties = \
+                stac_item.get_self_href(), stac_item.id, stac_item.bbox, stac_item.geometry, stac_item.properties
+        else:
+            item_href = link.get_absolute_href()
+            item_dict = json.loads(stac_io.read_text_from_href(item_href))
+            item_id, bbox, geometry, properties = \
+                item_dict['id'], item_dict.get('bbox'), item_dict.get('geometry'), item_dict.get('properties', {})
+        properties = {name: properties[name] for name in INDEXED_PROPERTIES + ['datetime'] if name in properties}
+        items.append((item_id, os.path.relpath(item_href, collection_dir), bbox, geometry, properties))
+    return items
+
+
+class PropertiesIndex:
+    """Sorted columns of items properties values, each with the positions of the corresponding items."""
+
+    def __init__(self, n_items: int, columns: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.n_items = n_items
+        self.columns = columns  # property name -> (sorted values, items positions)
+
+    @classmethod
+    def from_properties(cls, items_properties: List[Dict[str, Any]], names: List[str] = None) -> 'PropertiesIndex':
+        """Creates a properties index from the list of items properties dictionaries, in items positions order.
+
+        Datetimes are stored as POSIX timestamps; items without start or end datetime are indexed using their
+        `datetime` property. Items missing a property, or with an invalid value, are not indexed for this property.
+        """
+        names = names or INDEXED_PROPERTIES
+        columns = {}
+        for name in names:
+            values = []
+            positions = []
+            for position, properties in enumerate(items_properties):
+                value = properties.get(name)
+                if value is None and name in DATETIME_PROPERTIES:
+                    value = properties.get('datetime')
+                if value is None:
+                    continue
+                try:
+                    value = to_timestamp(value) if name in DATETIME_PROPERTIES else float(value)
+                except (TypeError, ValueError):
+                    continue
+                values.append(value)
+                positions.append(position)
+            values = np.array(values, dtype=np.float64)
+            positions = np.array(positions, dtype=np.int64)
+            order = np.argsort(values, kind='stable')
+            columns[name] = (values[order], positions[order])
+        return cls(len(items_properties), columns)
+
+    def save(self, index_file) -> None:
+        arrays = {}
+        for name, (values, positions) in self.columns.items():
+            arrays[f'{name}.values'] = values
+            arrays[f'{name}.positions'] = positions
+        np.savez(index_file, n_items=np.array(self.n_items), names=np.array(list(self.columns.keys()), dtype=str),
+                 **arrays)
+
+    @classmethod
+    def load(cls, index_file) -> 'PropertiesIndex':
+        with np.load(index_file) as npz:
+            columns = {str(name): (npz[f'{name}.values'], npz[f'{name}.positions']) for name in npz['names']}
+            return cls(int(npz['n_items']), columns)
+
+    def range(self, name: str, minimum: float = None, maximum: float = None) -> np.ndarray:
+        """Returns the positions of items whose property value lies within [minimum, maximum], using binary search.
+        Open bounds are given as None.
+        """
+        values, positions = self.columns[name]
+        start = 0 if minimum is None else int(np.searchsorted(values, minimum, side='left'))
+        stop = len(values) if maximum is None else int(np.searchsorted(values, maximum, side='right'))
+        return positions[start:stop]
+
+    def search(self, datetime=None, solar_longitude=None, martian_year=None) -> np.ndarray:
+        """Returns the sorted positions of items matching all input ranges, each given as a (minimum, maximum) tuple
+        or a string (see `parse_range`).
+
+        Items match the `datetime` range if their [start_datetime, end_datetime] interval overlaps it. Solar longitude
+        ranges whose minimum is greater than the maximum wrap around 360 (eg: 300/30).
+        """
+        positions = np.arange(self.n_items)
+
+        if datetime is not None:
+            start, end = [to_timestamp(bound) for bound in parse_range(datetime)]
+            positions = np.intersect1d(positions, self.range('start_datetime', maximum=end))
+            positions = np.intersect1d(positions, self.range('end_datetime', minimum=start))
+
+        if solar_longitude is not None:
+            minimum, maximum = [None if bound is None else float(bound) for bound in parse_range(solar_longitude)]
+            if minimum is not None and maximum is not None and minimum > maximum:
+                matching = np.union1d(self.range('solar_longitude', minimum=minimum),
+                                      self.range('solar_longitude', maximum=maximum))
+            else:
+                matching = self.range('solar_longitude', minimum=minimum, maximum=maximum)
+            positions = np.intersect1d(positions, matching)
+
+        if martian_year is not None:
+            minimum, maximum = [None if bound is None else float(bound) for bound in parse_range(martian_year)]
+            positions = np.intersect1d(positions, self.range('martian_year', minimum=minimum, maximum=maximum))
+
+        return positions
+
+
+def write_collection_index(stac_collection: pystac.Collection) -> Path:
+    """Writes the spatial and properties indexes of a saved STAC collection into its directory, and returns the
+    spatial index file path.
+    """
+    collection_dir = Path(stac_collection.get_self_href()).parent
+    items = get_collection_items(stac_collection)
+    spatial_index = SpatialIndex.from_items([item[:4] for item in items])
+    spatial_index.save(collection_dir / INDEX_FILE_NAME)
+
+    # properties columns refer to items positions in the spatial index
+    items_properties = {item[0]: item[4] for item in items}
+    properties_index = PropertiesIndex.from_properties([items_properties[str(item_id)] for item_id in spatial_index.ids])
+    properties_index.save(collection_dir / PROPERTIES_INDEX_FILE_NAME)
+
+    return collection_dir / INDEX_FILE_NAME
+
+
+def find_collection_indexes(stac_dir) -> Dict[str, Path]:
+    """Returns the spatial index files of a built STAC catalog, by collection directory name."""
+    return {index_file.parent.name: index_file for index_file in sorted(Path(stac_dir).glob(f'**/{INDEX_FILE_NAME}'))}
+
+
+def search_catalog(stac_dir, bbox=None, collections_ids: List[str] = None, footprint: bool = True, datetime=None,
+                   solar_longitude=None, martian_year=None) -> List[Dict[str, str]]:
+    """Returns items of a built STAC catalog intersecting the input bbox and matching the input datetime, solar
+    longitude and Martian year ranges, as dictionaries holding collection ID, item ID and absolute item href.
+
+    Examples:
+        search_catalog(stac_dir, bbox=[-30, -10, 30, 10], solar_longitude=(180, 270), martian_year=27)
+        search_catalog(stac_dir, datetime='2005-01-01T00:00:00Z/2005-12-31T23:59:59Z')
+    """
+    filter_properties = any(value is not None for value in [datetime, solar_longitude, martian_year])
+    results = []
+    for collection_id, index_file in find_collection_indexes(stac_dir).items():
+        if collections_ids and collection_id not in collections_ids:
+            continue
+        index = SpatialIndex.load(index_file)
+        positions = index.search(bbox, footprint=footprint) if bbox is not None else np.arange(len(index))
+        if filter_properties:
+            properties_index_file = index_file.parent / PROPERTIES_INDEX_FILE_NAME
+            if not properties_index_file.exists():
+                print(f'WARNING: No properties index found for {collection_id!r} collection: {properties_index_file}')
+                continue
+            properties_index = PropertiesIndex.load(properties_index_file)
+            matching = properties_index.search(datetime=datetime, solar_longitude=solar_longitude,
+                                               martian_year=martian_year)
+            positions = np.intersect1d(positions, matching)
+        for item_id, href in index.get_items(positions):
+            results.append({
+                'collection': collection_id,
+                'id': item_id,
+                'href': str((index_file.parent / href).resolve())
+            })
+    return results
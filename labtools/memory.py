@@ -0,0 +1,111 @@
+"""Resident memory measurement, and memory-bounded batching of source products.
+
+A `MemoryBudget` splits the source products of a build into batches sized so that the resident set size (RSS) of the
+build process stays under a ceiling, eg:
+
+    memory_budget = MemoryBudget(parse_memory_size('4G'))
+    for batch in memory_budget.batches(products):
+        ...  # transform and write the batch products, releasing them
+
+The memory used per product is estimated from the RSS growth over each batch (freed memory being reused by the next
+batches, the largest estimate is kept), and the next batch is sized to half the remaining headroom. Items being
+written and released along the build, the RSS then stays about flat whatever the number of products.
+"""
+from typing import Iterable, Iterator, Optional
+from itertools import islice
+import gc
+import os
+import re
+import sys
+
+try:
+    import resource
+except ImportError:  # eg: on Windows
+    resource = None
+
+MIN_BATCH_SIZE = 16  # minimum number of products per batch
+MAX_BATCH_SIZE = 10000  # maximum number of products per batch, whatever the headroom
+BYTES_PER_PRODUCT = 64 * 1024  # initial estimate of the memory used per product of a batch, raised if measured larger
+MEMORY_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_memory_size(memory_size) -> int:
+    """Returns the number of bytes of a memory size, eg: '4G', '512MB', '1.5 GiB', or a number of bytes."""
+    if isinstance(memory_size, (int, float)):
+        return int(memory_size)
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMGT]?)(?:i?B)?\s*', str(memory_size), flags=re.IGNORECASE)
+    if not match:
+        raise ValueError(f'Invalid memory size: {memory_size!r}. Expected eg: 4G, 512M or 2.5GB.')
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2).upper()])
+
+
+def format_memory_size(n_bytes: Optional[int]) -> str:
+    if n_bytes is None:
+        return 'unknown'
+    return f'{n_bytes / 1024 ** 2:.1f} MB'
+
+
+def get_peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of the current process, in bytes, or None if unavailable."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024  # bytes on macOS, kilobytes on Linux
+
+
+def get_rss() -> Optional[int]:
+    """Returns the current resident set size of the current process, in bytes, from `/proc` on Linux, or the peak
+    resident set size otherwise.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss()
+
+
+class MemoryBudget:
+    """Sizes batches of source products to keep the process RSS under `max_memory` bytes."""
+
+    def __init__(self, max_memory: int, min_batch_size: int = MIN_BATCH_SIZE, max_batch_size: int = MAX_BATCH_SIZE,
+                 bytes_per_product: int = BYTES_PER_PRODUCT):
+        self.max_memory = max_memory
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.bytes_per_product = bytes_per_product
+        self.peak_rss = get_rss()
+        self.n_batches = 0
+        self.n_exceeded = 0  # number of batches after which the RSS exceeded the ceiling
+        self.batch_size = self.get_batch_size(self.peak_rss)
+
+    def get_batch_size(self, rss: Optional[int]) -> int:
+        if rss is None:
+            return self.min_batch_size
+        headroom = self.max_memory - rss
+        return int(min(max(headroom / 2 / self.bytes_per_product, self.min_batch_size), self.max_batch_size))
+
+    def batches(self, products: Iterable) -> Iterator[list]:
+        """Yields lists of products, the size of each batch being set once the previous one is processed."""
+        products = iter(products)
+        while True:
+            rss = get_rss()
+            batch = list(islice(products, self.batch_size))
+            if not batch:
+                return
+            n_products = len(batch)
+            yield batch
+            batch = None
+            self.update(n_products, rss)
+
+    def update(self, n_products: int, initial_rss: Optional[int]) -> None:
+        """Measures the RSS once a batch of `n_products` is processed and released, and sizes the next batch."""
+        gc.collect()  # items and their links are reference cycles
+        self.n_batches += 1
+        rss = get_rss()
+        if rss is None or initial_rss is None:
+            return
+        self.peak_rss = max(self.peak_rss or 0, rss)
+        self.bytes_per_product = max(self.bytes_per_product, (rss - initial_rss) / n_products)
+        if rss > self.max_memory:
+            self.n_exceeded += 1
+        self.batch_size = self.get_batch_size(rss)
@@ -0,0 +1,200 @@
+"""Merging of STAC catalogs built by partitioned builds.
+
+Source products of collections can be split into disjoint partitions (contiguous ranges, or item IDs hash buckets),
+built separately (eg: on different machines) into staging directories:
+
+    labtools build all --n-max-items=-1 --partition=0/4 --stac-dir=staging/0
+    labtools build all --n-max-items=-1 --partition=1/4 --stac-dir=staging/1
+    ...
+
+and assembled into a single STAC catalog by `merge_catalogs`. Staging catalogs share the skeleton catalog of the
+definitions, and their hierarchical links are relative: items files are copied (or moved) as is, catalogs child links
+are merged, collections item links are concatenated, and collections extents, summaries and coverage maps are merged
+from the staging collections, without reading items. Items are only read once to rebuild the spatial and properties
+indexes, so that merging is linear in the number of items.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+import json
+import os
+import shutil
+
+import pystac
+from pystac.utils import is_absolute_href
+
+from labtools.builder import PARTITION_FILE_NAME
+from labtools.coverage import CoverageAccumulator
+from labtools.index import write_collection_index
+from labtools.metrics import metrics
+from labtools.quarantine import Quarantine
+from labtools.serialization import FastStacIO, find_root_catalog_file, read_catalog
+from labtools.summaries import CollectionAggregator
+
+MERGED_RELS = ['child', 'item']  # links merged from all staging catalogs and collections
+
+
+def read_partition(staging_dir) -> Optional[Dict[str, Any]]:
+    """Returns the partition description of a staging STAC catalog, or None if not built as a partition."""
+    partition_file = Path(staging_dir) / PARTITION_FILE_NAME
+    if not partition_file.exists():
+        return None
+    with open(partition_file) as f:
+        return json.load(f)
+
+
+def sort_staging_dirs(staging_dirs: list) -> list:
+    """Returns staging directories sorted by partition index, so that items of range partitions are merged in source
+    products order, and warns about missing, duplicate or inconsistent partitions.
+    """
+    partitions = {str(staging_dir): read_partition(staging_dir) for staging_dir in staging_dirs}
+    staging_dirs = sorted(staging_dirs, key=lambda staging_dir: (partitions[str(staging_dir)] or {}).get('partition', -1))
+    partitions = [partition for partition in partitions.values() if partition]
+    if not partitions:
+        return staging_dirs
+    if len({(partition['n_partitions'], partition['partition_by']) for partition in partitions}) > 1:
+        print(f'WARNING: Staging catalogs were built with different partitionings: {partitions}.')
+        return staging_dirs
+    n_partitions = partitions[0]['n_partitions']
+    indexes = [partition['partition'] for partition in partitions]
+    missing_indexes = sorted(set(range(n_partitions)) - set(indexes))
+    duplicate_indexes = sorted({index for index in indexes if indexes.count(index) > 1})
+    if missing_indexes:
+        print(f'WARNING: Partitions {missing_indexes} of {n_partitions} are missing; merged catalog is incomplete.')
+    if duplicate_indexes:
+        print(f'WARNING: Partitions {duplicate_indexes} are merged more than once.')
+    return staging_dirs
+
+
+def resolve_href(href: str, start_href: str) -> str:
+    """Returns the absolute path of a link href, relative to the file holding the link."""
+    if is_absolute_href(href):
+        return href
+    return os.path.normpath(os.path.join(os.path.dirname(start_href), href))
+
+
+def walk_catalog(stac_io: FastStacIO, catalog_file: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yields the files and dictionaries of the catalogs and collections of a STAC catalog, without reading items."""
+    catalog_files = [catalog_file]
+    while catalog_files:
+        catalog_file = catalog_files.pop(0)
+        catalog_dict = json.loads(stac_io.read_text_from_href(catalog_file))
+        yield catalog_file, catalog_dict
+        catalog_files += [resolve_href(link['href'], catalog_file) for link in catalog_dict.get('links', []) if link['rel'] == 'child']
+
+
+def merge_collection(collection_dict: Dict[str, Any], staging_collections: List[Tuple[str, Dict[str, Any]]], collection_dir) -> None:
+    """Sets the extent, summaries and coverage map of a merged collection from those of its staging collections."""
+    aggregator = CollectionAggregator()
+    coverage_accumulator = None
+    for collection_file, staging_collection_dict in staging_collections:
+        n_items = len([link for link in staging_collection_dict.get('links', []) if link['rel'] == 'item'])
+        aggregator.seed(pystac.Collection.from_dict(staging_collection_dict), n_items=n_items)
+        coverage_asset = staging_collection_dict.get('assets', {}).get('coverage')
+        if not coverage_asset:
+            continue
+        staging_coverage = CoverageAccumulator.load(resolve_href(coverage_asset['href'], collection_file))
+        if coverage_accumulator is None:
+            coverage_accumulator = staging_coverage
+        elif staging_coverage.counts.shape != coverage_accumulator.counts.shape:
+            print(f'WARNING: Coverage map of {collection_file} has a different resolution; not merged.')
+        else:
+            coverage_accumulator.counts = coverage_accumulator.counts + staging_coverage.counts
+            coverage_accumulator.n_items += staging_coverage.n_items
+
+    stac_collection = pystac.Collection.from_dict(collection_dict)
+    aggregator.apply(stac_collection, summaries=collection_dict.get('summaries'))
+    collection_dict['extent'] = stac_collection.extent.to_dict()
+    collection_dict.pop('summaries', None)
+    if stac_collection.summaries.to_dict():
+        collection_dict['summaries'] = stac_collection.summaries.to_dict()
+    if coverage_accumulator:
+        coverage_accumulator.write(collection_dir, stac_collection=stac_collection)
+        collection_dict.setdefault('assets', {}).update({
+            key: stac_collection.assets[key].to_dict() for key in ['coverage', 'coverage_preview']
+        })
+
+
+def merge_catalogs(staging_dirs: list, stac_dir, move: bool = False) -> int:
+    """Merges STAC catalogs built into staging directories (eg: by partitioned builds) into a new STAC catalog, and
+    returns the number of merged items. Items files are moved instead of copied if `move` is set.
+
+    Staging catalogs must be self-contained and built with the same layout and compression. Items found in several
+    staging catalogs are merged once.
+    """
+    stac_dir = Path(stac_dir)
+    staging_dirs = sort_staging_dirs([Path(staging_dir) for staging_dir in staging_dirs])
+    if stac_dir.resolve() in [staging_dir.resolve() for staging_dir in staging_dirs]:
+        raise ValueError(f'Merged STAC catalog directory {stac_dir} cannot be one of the staging directories.')
+    root_catalog_files = [find_root_catalog_file(staging_dir) for staging_dir in staging_dirs]
+    if len({os.path.basename(root_catalog_file) for root_catalog_file in root_catalog_files}) > 1:
+        raise ValueError(f'Staging catalogs have different compressions: {root_catalog_files}.')
+    if stac_dir.exists():
+        shutil.rmtree(stac_dir)
+
+    stac_io = FastStacIO()
+    merged_dicts: Dict[str, Dict[str, Any]] = {}  # merged catalogs and collections dictionaries, by relative path
+    merged_links: Dict[str, set] = {}  # merged links (rel, href), by relative path
+    staging_collections: Dict[str, list] = {}  # staging collections files and dictionaries, by relative path
+    quarantine = Quarantine()
+    n_items = n_duplicates = 0
+
+    for staging_dir, root_catalog_file in zip(staging_dirs, root_catalog_files):
+        print(f'merging: {staging_dir}')
+        staging_dir = os.path.abspath(staging_dir)
+        for catalog_file, catalog_dict in walk_catalog(stac_io, os.path.abspath(root_catalog_file)):
+            path = os.path.relpath(catalog_file, staging_dir)
+            is_new = path not in merged_dicts
+            if is_new:
+                merged_dicts[path] = dict(catalog_dict, links=list(catalog_dict.get('links', [])))
+                merged_links[path] = set()
+            for link in catalog_dict.get('links', []):
+                if link['rel'] not in MERGED_RELS:
+                    continue
+                if (link['rel'], link['href']) in merged_links[path]:
+                    n_duplicates += link['rel'] == 'item'
+                    continue
+                merged_links[path].add((link['rel'], link['href']))
+                if not is_new:
+                    merged_dicts[path]['links'].append(link)
+                if link['rel'] != 'item':
+                    continue
+
+                # items hierarchical links are relative to their file, at the same position in the merged catalog
+                item_file = resolve_href(link['href'], catalog_file)
+                merged_item_file = stac_dir / os.path.relpath(item_file, staging_dir)
+                merged_item_file.parent.mkdir(parents=True, exist_ok=True)
+                with metrics.timer('merge.copy'):
+                    if move:
+                        shutil.move(item_file, merged_item_file)
+                    else:
+                        shutil.copyfile(item_file, merged_item_file)
+                n_items += 1
+            if catalog_dict.get('type') == 'Collection':
+                staging_collections.setdefault(path, []).append((catalog_file, catalog_dict))
+
+        quarantine.update(Quarantine.load(staging_dir).get_entries())
+        if (Path(staging_dir) / 'parquet').exists() or (Path(staging_dir) / 'feeds').exists():
+            print(f'WARNING: GeoParquet exports and NDJSON feeds of {staging_dir} are not merged.')
+
+    # write merged catalogs and collections
+    for path, merged_dict in merged_dicts.items():
+        merged_file = stac_dir / path
+        if path in staging_collections:
+            merge_collection(merged_dict, staging_collections[path], merged_file.parent)
+        stac_io.save_json(merged_file, merged_dict)
+    stac_io.close()
+    print(f'merged {n_items} items of {len(staging_dirs)} staging catalogs into: {stac_dir}')
+    if n_duplicates:
+        print(f'WARNING: {n_duplicates} items found in several staging catalogs were merged once; coverage maps may count them several times.')
+
+    # rebuild collections spatial indexes
+    for stac_collection in read_catalog(stac_dir).get_all_collections():
+        with metrics.timer('merge.index'):
+            index_file = write_collection_index(stac_collection)
+        print(f'written spatial index: {index_file}')
+
+    if len(quarantine):
+        print(f'WARNING: {len(quarantine)} source products could not be transformed; quarantined in: {quarantine.save(stac_dir)}')
+
+    print('Done.')
+    return n_items
@@ -0,0 +1,217 @@
+"""Lightweight instrumentation of the build pipeline: timers, counters and histograms.
+
+Pipeline stages and transformers hooks are wrapped with timers of the module-level `metrics` registry, eg:
+
+    with metrics.timer('transform.geometry'):
+        geometry = self.get_geometry(metadata, definition=definition, data_path=data_path)
+
+Instrumentation is disabled by default, in which case `timer()` returns a shared no-op context manager, and
+`count()` and `observe()` return immediately, so that the overhead is a single attribute check per call. Once
+enabled, durations are accumulated into histograms, and a summary can be exported as JSON or in the Prometheus text
+exposition format (eg: for the node exporter textfile collector) at the end of a run.
+"""
+from typing import Any, Dict, Optional, Tuple
+from pathlib import Path
+from contextlib import nullcontext
+from functools import wraps
+import json
+import re
+import time
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)  # histograms buckets upper bounds, in seconds
+PROMETHEUS_PREFIX = 'labtools'
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """Count, sum, minimum and maximum of observed values, and cumulative counts per bucket upper bound."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative_counts = []
+        total = 0
+        for bucket_count in self.bucket_counts:
+            total += bucket_count
+            cumulative_counts.append(total)
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, cumulative_counts)}
+        }
+
+
+class Timer:
+    """Context manager observing its duration into a histogram, and adding it to the current span if any."""
+
+    def __init__(self, histogram: Histogram, name: str = None, span: Dict[str, float] = None):
+        self.histogram = histogram
+        self.name = name
+        self.span = span
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start_time
+        self.histogram.observe(duration)
+        if self.span is not None:
+            self.span[self.name] = self.span.get(self.name, 0.0) + duration
+        return False
+
+
+class Metrics:
+    """Registry of named timers, counters and histograms."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.timers: Dict[str, Histogram] = {}
+        self.span: Optional[Dict[str, float]] = None
+        self.start_time = time.perf_counter()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.counters = {}
+        self.histograms = {}
+        self.timers = {}
+        self.start_time = time.perf_counter()
+
+    def timer(self, name: str):
+        """Returns a context manager timing the enclosed block as stage `name`."""
+        if not self.enabled:
+            return _NULL_TIMER
+        histogram = self.timers.get(name)
+        if histogram is None:
+            histogram = self.timers[name] = Histogram()
+        return Timer(histogram, name, self.span)
+
+    def start_span(self) -> None:
+        """Starts recording the stages durations of a unit of work (eg: an item), in addition to histograms."""
+        self.span = {}
+
+    def end_span(self) -> Dict[str, float]:
+        """Ends the current span, and returns its stages durations."""
+        span, self.span = self.span, None
+        return span or {}
+
+    def observe_span(self, span: Dict[str, float]) -> None:
+        """Adds stages durations recorded elsewhere (eg: the span of a worker process) to timers."""
+        if not self.enabled:
+            return
+        for name, duration in (span or {}).items():
+            histogram = self.timers.get(name)
+            if histogram is None:
+                histogram = self.timers[name] = Histogram()
+            histogram.observe(duration)
+
+    def timed(self, name: str):
+        """Decorator timing each call of a function as stage `name`."""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: float = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DURATION_BUCKETS) -> None:
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets=buckets)
+        histogram.observe(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'elapsed_time': time.perf_counter() - self.start_time,
+            'timers': {name: histogram.to_dict() for name, histogram in sorted(self.timers.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'histograms': {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+        }
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        def metric_name(name: str, suffix: str = '') -> str:
+            return f'{PROMETHEUS_PREFIX}_{re.sub(r"[^a-zA-Z0-9_]", "_", name)}{suffix}'
+
+        def histogram_lines(name: str, histogram: Histogram, help_text: str) -> list:
+            lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            histogram_dict = histogram.to_dict()
+            for bound, count in histogram_dict['buckets'].items():
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum {histogram.sum}')
+            lines.append(f'{name}_count {histogram.count}')
+            return lines
+
+        lines = []
+        for name, histogram in sorted(self.timers.items()):
+            lines.extend(histogram_lines(metric_name(name, '_seconds'), histogram, f'Duration of the {name} stage.'))
+        for name, value in sorted(self.counters.items()):
+            counter_name = metric_name(name, '_total')
+            lines.extend([f'# HELP {counter_name} Number of {name}.', f'# TYPE {counter_name} counter', f'{counter_name} {value}'])
+        for name, histogram in sorted(self.histograms.items()):
+            lines.extend(histogram_lines(metric_name(name), histogram, f'Distribution of {name}.'))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, metrics_file) -> Path:
+        """Writes the metrics to a Prometheus text file if its extension is `.prom`, or to a JSON file otherwise."""
+        metrics_file = Path(metrics_file)
+        metrics_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(metrics_file, 'w') as f:
+            if metrics_file.suffix == '.prom':
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+        return metrics_file
+
+    def print_summary(self, n_max_stages: Optional[int] = None) -> None:
+        """Prints stages total durations, by decreasing total duration, and counters."""
+        timers = sorted(self.timers.items(), key=lambda item: item[1].sum, reverse=True)[:n_max_stages]
+        print(f'{"stage":<32} {"count":>8} {"total (s)":>10} {"mean (ms)":>10} {"max (ms)":>10}')
+        for name, histogram in timers:
+            print(f'{name:<32} {histogram.count:>8} {histogram.sum:>10.3f} {histogram.sum / histogram.count * 1e3:>10.3f} '
+                  f'{histogram.maximum * 1e3:>10.3f}')
+        for name, value in sorted(self.counters.items()):
+            print(f'{name:<32} {value:>8g}')
+
+
+metrics = Metrics()
@@ -0,0 +1,163 @@
+"""Pipelined download, transformation and writing of STAC collections.
+
+`run_pipeline` mirrors the data files of source collections and builds their STAC catalog in a single pass, as
+three bounded producer/consumer stages, so that network and CPU time overlap:
+
+    download threads  -->  transformation worker processes  -->  writer (main process)
+
+A source product is submitted to the transformation workers as soon as its data file is downloaded (or found already
+downloaded), and its item is added to its collection and written as soon as created. Products of all collections go
+through the same stages, and at most `max_pending` products are in flight at once (downloading, being transformed,
+or waiting to be written), bounding the disk space of downloads ahead of the transformation, and the memory held by
+pending results.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+import os
+import queue
+import shutil
+import threading
+import time
+
+import pystac
+
+from labtools.builder import CollectionBuilder, create_root_catalog, init_worker, transform_product, layout
+from labtools.buildlog import BuildLogWriter
+from labtools.coverage import PIXELS_PER_DEGREE
+from labtools.index import write_collection_index
+from labtools.ias import psup
+from labtools.metrics import metrics
+from labtools.quarantine import Quarantine
+from labtools.serialization import CatalogWriter
+
+N_DOWNLOAD_WORKERS = 4  # number of concurrent downloads
+N_WORKERS = os.cpu_count() or 1  # number of transformation worker processes
+MAX_PENDING = 64  # maximum number of source products in flight, from download to writing
+
+
+def run_pipeline(definitions, source_collections_files, stac_dir, n_max_items=None, overwrite=False, layout_strategy=layout,
+                 parquet=False, feeds=False, coverage=False, coverage_resolution=PIXELS_PER_DEGREE, build_log=None,
+                 schema_modules=None, n_workers=N_WORKERS, n_download_workers=N_DOWNLOAD_WORKERS, max_pending=MAX_PENDING):
+    """Downloads the data files of source collections products, transforms them and writes the created items into a
+    new STAC catalog, as pipelined stages. `schema_modules` are loaded by worker processes, if not inherited.
+    """
+    stac_dir = Path(stac_dir)
+    if stac_dir.exists():
+        shutil.rmtree(stac_dir)
+
+    # per-item build records, holding download and transformation stages durations
+    log_writer = None
+    if build_log:
+        log_writer = BuildLogWriter(build_log)
+        metrics.enable()
+    quarantine = Quarantine()
+
+    # create destination skeleton STAC catalog, and collections
+    root_stac_catalog = create_root_catalog(definitions)
+    root_stac_catalog.normalize_hrefs(str(stac_dir), strategy=layout_strategy)
+    collection_builders = [
+        CollectionBuilder(definitions, source_collection_file, root_stac_catalog, stac_dir, layout_strategy=layout_strategy,
+                          parquet=parquet, feeds=feeds, coverage=coverage, coverage_resolution=coverage_resolution,
+                          log_writer=log_writer, quarantine=quarantine)
+        for source_collection_file in source_collections_files
+    ]
+    tasks = [(collection_builder, index, product_metadata)
+             for collection_builder in collection_builders
+             for index, product_metadata in collection_builder.read_products(n_max_items=n_max_items)]
+    print(f'{len(tasks)} source products to download and transform.')
+    print()
+
+    results = queue.Queue()  # (task, future, download error or skip reason, download duration), as completed
+    slots = threading.BoundedSemaphore(max_pending)
+    catalog_writer = CatalogWriter()
+    Path.mkdir(stac_dir, parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=n_download_workers) as download_executor, \
+            ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(schema_modules or [],)) as transform_executor:
+
+        def download(task) -> None:
+            collection_builder, index, product_metadata = task
+            start_time = time.perf_counter()
+            error = None
+            try:
+                if hasattr(product_metadata, 'get_download_url'):
+                    data_dir = Path(collection_builder.source_collection_file).parent / 'data'
+                    psup.download_data_file(product_metadata, data_dir, overwrite=overwrite)
+            except Exception as e:  # transformers may not require data files, and report missing ones
+                error = e
+            download_duration = time.perf_counter() - start_time
+            try:
+                skip_reason = collection_builder.get_skip_reason(product_metadata)
+                if skip_reason:
+                    results.put((task, None, skip_reason, download_duration))
+                    return
+                future = transform_executor.submit(transform_product, collection_builder.schema_name, product_metadata,
+                                                   collection_builder.collection_definition, collection_builder.collection_id,
+                                                   collection_builder.data_path, log_writer is not None)
+                future.add_done_callback(lambda future: results.put((task, future, error, download_duration)))
+            except Exception as e:
+                results.put((task, None, e, download_duration))
+
+        def produce() -> None:
+            for task in tasks:
+                slots.acquire()
+                download_executor.submit(download, task)
+
+        producer = threading.Thread(target=produce, name='labtools-pipeline-producer', daemon=True)
+        producer.start()
+
+        # write items as they are created
+        for n_done in range(1, len(tasks) + 1):
+            task, future, error, download_duration = results.get()
+            collection_builder, index, product_metadata = task
+            try:
+                print(f'{n_done}/{len(tasks)}')
+                record = collection_builder.new_record(index, product_metadata)
+                if isinstance(error, str):
+                    collection_builder.add_skipped(record, error)
+                    continue
+                if error is not None:
+                    print(error)
+                    print(f'WARNING: Data file of source product {index} of {collection_builder.collection_id!r} could not be downloaded.')
+                stages = {'download.file': download_duration}
+                duration = download_duration
+                try:
+                    if not isinstance(future, Future):
+                        raise error
+                    item_dict, transform_duration, transform_stages = future.result()
+                    duration += transform_duration
+                    stages.update(transform_stages)
+                    metrics.observe_span(transform_stages)
+                    stac_item = pystac.Item.from_dict(item_dict, preserve_dict=False)
+                    collection_builder.add_item(stac_item, index=index)
+                    with metrics.timer('build.save'):
+                        catalog_writer.write_item(stac_item)
+                except Exception as e:
+                    collection_builder.add_failure(index, product_metadata, e, record)
+                collection_builder.write_record(record, duration=duration, stages=stages)
+            finally:
+                slots.release()
+        producer.join()
+
+    for collection_builder in collection_builders:
+        collection_builder.close()
+
+    # save catalogs and collections, items being already written
+    print()
+    print(f'saving to: {str(stac_dir)}')
+    with metrics.timer('build.save'):
+        catalog_writer.save(root_stac_catalog, catalog_type=pystac.CatalogType.SELF_CONTAINED, write_items=False)
+
+    for collection_builder in collection_builders:
+        with metrics.timer('build.index'):
+            index_file = write_collection_index(collection_builder.stac_collection)
+        print(f'written spatial index: {index_file}')
+
+    if log_writer:
+        log_writer.close()
+        print(f'written {log_writer.n_records} build records to: {log_writer.log_file}')
+
+    if len(quarantine):
+        print(f'WARNING: {len(quarantine)} source products could not be transformed; quarantined in: {quarantine.save(stac_dir)}')
+
+    print('Done.')
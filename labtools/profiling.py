@@ -0,0 +1,197 @@
+"""Profiling of build runs, with standard library profilers only.
+
+Three modes are available:
+
+    cprofile    deterministic profiling with `cProfile`, written as a `.pstats` file (eg: for snakeviz), along with a
+                text report of the functions with the highest cumulative time
+    sampling    statistical profiling from a background thread sampling all threads stacks at a fixed interval,
+                written as collapsed stacks (`.collapsed`, one `frame;frame;...;frame count` line per distinct stack,
+                as expected by flamegraph.pl or speedscope), along with a text report of the most sampled functions
+    memory      `tracemalloc` snapshots at start and end of the run, written as a `.tracemalloc` snapshot file, along
+                with a text report of the top allocation sites, their growth over the run, and the peak traced memory
+
+Reports of a run are named after the run name and process ID, so that worker processes of parallel builds, each
+running their own `Profiler`, write their own reports alongside those of the main process.
+"""
+from typing import List
+from collections import Counter
+from pathlib import Path
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODES = ['cprofile', 'sampling', 'memory']
+SAMPLING_INTERVAL = 0.005  # seconds between stacks samples
+TRACEMALLOC_N_FRAMES = 10  # number of frames stored per allocation traceback
+N_TOP = 40  # number of entries of text reports
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads of the process from a background thread."""
+
+    def __init__(self, interval: float = SAMPLING_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.n_samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        sampler_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                if thread_id not in thread_names:
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.n_samples += 1
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample, name='labtools-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write_collapsed(self, collapsed_file) -> None:
+        with open(collapsed_file, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def get_report(self, n_top: int = N_TOP) -> str:
+        """Returns the most sampled functions, by self (leaf frame) and total (anywhere in the stack) samples."""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]  # skip thread name
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for label in set(frames):
+                total_counts[label] += count
+        n_stacks = sum(self.stacks.values()) or 1
+        lines = [f'{self.n_samples} samples every {self.interval * 1e3:g} ms, {n_stacks} thread stacks', '',
+                 f'{"self %":>7} {"total %":>8}  function']
+        for label, count in self_counts.most_common(n_top):
+            lines.append(f'{count / n_stacks * 100:>7.2f} {total_counts[label] / n_stacks * 100:>8.2f}  {label}')
+        return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+    """Context manager profiling the enclosed block, and writing its reports once exited, eg:
+
+        with Profiler('sampling', 'profiles', name='build') as profiler:
+            build_catalog(...)
+        print(profiler.report_files)
+    """
+
+    def __init__(self, mode: str, output_dir, name: str = 'build', n_top: int = N_TOP):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'Invalid profile mode: {mode!r}. Expected one of: {PROFILE_MODES}.')
+        self.mode = mode
+        self.output_dir = Path(output_dir)
+        self.name = f'{name}-{os.getpid()}'
+        self.n_top = n_top
+        self.report_files: List[Path] = []
+        self._profiler = None
+        self._start_snapshot = None
+        self._start_time = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self) -> None:
+        self._start_time = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.mode == 'sampling':
+            self._profiler = SamplingProfiler()
+            self._profiler.start()
+        elif self.mode == 'memory':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_N_FRAMES)
+            tracemalloc.reset_peak()
+            self._start_snapshot = tracemalloc.take_snapshot()
+
+    def stop(self) -> List[Path]:
+        """Stops profiling, and writes and returns the reports files."""
+        duration = time.perf_counter() - self._start_time
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = self.output_dir / self.name
+
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+            stats_file = prefix.with_suffix('.pstats')
+            self._profiler.dump_stats(stats_file)
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=stream)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.n_top)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(self.n_top)
+            self.report_files = [stats_file, self._write_report(prefix, 'cprofile', stream.getvalue(), duration)]
+
+        elif self.mode == 'sampling':
+            self._profiler.stop()
+            collapsed_file = prefix.with_suffix('.collapsed')
+            self._profiler.write_collapsed(collapsed_file)
+            self.report_files = [collapsed_file, self._write_report(prefix, 'sampling', self._profiler.get_report(self.n_top), duration)]
+
+        elif self.mode == 'memory':
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot_file = prefix.with_suffix('.tracemalloc')
+            snapshot.dump(str(snapshot_file))
+            self.report_files = [snapshot_file, self._write_report(prefix, 'memory', self._get_memory_report(snapshot, current, peak), duration)]
+
+        return self.report_files
+
+    def _get_memory_report(self, snapshot: tracemalloc.Snapshot, current: int, peak: int) -> str:
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        snapshot = snapshot.filter_traces(filters)
+        lines = [f'traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB', '',
+                 f'top {self.n_top} allocation sites (at end of run):']
+        for statistic in snapshot.statistics('lineno')[:self.n_top]:
+            lines.append(f'  {statistic.size / 1e6:>9.3f} MB {statistic.count:>9} blocks  {statistic.traceback[0]}')
+        lines += ['', f'top {self.n_top} allocation sites growth (over run):']
+        for statistic in snapshot.compare_to(self._start_snapshot.filter_traces(filters), 'lineno')[:self.n_top]:
+            lines.append(f'  {statistic.size_diff / 1e6:>+9.3f} MB {statistic.count_diff:>+9} blocks  {statistic.traceback[0]}')
+        lines += ['', 'largest allocation tracebacks:']
+        for statistic in snapshot.statistics('traceback')[:5]:
+            lines.append(f'  {statistic.size / 1e6:.3f} MB, {statistic.count} blocks')
+            lines.extend(f'    {line}' for line in statistic.traceback.format(most_recent_first=True))
+        return '\n'.join(lines) + '\n'
+
+    def _write_report(self, prefix: Path, mode: str, report: str, duration: float) -> Path:
+        report_file = prefix.with_name(f'{prefix.name}.{mode}.txt')
+        with open(report_file, 'w') as f:
+            f.write(f'{self.name} ({mode} profile, {duration:.2f} s)\n\n')
+            f.write(report)
+        return report_file
+
@@ -0,0 +1,75 @@
+"""Quarantine list of source products that failed to be transformed during a build.
+
+The list is written as a `quarantine.json` file at the root of the built STAC catalog directory, holding for each
+failed product its collection, position in the source collection file, expected item ID, and error, eg:
+
+    [{"collection": "mex_omega_c_proj_ddr", "source_collection_file": ".../mex_omega_c_proj_ddr.json",
+      "index": 8921, "id": "OMEGA_L3_2417_3_CPROJ", "error_class": "OSError", "error": "NetCDF: HDF error",
+      "time": 1697731200.5}]
+
+so that only these products are processed again by `labtools build --retry-failed`.
+"""
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import json
+import os
+import time
+
+QUARANTINE_FILE_NAME = 'quarantine.json'
+
+
+class Quarantine:
+    """Failed source products entries, by collection and source product index."""
+
+    def __init__(self, entries: List[Dict[str, Any]] = None):
+        self.entries: Dict[tuple, Dict[str, Any]] = {}
+        self.update(entries or [])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, collection_id: str, index: int, item_id: str, source_collection_file, error: Exception) -> None:
+        self.entries[(collection_id, index)] = {
+            'collection': collection_id,
+            'source_collection_file': str(source_collection_file),
+            'index': index,
+            'id': item_id,
+            'error_class': error.__class__.__name__,
+            'error': str(error),
+            'time': time.time()
+        }
+
+    def update(self, entries: List[Dict[str, Any]]) -> None:
+        """Adds entries of another quarantine list (eg: of a worker process)."""
+        for entry in entries:
+            self.entries[(entry['collection'], entry['index'])] = entry
+
+    def remove(self, collection_id: str, index: int) -> None:
+        self.entries.pop((collection_id, index), None)
+
+    def get_entries(self, collection_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Returns entries of a collection, or of all collections, sorted by collection and source product index."""
+        return [entry for key, entry in sorted(self.entries.items()) if collection_id is None or key[0] == collection_id]
+
+    def get_collections_ids(self) -> List[str]:
+        return sorted({collection_id for collection_id, _ in self.entries})
+
+    @classmethod
+    def load(cls, stac_dir) -> 'Quarantine':
+        """Loads the quarantine list of a built STAC catalog, empty if none."""
+        quarantine_file = Path(stac_dir) / QUARANTINE_FILE_NAME
+        if not quarantine_file.exists():
+            return cls()
+        with open(quarantine_file) as f:
+            return cls(json.load(f))
+
+    def save(self, stac_dir) -> Path:
+        """Writes the quarantine list into a built STAC catalog directory, or removes it if empty."""
+        quarantine_file = Path(stac_dir) / QUARANTINE_FILE_NAME
+        if not self.entries:
+            if quarantine_file.exists():
+                os.remove(quarantine_file)
+            return quarantine_file
+        with open(quarantine_file, 'w') as f:
+            json.dump(self.get_entries(), f, indent=2)
+        return quarantine_file
@@ -0,0 +1,174 @@
+"""Cost-aware scheduling of build tasks over worker processes.
+
+`Scheduler.run` executes tasks of estimated costs (eg: source products data files sizes, or past transformation
+durations) over a pool of worker processes, largest first: idle workers take the most expensive remaining task from
+a shared queue, so that the largest tasks are started early and the smallest ones fill the remaining gaps, instead of
+a worker being left with a large task once the others are done.
+
+Each worker receives its tasks and returns results over its own pipe, so that a worker running a task longer than the
+task timeout (eg: stalled on a pathological file) can be terminated, and replaced, without affecting the others. The
+task is then reported as failed with a `TaskTimeoutError`.
+"""
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+from collections import deque
+from multiprocessing.connection import wait
+import multiprocessing
+import pickle
+import time
+
+from labtools.profiling import Profiler
+
+STOP_TIMEOUT = 5.0  # seconds given to workers to exit once stopped, before being terminated
+
+
+class TaskTimeoutError(TimeoutError):
+    """Raised for a task whose execution exceeded the task timeout."""
+
+
+class WorkerError(RuntimeError):
+    """Raised for a task whose worker process exited unexpectedly (eg: crashed in a C extension)."""
+
+
+class Task(NamedTuple):
+    key: Any  # task identifier, returned with its result
+    cost: float  # estimated cost, in any consistent unit
+    function: Callable  # module-level function, run by a worker process
+    args: tuple
+
+
+def run_worker(connection, initializer: Optional[Callable], initargs: tuple, profile: Optional[str], profile_dir) -> None:
+    """Worker process main loop, running tasks received from its connection until a None task is received."""
+    if initializer:
+        initializer(*initargs)
+    profiler = None
+    if profile:
+        profiler = Profiler(profile, profile_dir, name='worker')
+        profiler.start()
+    try:
+        while True:
+            task = connection.recv()
+            if task is None:
+                break
+            key, function, args = task
+            try:
+                connection.send((key, function(*args), None))
+            except Exception as e:
+                try:
+                    pickle.dumps(e)
+                except Exception:  # eg: exceptions of C extensions
+                    e = RuntimeError(f'{e.__class__.__name__}: {e}')
+                connection.send((key, None, e))
+    finally:
+        if profiler:
+            profiler.stop()
+
+
+class Worker:
+    """Worker process, and the task it is running if any."""
+
+    def __init__(self, context, initializer: Optional[Callable], initargs: tuple, profile: Optional[str], profile_dir):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(worker_connection, initializer, initargs, profile, profile_dir),
+                                       name='labtools-worker', daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self.task: Optional[Task] = None
+        self.start_time = None
+
+    def assign(self, task: Task) -> None:
+        self.connection.send((task.key, task.function, task.args))
+        self.task = task
+        self.start_time = time.monotonic()
+
+    def stop(self) -> None:
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(STOP_TIMEOUT)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+class Scheduler:
+    """Pool of worker processes running tasks by decreasing estimated cost, eg:
+
+        scheduler = Scheduler(n_workers=8, task_timeout=600)
+        for key, result, error in scheduler.run([Task(key, cost, function, args) for ...]):
+            ...
+    """
+
+    def __init__(self, n_workers: int, task_timeout: Optional[float] = None, initializer: Optional[Callable] = None,
+                 initargs: tuple = (), profile: Optional[str] = None, profile_dir='profiles'):
+        self.n_workers = n_workers
+        self.task_timeout = task_timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.context = multiprocessing.get_context()
+        self.n_timeouts = 0
+        self.n_worker_errors = 0
+
+    def _start_worker(self) -> Worker:
+        return Worker(self.context, self.initializer, self.initargs, self.profile, self.profile_dir)
+
+    def _replace_crashed_worker(self, workers: list, worker: Worker) -> WorkerError:
+        """Replaces a worker whose process exited unexpectedly, and returns the error of the task it was assigned."""
+        self.n_worker_errors += 1
+        worker.process.join(STOP_TIMEOUT)  # exit code is only set once the process is joined
+        worker.kill()
+        workers[workers.index(worker)] = self._start_worker()
+        return WorkerError(f'Worker process exited unexpectedly (exit code {worker.process.exitcode}).')
+
+    def run(self, tasks: Iterable[Task]) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+        """Runs tasks largest first, and yields `(key, result, error)` tuples as tasks complete, fail or time out."""
+        pending = deque(sorted(tasks, key=lambda task: task.cost, reverse=True))
+        workers = [self._start_worker() for _ in range(min(self.n_workers, len(pending)))]
+        try:
+            while True:
+                for worker in list(workers):
+                    if worker.task is None and pending:
+                        task = pending.popleft()
+                        try:
+                            worker.assign(task)
+                        except (OSError, ValueError):  # worker process exited while idle
+                            yield task.key, None, self._replace_crashed_worker(workers, worker)
+                busy_workers = {worker.connection: worker for worker in workers if worker.task is not None}
+                if not busy_workers:
+                    if pending:  # replaced workers are assigned remaining tasks
+                        continue
+                    break
+
+                # wait for a result, or until the first running task deadline
+                wait_timeout = None
+                if self.task_timeout:
+                    now = time.monotonic()
+                    wait_timeout = max(0.0, min(worker.start_time + self.task_timeout - now for worker in busy_workers.values()))
+                for connection in wait(list(busy_workers), timeout=wait_timeout):
+                    worker = busy_workers[connection]
+                    task, worker.task = worker.task, None
+                    try:
+                        key, result, error = connection.recv()
+                    except (EOFError, OSError):
+                        key, result, error = task.key, None, self._replace_crashed_worker(workers, worker)
+                    yield key, result, error
+
+                # terminate and replace workers of timed out tasks
+                if self.task_timeout:
+                    now = time.monotonic()
+                    for i, worker in enumerate(workers):
+                        if worker.task is not None and now - worker.start_time > self.task_timeout:
+                            self.n_timeouts += 1
+                            task = worker.task
+                            worker.kill()
+                            workers[i] = self._start_worker()
+                            yield task.key, None, TaskTimeoutError(f'Task exceeded the {self.task_timeout:g} s timeout; worker process terminated.')
+        finally:
+            for worker in workers:
+                worker.stop()
@@ -0,0 +1,325 @@
+"""Fast STAC JSON serialization backend.
+
+`FastStacIO` is a `pystac.StacIO` implementation encoding STAC objects with `orjson` when available (falling back
+to the standard `json` module). Encoded files are written by batches from a thread pool, so that file writes overlap
+with the serialization of the next objects.
+
+Files whose name ends with `.gz` or `.zst` are gzip or Zstandard compressed by the writing threads, and transparently
+decompressed when read (see `builder.CompressedLayout` to name all catalog files this way).
+
+`save_catalog` writes a whole catalog tree this way. Hierarchical links shared by the items of a collection (root,
+parent, collection) are derived from self hrefs collected once, rather than resolved again for each item.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future
+import gzip
+import json
+import os
+
+import pystac
+from pystac.stac_io import DefaultStacIO
+from pystac.utils import safe_urlparse
+
+from labtools.metrics import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+N_WORKERS = 8  # number of file writing threads
+BATCH_SIZE = 64  # number of files written per thread pool task
+MAX_PENDING_BATCHES = 64  # maximum number of batches queued for writing, bounding memory usage
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+
+def dumps(obj: Any, indent: bool = True) -> bytes:
+    """Returns the UTF-8 JSON encoding of an object, using orjson if available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:  # eg: non-string keys or unsupported types
+            pass
+    return json.dumps(obj, indent=2 if indent else None, separators=None if indent else (',', ':')).encode('utf-8')
+
+
+def get_compression(href: str) -> Optional[str]:
+    """Returns the compression of a file given its name suffix, or None if not compressed."""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if href.endswith(suffix):
+            if compression == 'zstd' and zstandard is None:
+                raise ImportError('Zstandard compression requires the `zstandard` package: pip install zstandard')
+            return compression
+    return None
+
+
+def compress(data: bytes, compression: Optional[str]) -> bytes:
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    elif compression == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def decompress(data: bytes, compression: Optional[str]) -> bytes:
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    elif compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def write_files(batch: List[Tuple[str, bytes]]) -> None:
+    for href, data in batch:
+        dirname = os.path.dirname(href)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with open(href, 'wb') as f:
+            f.write(compress(data, get_compression(href)))
+
+
+class FastStacIO(DefaultStacIO):
+    """StacIO writing STAC JSON files with a fast JSON encoder and thread pool batched writes, and reading
+    compressed STAC JSON files.
+
+    Writes are asynchronous: `flush()` must be called once saved, eg:
+
+        stac_io = FastStacIO()
+        stac_catalog.save(catalog_type=pystac.CatalogType.SELF_CONTAINED, stac_io=stac_io)
+        stac_io.flush()
+    """
+
+    def __init__(self, n_workers: int = N_WORKERS, batch_size: int = BATCH_SIZE, indent: bool = True, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.indent = indent
+        self.n_workers = n_workers
+        self.batch_size = batch_size
+        self.executor = None
+        self.batch: List[Tuple[str, bytes]] = []
+        self.pending: List[Future] = []
+        self.n_files = 0
+
+    def read_text_from_href(self, href: str) -> str:
+        compression = get_compression(href)
+        if compression is None or safe_urlparse(href).scheme not in ['', 'file']:
+            return super().read_text_from_href(href)
+        with open(href, 'rb') as f:
+            return decompress(f.read(), compression).decode('utf-8')
+
+    def json_dumps(self, json_dict: Dict[str, Any], *args: Any, **kwargs: Any) -> str:
+        return dumps(json_dict, indent=self.indent).decode('utf-8')
+
+    def save_json(self, dest, json_dict: Dict[str, Any], *args: Any, **kwargs: Any) -> None:
+        href = str(os.fspath(dest))
+        with metrics.timer('save.encode'):
+            data = dumps(json_dict, indent=self.indent)
+        self.batch.append((href, data))
+        self.n_files += 1
+        metrics.count('files.written')
+        if len(self.batch) >= self.batch_size:
+            self._submit()
+
+    def _submit(self) -> None:
+        if not self.batch:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.n_workers)
+        if len(self.pending) >= MAX_PENDING_BATCHES:  # wait for the oldest batches, raising write errors
+            for future in self.pending[:len(self.pending) // 2]:
+                future.result()
+            self.pending = self.pending[len(self.pending) // 2:]
+        self.pending.append(self.executor.submit(write_files, self.batch))
+        self.batch = []
+
+    def flush(self) -> None:
+        """Writes remaining files, and waits for all writes to complete."""
+        self._submit()
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+
+    def close(self) -> None:
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+HIERARCHICAL_RELS = ['root', 'parent', 'child', 'item', 'collection']
+
+
+def relative_href(href: str, start_dir: str) -> str:
+    """Returns the relative path of an absolute POSIX path or URL from an absolute start directory."""
+    href_parts = href.split('/')
+    start_parts = start_dir.rstrip('/').split('/')
+    n_common = 0
+    for href_part, start_part in zip(href_parts[:-1], start_parts):
+        if href_part != start_part:
+            break
+        n_common += 1
+    relative_parts = ['..'] * (len(start_parts) - n_common) + href_parts[n_common:]
+    if relative_parts[0] != '..':
+        relative_parts.insert(0, '.')
+    return '/'.join(relative_parts)
+
+
+class CatalogWriter:
+    """Writes a STAC catalog tree whose self hrefs are set (eg: normalized), with the `FastStacIO` backend.
+
+    Unlike `pystac.Catalog.save`, hierarchical links hrefs are derived from self hrefs collected in a single pass
+    over the catalog tree, instead of being resolved again for each link, which is quadratic in the number of items
+    of a collection.
+    """
+
+    def __init__(self, stac_io: FastStacIO = None):
+        self.stac_io = stac_io or FastStacIO()
+        self.hrefs: Dict[int, str] = {}
+
+    def collect_hrefs(self, stac_catalog: pystac.Catalog) -> None:
+        self.hrefs[id(stac_catalog)] = stac_catalog.get_self_href()
+        for link in stac_catalog.links:
+            if not link.is_resolved():
+                continue
+            if link.rel == 'child':
+                self.collect_hrefs(link.target)
+            elif link.rel == 'item':
+                self.hrefs[id(link.target)] = link.target.get_self_href()
+
+    def get_links_dicts(self, stac_object: pystac.STACObject, include_self_link: bool, relative: bool) -> List[dict]:
+        owner_dir = os.path.dirname(self.hrefs[id(stac_object)])
+        links_dicts = []
+        for link in stac_object.links:
+            if link.rel == 'self':
+                if include_self_link:
+                    links_dicts.append(link.to_dict(transform_href=False))
+                continue
+            target_href = self.hrefs.get(id(link.target)) if link.rel in HIERARCHICAL_RELS and link.is_resolved() else None
+            if target_href is None:
+                links_dicts.append(link.to_dict())
+                continue
+            link_dict = {'rel': link.rel, 'href': relative_href(target_href, owner_dir) if relative else target_href}
+            if link.media_type is not None:
+                link_dict['type'] = link.media_type
+            if link.title is not None:
+                link_dict['title'] = link.title
+            link_dict.update(link.extra_fields)
+            links_dicts.append(link_dict)
+        return links_dicts
+
+    @metrics.timed('save.to_dict')
+    def get_object_dict(self, stac_object: pystac.STACObject, include_self_link: bool, relative: bool) -> Dict[str, Any]:
+        links = stac_object.links
+        stac_object.links = []  # links are serialized separately
+        try:
+            object_dict = stac_object.to_dict(include_self_link=False, transform_hrefs=False)
+        finally:
+            stac_object.links = links
+        object_dict['links'] = self.get_links_dicts(stac_object, include_self_link, relative)
+        return object_dict
+
+    def write_item(self, stac_item: pystac.Item, catalog_type: pystac.CatalogType = pystac.CatalogType.SELF_CONTAINED) -> None:
+        """Writes an item as soon as it is added to its collection, whose self href, and root catalog self href, must be
+        set. The catalog tree is then saved with `write_items=False`.
+        """
+        self.hrefs[id(stac_item)] = stac_item.get_self_href()
+        for link in stac_item.links:
+            if link.rel in HIERARCHICAL_RELS and link.is_resolved() and id(link.target) not in self.hrefs:
+                self.hrefs[id(link.target)] = link.target.get_self_href()
+        include_self_link = catalog_type == pystac.CatalogType.ABSOLUTE_PUBLISHED
+        relative = catalog_type != pystac.CatalogType.ABSOLUTE_PUBLISHED
+        self.stac_io.save_json(self.hrefs[id(stac_item)], self.get_object_dict(stac_item, include_self_link, relative))
+        del self.hrefs[id(stac_item)]  # collected again when saving the catalog tree, if still in memory
+
+    def write_catalog(self, stac_catalog: pystac.Catalog, catalog_type: pystac.CatalogType, is_root: bool,
+                      write_items: bool = True) -> None:
+        relative = catalog_type != pystac.CatalogType.ABSOLUTE_PUBLISHED
+        items_include_self_link = catalog_type == pystac.CatalogType.ABSOLUTE_PUBLISHED
+        for link in stac_catalog.links:
+            if not link.is_resolved():
+                continue
+            if link.rel == 'child':
+                self.write_catalog(link.target, catalog_type, is_root=False, write_items=write_items)
+            elif link.rel == 'item' and write_items:
+                item = link.target
+                self.stac_io.save_json(self.hrefs[id(item)], self.get_object_dict(item, items_include_self_link, relative))
+
+        include_self_link = catalog_type == pystac.CatalogType.ABSOLUTE_PUBLISHED or \
+            (catalog_type == pystac.CatalogType.RELATIVE_PUBLISHED and is_root)
+        self.stac_io.save_json(self.hrefs[id(stac_catalog)], self.get_object_dict(stac_catalog, include_self_link, relative))
+
+    def save(self, root_stac_catalog: pystac.Catalog, catalog_type: pystac.CatalogType = pystac.CatalogType.SELF_CONTAINED,
+             write_items: bool = True) -> int:
+        """Saves the catalog tree, and returns the number of written files. Items are not written again if
+        `write_items` is False (eg: already written with `write_item`).
+        """
+        root_stac_catalog.catalog_type = catalog_type
+        self.collect_hrefs(root_stac_catalog)
+        try:
+            self.write_catalog(root_stac_catalog, catalog_type, is_root=True, write_items=write_items)
+        finally:
+            self.stac_io.close()
+        return self.stac_io.n_files
+
+    def save_child(self, root_stac_catalog: pystac.Catalog, stac_catalog: pystac.Catalog,
+                   catalog_type: pystac.CatalogType = pystac.CatalogType.SELF_CONTAINED) -> int:
+        """Saves the sub-tree of a catalog tree under one of its catalogs or collections (eg: a collection and its
+        items), leaving other files untouched, and returns the number of written files.
+        """
+        root_stac_catalog.catalog_type = catalog_type
+        self.collect_hrefs(root_stac_catalog)
+        try:
+            self.write_catalog(stac_catalog, catalog_type, is_root=stac_catalog is root_stac_catalog)
+        finally:
+            self.stac_io.close()
+        return self.stac_io.n_files
+
+    def save_objects(self, stac_objects: List[pystac.STACObject],
+                     catalog_type: pystac.CatalogType = pystac.CatalogType.SELF_CONTAINED) -> int:
+        """Saves selected objects of a catalog tree whose self hrefs are set (eg: items patched into an existing
+        collection, and the collection), leaving other files untouched, and returns the number of written files.
+        """
+        relative = catalog_type != pystac.CatalogType.ABSOLUTE_PUBLISHED
+        include_self_link = catalog_type == pystac.CatalogType.ABSOLUTE_PUBLISHED
+        for stac_object in stac_objects:
+            self.hrefs[id(stac_object)] = stac_object.get_self_href()
+            for link in stac_object.links:
+                if link.rel in HIERARCHICAL_RELS and link.is_resolved():
+                    self.hrefs.setdefault(id(link.target), link.target.get_self_href())
+        try:
+            for stac_object in stac_objects:
+                self.stac_io.save_json(self.hrefs[id(stac_object)], self.get_object_dict(stac_object, include_self_link, relative))
+        finally:
+            self.stac_io.close()
+        return self.stac_io.n_files
+
+
+def save_catalog(root_stac_catalog: pystac.Catalog, catalog_type: pystac.CatalogType = pystac.CatalogType.SELF_CONTAINED,
+                 n_workers: int = N_WORKERS) -> int:
+    """Saves a STAC catalog using the fast serialization backend, and returns the number of written files."""
+    return CatalogWriter(FastStacIO(n_workers=n_workers)).save(root_stac_catalog, catalog_type=catalog_type)
+
+
+def find_root_catalog_file(stac_dir) -> str:
+    """Returns the root catalog file of a STAC catalog directory, compressed or not."""
+    for suffix in [''] + list(COMPRESSION_SUFFIXES.values()):
+        catalog_file = os.path.join(str(stac_dir), pystac.Catalog.DEFAULT_FILE_NAME + suffix)
+        if os.path.exists(catalog_file):
+            return catalog_file
+    raise FileNotFoundError(f'No root catalog file found in {stac_dir}.')
+
+
+def read_catalog(stac_dir) -> pystac.Catalog:
+    """Reads a STAC catalog, compressed or not, given its root directory or root catalog file."""
+    catalog_file = str(stac_dir) if os.path.isfile(str(stac_dir)) else find_root_catalog_file(stac_dir)
+    return pystac.Catalog.from_file(catalog_file, stac_io=FastStacIO())
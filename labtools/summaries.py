@@ -0,0 +1,212 @@
+"""Streaming aggregation of STAC collections extents and summaries.
+
+Items are fed to a `CollectionAggregator` as they are produced, updating the spatial and temporal extents and
+min/max or distinct values summaries of a selection of properties, so that the collection metadata are derived in a
+single pass, without walking items again once the collection is built.
+"""
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+import pystac
+from pystac.utils import str_to_datetime
+
+MAX_DISTINCT_VALUES = 100  # number of distinct values beyond which numeric summaries fall back to ranges
+
+# summarized items properties, and summary type
+SUMMARY_PROPERTIES = {
+    'mission': 'distinct',
+    'platform': 'distinct',
+    'instruments': 'distinct',
+    'orbit_number': 'range',
+    'martian_year': 'distinct',
+    'solar_longitude': 'range',
+    'data_quality_id': 'distinct',
+    'incidence_angle': 'range',
+    'emission_angle': 'range',
+    'phase_angle': 'range',
+    'mean_tau': 'range',
+    'mean_watericelin': 'range',
+    'mean_icecloudindex': 'range'
+}
+
+
+class RangeAggregator:
+    """Minimum and maximum of numeric values."""
+
+    def __init__(self):
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, value: Any) -> None:
+        if isinstance(value, bool):
+            return
+        if not isinstance(value, (int, float)):  # eg: numeric strings
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return
+        if value != value:  # NaN
+            return
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        if self.minimum is None:
+            return None
+        return {'minimum': self.minimum, 'maximum': self.maximum}
+
+
+def _sort_key(value) -> tuple:
+    return str(type(value)), value
+
+
+class DistinctAggregator:
+    """Distinct values, flattening lists (eg: `instruments`). Beyond `max_values` distinct values, numeric values are
+    summarized as a range, and non-numeric ones (eg: `mission`) as the `max_values` first distinct values in sorted
+    order.
+    """
+
+    def __init__(self, max_values: int = MAX_DISTINCT_VALUES):
+        self.max_values = max_values
+        self.values = set()
+        self.range = RangeAggregator()
+        self.overflow = False
+        self._largest = None  # largest kept value, once overflowed
+
+    def update(self, value: Any) -> None:
+        if value is None:
+            return
+        for value in (value if isinstance(value, (list, tuple)) else [value]):
+            if isinstance(value, (dict, list)):
+                continue
+            self.range.update(value)
+            self._add(value)
+
+    def _add(self, value: Any) -> None:
+        if value in self.values:
+            return
+        if len(self.values) < self.max_values:
+            self.values.add(value)
+            self._largest = None
+            return
+
+        # keep the max_values smallest values
+        self.overflow = True
+        if self._largest is None:
+            self._largest = max(self.values, key=_sort_key)
+        if _sort_key(value) < _sort_key(self._largest):
+            self.values.remove(self._largest)
+            self.values.add(value)
+            self._largest = None
+
+    def result(self) -> Optional[Any]:
+        if self.overflow:
+            range_result = self.range.result()
+            if range_result is not None:
+                return range_result
+        if not self.values:
+            return None
+        return sorted(self.values, key=_sort_key)
+
+
+class CollectionAggregator:
+    """Accumulates the spatial and temporal extents and properties summaries of a collection items."""
+
+    def __init__(self, summary_properties: Dict[str, str] = None):
+        self.summary_properties = SUMMARY_PROPERTIES if summary_properties is None else summary_properties
+        self.aggregators = {
+            name: RangeAggregator() if summary_type == 'range' else DistinctAggregator()
+            for name, summary_type in self.summary_properties.items()
+        }
+        self.bbox = None
+        self.start_datetime: Optional[datetime] = None
+        self.end_datetime: Optional[datetime] = None
+        self.n_items = 0
+
+    def update_bbox(self, bbox: list) -> None:
+        west, south, east, north = bbox[:4] if len(bbox) == 4 else [bbox[0], bbox[1], bbox[3], bbox[4]]
+        if west > east:  # crossing the antimeridian
+            west, east = -180.0, 180.0
+        if self.bbox is None:
+            self.bbox = [west, south, east, north]
+        else:
+            self.bbox = [min(self.bbox[0], west), min(self.bbox[1], south), max(self.bbox[2], east), max(self.bbox[3], north)]
+
+    def update_interval(self, start: Optional[datetime], end: Optional[datetime]) -> None:
+        if start is not None and (self.start_datetime is None or start < self.start_datetime):
+            self.start_datetime = start
+        if end is not None and (self.end_datetime is None or end > self.end_datetime):
+            self.end_datetime = end
+
+    def update(self, stac_item: pystac.Item) -> None:
+        """Updates extents and summaries with a STAC item."""
+        self.n_items += 1
+        if stac_item.bbox:
+            self.update_bbox(stac_item.bbox)
+
+        properties = stac_item.properties
+        start = properties.get('start_datetime')
+        end = properties.get('end_datetime')
+        start = str_to_datetime(start) if start else stac_item.datetime
+        end = str_to_datetime(end) if end else stac_item.datetime
+        self.update_interval(start, end)
+
+        for name, aggregator in self.aggregators.items():
+            if name in properties:
+                aggregator.update(properties[name])
+
+    def seed(self, stac_collection: pystac.Collection, n_items: int = 0) -> None:
+        """Starts from the extent and summaries of an existing collection of `n_items` items, so that it can be
+        updated with additional items without walking the existing ones.
+        """
+        self.n_items += n_items
+        if not n_items:
+            return
+        extent = stac_collection.extent
+        if extent.spatial.bboxes:
+            self.update_bbox(extent.spatial.bboxes[0])
+        if extent.temporal.intervals:
+            self.update_interval(*extent.temporal.intervals[0])
+        summaries = stac_collection.summaries.to_dict() if stac_collection.summaries else {}
+        for name, aggregator in self.aggregators.items():
+            summary = summaries.get(name)
+            if isinstance(summary, dict):  # range
+                if isinstance(aggregator, DistinctAggregator):
+                    aggregator.overflow = True
+                    aggregator = aggregator.range
+                aggregator.update(summary.get('minimum'))
+                aggregator.update(summary.get('maximum'))
+            elif isinstance(summary, list):
+                for value in summary:
+                    aggregator.update(value)
+
+    def get_extent(self) -> pystac.Extent:
+        bbox = self.bbox or [-180.0, -90.0, 180.0, 90.0]
+        return pystac.Extent(
+            pystac.SpatialExtent(bboxes=[bbox]),
+            pystac.TemporalExtent(intervals=[[self.start_datetime, self.end_datetime]])
+        )
+
+    def get_summaries(self) -> Dict[str, Any]:
+        summaries = {}
+        for name, aggregator in self.aggregators.items():
+            result = aggregator.result()
+            if result is not None:
+                summaries[name] = result
+        return summaries
+
+    def apply(self, stac_collection: pystac.Collection, summaries: Dict[str, Any] = None) -> None:
+        """Sets the extent and summaries of a STAC collection. Input `summaries` (eg: from the collection definition)
+        are kept, unless computed from items.
+        """
+        extent = stac_collection.extent
+        if self.n_items or not (extent.spatial.bboxes and extent.spatial.bboxes[0]) or \
+                not (extent.temporal.intervals and extent.temporal.intervals[0]):  # eg: placeholder extent of an empty collection
+            stac_collection.extent = self.get_extent()
+        summaries_dict = {}
+        for name, value in (summaries or {}).items():
+            summaries_dict[name] = value.dict(exclude_none=True) if hasattr(value, 'dict') else value
+        summaries_dict.update(self.get_summaries())
+        stac_collection.summaries = pystac.Summaries(summaries_dict)
@@ -18,6 +18,7 @@ from datetime import datetime
 
 from labtools.schemas import factory as metadata_factory
 from labtools.definitions import ItemDefinition, CollectionDefinition, CatalogDefinition, get_stac_extension_prefix, get_stac_extension_url
+from labtools.metrics import metrics
 
 STAC_SCHEMA_NAME = 'PDSSP_STAC'
 
@@ -59,7 +60,7 @@ class AbstractTransformer(ABC):
             item_links = definition.links
         return item_links
 
-    def get_item_assets(self, metadata: BaseModel, definition: ItemDefinition = None) -> Dict[str, Asset]:
+    def get_item_assets(self, metadata: BaseModel, definition: ItemDefinition = None, data_path: str = None) -> Dict[str, Asset]:
         item_assets = []
         if definition:
             item_assets = definition.assets
@@ -114,7 +115,7 @@ class AbstractTransformer(ABC):
             extent = definition.extent
         return extent
 
-    def get_bbox(self, metadata: BaseModel, definition: ItemDefinition = None) -> list[list[float]]:
+    def get_bbox(self, metadata: BaseModel, definition: ItemDefinition = None, data_path: str = None) -> list[list[float]]:
         bbox = [[]]
         if definition:
             bbox = definition.bbox
@@ -166,6 +167,12 @@ class AbstractTransformer(ABC):
     def get_processing_fields(self, metadata: BaseModel, definition: Union[ItemDefinition, CollectionDefinition] = None) -> dict:
         raise NotImplementedError
 
+    def get_raster_properties(self, metadata: BaseModel, definition: ItemDefinition = None) -> Optional[BaseModel]:
+        return None  # raster extension fields are set at asset level
+
+    def get_raster_fields(self, metadata: BaseModel, definition: Union[ItemDefinition, CollectionDefinition] = None) -> dict:
+        return {}
+
     def get_extension_properties(self, stac_extension_prefix, metadata: BaseModel, definition: ItemDefinition = None) -> BaseModel:  # ExtensionItemProperties
         if stac_extension_prefix == 'ssys':
             return self.get_ssys_properties(metadata, definition=definition)
@@ -173,6 +180,8 @@ class AbstractTransformer(ABC):
             return self.get_sci_properties(metadata, definition=definition)
         elif stac_extension_prefix == 'processing':
             return self.get_processing_properties(metadata, definition=definition)
+        elif stac_extension_prefix == 'raster':
+            return self.get_raster_properties(metadata, definition=definition)
         else:
             raise Exception(f'Undefined {stac_extension_prefix} STAC extension.')
 
@@ -183,6 +192,8 @@ class AbstractTransformer(ABC):
             return self.get_sci_fields(metadata, definition=definition)
         elif stac_extension_prefix == 'processing':
             return self.get_processing_fields(metadata, definition=definition)
+        elif stac_extension_prefix == 'raster':
+            return self.get_raster_fields(metadata, definition=definition)
         else:
             raise Exception(f'Undefined {stac_extension_prefix} STAC extension.')
 
@@ -252,37 +263,51 @@ class AbstractTransformer(ABC):
         for stac_extension in stac_extensions:
             stac_extensions_prefixes.append(get_stac_extension_prefix(stac_extension))
 
+        # transformer hooks, timed individually
+        with metrics.timer('transform.geometry'):
+            geometry = self.get_geometry(metadata, definition=definition, data_path=data_path)
+        with metrics.timer('transform.bbox'):
+            bbox = self.get_bbox(metadata, definition=definition, data_path=data_path)
+        with metrics.timer('transform.properties'):
+            properties = self.get_properties(metadata, definition=definition, data_path=data_path)
+        with metrics.timer('transform.links'):
+            links = self.get_item_links(metadata, definition=definition)
+        with metrics.timer('transform.assets'):
+            assets = self.get_item_assets(metadata, definition=definition, data_path=data_path)
+
         stac_item_dict = {
             'type': 'Feature',  # REQUIRED
             'stac_version': self.get_stac_version(),  # REQUIRED
             'stac_extensions': stac_extensions,
             'id': self.get_item_id(metadata, definition=definition),  # REQUIRED
-            'geometry': self.get_geometry(metadata, definition=definition, data_path=data_path),  # REQUIRED
-            'bbox': self.get_bbox(metadata, definition=definition),  # REQUIRED
-            'properties': self.get_properties(metadata, definition=definition, data_path=data_path),  # REQUIRED
-            'links': self.get_item_links(metadata, definition=definition),  # REQUIRED
-            'assets': self.get_item_assets(metadata, definition=definition),  # REQUIRED
+            'geometry': geometry,  # REQUIRED
+            'bbox': bbox,  # REQUIRED
+            'properties': properties,  # REQUIRED
+            'links': links,  # REQUIRED
+            'assets': assets,  # REQUIRED
             'collection': collection_id,
             'extra_fields': {}
         }
 
         # print('>', stac_item_dict['properties'].datetime)
 
-        # add STAC extensions extra fields
-        for stac_extension_prefix in stac_extensions_prefixes:
-            stac_item_dict['extra_fields'].update(
-                self.get_extension_fields(stac_extension_prefix, metadata, definition=definition))
+        with metrics.timer('transform.extensions'):
+            # add STAC extensions extra fields
+            for stac_extension_prefix in stac_extensions_prefixes:
+                stac_item_dict['extra_fields'].update(
+                    self.get_extension_fields(stac_extension_prefix, metadata, definition=definition))
 
-        # add STAC extensions properties
-        properties_dict = stac_item_dict['properties'].dict(exclude_unset=True, exclude_none=True, by_alias=True).copy()
-        for stac_extension_prefix in stac_extensions_prefixes:
-            ext_properties = self.get_extension_properties(stac_extension_prefix, metadata, definition=definition)
-            if ext_properties:
-                properties_dict.update(ext_properties.dict(exclude_unset=True, exclude_none=True, by_alias=True))
-        stac_item_dict['properties'] = properties_dict
+            # add STAC extensions properties
+            properties_dict = stac_item_dict['properties'].dict(exclude_unset=True, exclude_none=True, by_alias=True).copy()
+            for stac_extension_prefix in stac_extensions_prefixes:
+                ext_properties = self.get_extension_properties(stac_extension_prefix, metadata, definition=definition)
+                if ext_properties:
+                    properties_dict.update(ext_properties.dict(exclude_unset=True, exclude_none=True, by_alias=True))
+            stac_item_dict['properties'] = properties_dict
 
         # attempt to create destination STAC Item metadata object (PDSSP_STAC schema)
-        stac_item_metadata = metadata_factory.create_metadata_object(stac_item_dict, STAC_SCHEMA_NAME, 'item')
+        with metrics.timer('transform.validation'):
+            stac_item_metadata = metadata_factory.create_metadata_object(stac_item_dict, STAC_SCHEMA_NAME, 'item')
 
         geometry = None  # PATCH ?
         if stac_item_metadata.geometry:
@@ -321,6 +346,8 @@ class AbstractTransformer(ABC):
         # add assets to pySTAC item
         for key in stac_item_metadata.assets:
             asset_metadata = stac_item_metadata.assets[key]
+            asset_extra_fields = asset_metadata.dict(
+                exclude={'href', 'title', 'description', 'type', 'roles'}, exclude_unset=True, exclude_none=True, by_alias=True)
             stac_item.add_asset(
                 key=key,
                 asset=pystac.Asset(
@@ -328,7 +355,8 @@ class AbstractTransformer(ABC):
                     title=asset_metadata.title,
                     description=asset_metadata.description,
                     media_type=asset_metadata.type,
-                    roles=asset_metadata.roles
+                    roles=asset_metadata.roles,
+                    extra_fields=asset_extra_fields  # eg: {'raster:bands': [...]}
                 )
             )
 
@@ -11,8 +11,14 @@ setup(
         'pystac',
         'stac-pydantic',
         'astropy',
+        'scipy',
         'pyMarsSeason @ git+https://github.com/pole-surfaces-planetaires/pymarsseason.git'
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'fast': ['orjson'],
+        'zstd': ['zstandard']
+    },
     entry_points='''
         [console_scripts]
         labtools=labtools.cli:cli
@@ -0,0 +1,38 @@
+"""Shared fixtures: IAS catalog definitions, and synthetic VECTOR_FEATURES source collections."""
+from pathlib import Path
+import json
+
+import pytest
+
+from labtools import loader
+from labtools.definitions import Definitions
+
+DEFINITIONS_FILE = Path(__file__).parents[1] / 'data' / 'definitions' / 'ias' / 'catalog.yaml'
+SCHEMAS = ['labtools.schemas.pdssp_stac', 'labtools.ias.schemas.vector_features']
+
+
+@pytest.fixture(scope='session')
+def definitions():
+    loader.load_schemas(SCHEMAS)
+    return Definitions(yaml_file=str(DEFINITIONS_FILE))
+
+
+def write_source_collection(source_dir, footprints) -> Path:
+    """Writes a `features_datasets` PSUP source collection file, with one product per PSUP footprint string."""
+    source_collection_file = Path(source_dir) / 'features_datasets.json'
+    source_collection_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(source_collection_file, 'w') as f:
+        json.dump({
+            'collection': {'id': 'features_datasets', 'schema_name': 'VECTOR_FEATURES', 'n_products': len(footprints)},
+            'products': [{
+                'download': f'http://psup.example.org/hyd_{i}.json', 'linktopubli': 'http://doi.example.org',
+                'vector_description': '"Hydrated sites"', 'vector_name': f'hyd_{i}.json',
+                'vector_footprint': footprint, 'vector_keywords': ''
+            } for i, footprint in enumerate(footprints)]
+        }, f)
+    return source_collection_file
+
+
+@pytest.fixture(name='write_source_collection')
+def write_source_collection_fixture():
+    return write_source_collection
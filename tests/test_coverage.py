@@ -0,0 +1,70 @@
+"""Rasterization of items footprints into collection coverage count maps."""
+from datetime import datetime
+
+import numpy as np
+import pystac
+
+from labtools.coverage import CoverageAccumulator
+
+
+def box_polygon(west, south, east, north):
+    return [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+
+
+def create_item(i, geometry):
+    return pystac.Item(f'item_{i}', geometry, None, datetime(2005, 1, 1), {})
+
+
+def get_coverage(geometries) -> CoverageAccumulator:
+    coverage = CoverageAccumulator(pixels_per_degree=1)
+    for i, geometry in enumerate(geometries):
+        coverage.update(create_item(i, geometry))
+    return coverage
+
+
+def test_box():
+    coverage = get_coverage([{'type': 'Polygon', 'coordinates': box_polygon(10, 0, 20, 10)}])
+    expected = np.zeros((180, 360), dtype=np.uint32)
+    expected[80:90, 190:200] = 1  # rows from north, columns from -180°
+    assert np.array_equal(coverage.counts, expected)
+    assert coverage.n_items == 1
+
+
+def test_box_crossing_antimeridian():
+    coverage = get_coverage([{'type': 'Polygon', 'coordinates': box_polygon(170, -5, -170, 5)}])
+    expected = np.zeros((180, 360), dtype=np.uint32)
+    expected[85:95, 350:] = 1
+    expected[85:95, :10] = 1
+    assert np.array_equal(coverage.counts, expected)
+
+
+def test_global_footprint():
+    geometry = {'type': 'Polygon', 'coordinates': [[[-180, -90], [-180, 90], [180, 90], [180, -90], [-180, -90]]]}
+    coverage = get_coverage([geometry, geometry])
+    assert np.all(coverage.counts == 2)
+
+
+def test_overlapping_polygons():
+    multi_polygon = {'type': 'MultiPolygon', 'coordinates': [box_polygon(0, 0, 10, 10), box_polygon(5, 0, 15, 10)]}
+    polygon = {'type': 'Polygon', 'coordinates': box_polygon(12, 5, 22, 15)}
+    coverage = get_coverage([multi_polygon, polygon])
+
+    expected = np.zeros((180, 360), dtype=np.uint32)
+    expected[80:90, 180:195] = 1  # overlapping parts of a same footprint counted once
+    expected[75:85, 192:202] += 1  # overlapping footprints of different items
+    assert np.array_equal(coverage.counts, expected)
+    assert coverage.counts.max() == 2
+
+
+def test_small_footprints(tmp_path):
+    point = {'type': 'Point', 'coordinates': [0.5, 0.5]}
+    tiny_polygon = {'type': 'Polygon', 'coordinates': box_polygon(-10.4, 20.2, -10.3, 20.3)}
+    coverage = get_coverage([point, tiny_polygon])
+    assert coverage.counts.sum() == 2
+    assert coverage.counts[89, 180] == 1
+    assert coverage.counts[69, 169] == 1
+
+    coverage.save(tmp_path / 'coverage.npz')
+    loaded_coverage = CoverageAccumulator.load(tmp_path / 'coverage.npz')
+    assert np.array_equal(loaded_coverage.counts, coverage.counts)
+    assert loaded_coverage.n_items == 2
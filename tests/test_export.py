@@ -0,0 +1,45 @@
+"""GeoParquet export of STAC items, with columns types unified across row groups."""
+from datetime import datetime
+
+import pystac
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from labtools.export import ParquetItemsWriter, read_parquet_items
+
+
+def create_item(i, properties):
+    geometry = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+    return pystac.Item(f'item_{i:04d}', geometry, [0, 0, 1, 1], datetime(2005, 1, 1), properties)
+
+
+def test_columns_null_in_first_row_group(tmp_path):
+    parquet_file = tmp_path / 'parquet' / 'test_collection.parquet'
+    with ParquetItemsWriter(parquet_file, row_group_size=10) as writer:
+        for i in range(30):
+            properties = {'orbit_number': i, 'mean_tau': None if i < 10 else i / 10, 'start_datetime': '2005-01-01T00:00:00Z'}
+            if i >= 20:  # first appearing in the last row group
+                properties['martian_year'] = 27
+                properties['orbit_number'] = i + 0.5
+            writer.write_item(create_item(i, properties))
+    assert list(parquet_file.parent.iterdir()) == [parquet_file]  # spooled row groups removed
+
+    table = read_parquet_items(parquet_file)
+    assert table.num_rows == writer.n_items == 30
+    assert pa.types.is_floating(table.schema.field('mean_tau').type)
+    assert table.column('mean_tau').to_pylist() == [None] * 10 + [i / 10 for i in range(10, 30)]
+    assert table.column('orbit_number').to_pylist() == list(range(20)) + [i + 0.5 for i in range(20, 30)]
+    assert table.column('martian_year').to_pylist() == [None] * 20 + [27] * 10
+    assert pa.types.is_timestamp(table.schema.field('start_datetime').type)
+    assert b'geo' in pq.read_metadata(parquet_file).metadata
+
+
+def test_conflicting_column_types(tmp_path):
+    parquet_file = tmp_path / 'test_collection.parquet'
+    with ParquetItemsWriter(parquet_file, row_group_size=2) as writer:
+        for i, value in enumerate([None, None, 1.5, 2.5, 'high', 'low', ['a', 'b'], None]):
+            writer.write_item(create_item(i, {'data_quality_id': value}))
+    assert read_parquet_items(parquet_file).column('data_quality_id').to_pylist() == \
+        [None, None, '1.5', '2.5', 'high', 'low', '["a", "b"]', None]
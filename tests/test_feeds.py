@@ -0,0 +1,71 @@
+"""NDJSON feeds writing and bulk loading to a local stub STAC transactions server."""
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+import pystac
+import pytest
+
+from labtools.feeds import NDJSONFeedWriter, find_feed_files, iter_feed_items, load_feeds
+
+
+class StubTransactionsHandler(BaseHTTPRequestHandler):
+    """Accepts POSTed feature collections, failing the first request to exercise retries."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.n_requests += 1
+            fail = server.n_requests == 1
+            if not fail:
+                collection_id = self.path.split('/')[2]
+                server.items.setdefault(collection_id, []).extend(feature['id'] for feature in body['features'])
+        self.send_response(503 if fail else 201)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubTransactionsHandler)
+    server.lock = threading.Lock()
+    server.n_requests = 0
+    server.items = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def create_item(i):
+    geometry = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+    return pystac.Item(f'item_{i:04d}', geometry, [0, 0, 1, 1], datetime(2005, 1, 1), {'orbit_number': i})
+
+
+def test_feed_chunks(tmp_path):
+    with NDJSONFeedWriter(tmp_path / 'test_collection', 'test_collection', max_chunk_size=4096) as writer:
+        for i in range(100):
+            writer.write_item(create_item(i))
+    feed_files = find_feed_files(tmp_path, 'test_collection')
+    assert len(feed_files) > 1
+    assert feed_files == writer.chunk_files
+    items = list(iter_feed_items(feed_files))
+    assert [item['id'] for item in items] == [f'item_{i:04d}' for i in range(100)]
+    assert all(link['rel'] != 'self' for item in items for link in item['links'])
+
+
+def test_load_feeds(tmp_path, stub_server):
+    with NDJSONFeedWriter(tmp_path / 'test_collection', 'test_collection', max_chunk_size=4096) as writer:
+        for i in range(250):
+            writer.write_item(create_item(i))
+    endpoint_url = f'http://127.0.0.1:{stub_server.server_address[1]}'
+    results = load_feeds(tmp_path, endpoint_url, batch_size=20, n_workers=4)
+    assert len(results) == 1
+    assert results[0]['n_items'] == 250
+    assert results[0]['n_batches'] == 13
+    assert results[0]['n_loaded'] == 250
+    assert sorted(stub_server.items['test_collection']) == [f'item_{i:04d}' for i in range(250)]
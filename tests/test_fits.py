@@ -0,0 +1,57 @@
+"""Statistics of FITS image data, accumulated over row slabs of memory-mapped data."""
+import numpy as np
+import pytest
+
+fits = pytest.importorskip('astropy.io.fits')
+
+from labtools.ias import fits as fits_metadata
+
+
+def test_cube_statistics(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    data = rng.normal(10, 3, size=(3, 50, 40)).astype(np.float32)
+    data[0, :5] = np.nan
+    data[2, 10:20, 10:20] = -9999
+    fits_file = tmp_path / 'cube.fits'
+    fits.PrimaryHDU(data).writeto(fits_file)
+
+    # record the number of bytes of each slab read
+    slab_sizes = []
+    asarray = np.asarray
+
+    def recording_asarray(array, *args, **kwargs):
+        array = asarray(array, *args, **kwargs)
+        slab_sizes.append(array.nbytes)
+        return array
+
+    monkeypatch.setattr(fits_metadata.np, 'asarray', recording_asarray)
+    row_nbytes = 40 * 4
+    statistics = fits_metadata.get_fits_statistics(fits_file, nodata=-9999, chunk_size=7 * row_nbytes)
+    monkeypatch.undo()
+
+    assert max(slab_sizes) <= 7 * row_nbytes  # never a whole band
+    assert sum(slab_sizes) == data.nbytes
+    values = data[np.isfinite(data) & (data != -9999)].astype(np.float64)
+    assert statistics['valid_percent'] == pytest.approx(100.0 * values.size / data.size)
+    assert statistics['minimum'] == pytest.approx(values.min())
+    assert statistics['maximum'] == pytest.approx(values.max())
+    assert statistics['mean'] == pytest.approx(values.mean())
+    assert statistics['stddev'] == pytest.approx(values.std())
+
+
+def test_scaled_integer_statistics(tmp_path):
+    data = np.arange(30 * 20, dtype=np.int16).reshape(30, 20)
+    data[0, 0] = -1
+    hdu = fits.PrimaryHDU(data)
+    hdu.header['BLANK'] = -1
+    hdu.header['BSCALE'] = 0.5
+    hdu.header['BZERO'] = 100.0
+    fits_file = tmp_path / 'map.fits'
+    hdu.writeto(fits_file)
+
+    statistics = fits_metadata.get_fits_statistics(fits_file, chunk_size=1)  # one row per slab
+    values = data.ravel()[1:] * 0.5 + 100.0
+    assert statistics['minimum'] == values.min()
+    assert statistics['maximum'] == values.max()
+    assert statistics['mean'] == pytest.approx(values.mean())
+    assert statistics['valid_percent'] == pytest.approx(100.0 * (data.size - 1) / data.size)
@@ -0,0 +1,97 @@
+"""Footprint extraction from synthetic valid-data masks."""
+import numpy as np
+
+from labtools.footprint import get_mask_footprint, label_regions, simplify_ring, trace_boundaries
+
+
+def get_grid(shape):
+    """Returns pixel centers latitudes and longitudes such that pixel corners lie on integer coordinates."""
+    return np.arange(shape[0]) + 0.5, np.arange(shape[1]) + 0.5
+
+
+def signed_area(ring) -> float:
+    ring = np.asarray(ring, dtype=float)
+    return float(np.sum(ring[:-1, 0] * ring[1:, 1] - ring[1:, 0] * ring[:-1, 1]) / 2)
+
+
+def get_vertices(ring) -> set:
+    return {tuple(position) for position in ring}
+
+
+def test_empty_mask():
+    mask = np.zeros((10, 12), dtype=bool)
+    assert label_regions(mask)[1] == []
+    assert get_mask_footprint(mask, *get_grid(mask.shape)) is None
+
+
+def test_single_pixel():
+    mask = np.zeros((10, 12), dtype=bool)
+    mask[3, 7] = True
+    assert get_mask_footprint(mask, *get_grid(mask.shape)) is None  # smaller than the minimum region size
+
+    geometry = get_mask_footprint(mask, *get_grid(mask.shape), min_region_size=1)
+    assert geometry['type'] == 'Polygon'
+    ring = geometry['coordinates'][0]
+    assert len(ring) == 5 and ring[0] == ring[-1]
+    assert get_vertices(ring) == {(7.0, 3.0), (8.0, 3.0), (8.0, 4.0), (7.0, 4.0)}
+    assert signed_area(ring) == 1.0  # counterclockwise
+
+
+def test_region_with_hole():
+    mask = np.zeros((12, 12), dtype=bool)
+    mask[2:10, 3:11] = True
+    mask[4:7, 5:8] = False
+    rings = trace_boundaries(mask[2:10, 3:11])
+    assert len(rings) == 1  # hole filled
+
+    geometry = get_mask_footprint(mask, *get_grid(mask.shape))
+    assert geometry['type'] == 'Polygon'
+    assert len(geometry['coordinates']) == 1
+    ring = geometry['coordinates'][0]
+    assert get_vertices(ring) == {(3.0, 2.0), (11.0, 2.0), (11.0, 10.0), (3.0, 10.0)}
+    assert signed_area(ring) == 64.0
+
+
+def test_disjoint_regions():
+    mask = np.zeros((20, 30), dtype=bool)
+    mask[1:5, 1:6] = True
+    mask[10:18, 20:28] = True
+    mask[12, 2] = True  # dropped, smaller than the minimum region size
+    labels, regions = label_regions(mask)
+    assert len(regions) == 2
+
+    geometry = get_mask_footprint(mask, *get_grid(mask.shape))
+    assert geometry['type'] == 'MultiPolygon'
+    assert len(geometry['coordinates']) == 2
+    assert sorted(signed_area(polygon[0]) for polygon in geometry['coordinates']) == [20.0, 64.0]
+
+
+def test_diagonal_pixels_rings():
+    mask = np.array([
+        [1, 1, 0, 0],
+        [1, 1, 0, 0],
+        [0, 0, 1, 1],
+        [0, 0, 1, 1]
+    ], dtype=bool)
+    geometry = get_mask_footprint(mask, *get_grid(mask.shape))  # 4-connected: two regions
+    assert geometry['type'] == 'MultiPolygon'
+    assert [signed_area(polygon[0]) for polygon in geometry['coordinates']] == [4.0, 4.0]
+
+    rings = trace_boundaries(mask)  # traced as a single region, split into simple rings at the touching corner
+    assert len(rings) == 2
+    assert all(len(get_vertices(ring)) == len(ring) - 1 for ring in rings)
+
+
+def test_simplify_ring():
+    # staircase diagonal edge, within one pixel of a straight line
+    n = 20
+    ring = [(0, 0)]
+    for i in range(n):
+        ring += [(i, i + 1), (i + 1, i + 1)]
+    ring += [(n, 0), (0, 0)]
+    ring = np.array(ring, dtype=float)
+    simplified = simplify_ring(ring, tolerance=1.0)
+    assert len(simplified) < 10
+    assert tuple(simplified[0]) == tuple(simplified[-1]) == (0, 0)
+    assert abs(signed_area(simplified) - signed_area(ring)) < n
+    assert len(simplify_ring(ring, tolerance=0)) == len(ring)
@@ -0,0 +1,128 @@
+"""Spatial R-tree and sorted properties indexes, checked against brute force searches."""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from labtools.index import PropertiesIndex, SpatialIndex, to_timestamp
+
+
+def get_lon_intervals(west, east):
+    return [(west, 180.0), (-180.0, east)] if west > east else [(west, east)]
+
+
+def boxes_intersect(bbox, box):
+    """Returns True if two [west, south, east, north] boxes intersect, either possibly crossing the antimeridian."""
+    if bbox[1] > box[3] or bbox[3] < box[1]:
+        return False
+    return any(a0 <= b1 and a1 >= b0 for a0, a1 in get_lon_intervals(bbox[0], bbox[2]) for b0, b1 in get_lon_intervals(box[0], box[2]))
+
+
+def triangle_intersects_box(bbox, box):
+    """Returns True if the lower-left half triangle of a bbox not crossing the antimeridian intersects a box."""
+    west, south, east, north = bbox
+    for b0, b1 in get_lon_intervals(box[0], box[2]):
+        if b0 > east or b1 < west or box[1] > north or box[3] < south:
+            continue
+        x, y = max(b0, west), max(box[1], south)  # nearest point of the box to the triangle right angle
+        if (x - west) / (east - west) + (y - south) / (north - south) <= 1:
+            return True
+    return False
+
+
+@pytest.fixture(scope='module')
+def random_items():
+    rng = np.random.default_rng(0)
+    items = []
+    for i in range(3000):
+        west, south = rng.uniform(-180, 170), rng.uniform(-90, 80)
+        east, north = west + rng.uniform(0.1, 10), south + rng.uniform(0.1, 10)
+        if i % 10 == 0:  # crossing the antimeridian, without footprint
+            west, east = rng.uniform(170, 180), rng.uniform(-180, -170)
+            items.append((f'item_{i}', f'item_{i}.json', [west, south, east, north], None))
+        else:
+            ring = [[west, south], [east, south], [west, north], [west, south]]
+            items.append((f'item_{i}', f'item_{i}.json', [west, south, east, north], {'type': 'Polygon', 'coordinates': [ring]}))
+    return items
+
+
+def get_queries():
+    rng = np.random.default_rng(1)
+    queries = [[-180, -90, 180, 90], [175, -10, -175, 10], [0, 0, 0, 0]]
+    for _ in range(100):
+        west, south = rng.uniform(-180, 180), rng.uniform(-90, 70)
+        east, north = west + rng.uniform(0, 40), south + rng.uniform(0, 20)
+        queries.append([west, south, east if east <= 180 else east - 360, north])  # crossing the antimeridian beyond 180
+    return queries
+
+
+@pytest.mark.parametrize('node_size', [4, 16])
+def test_spatial_index(random_items, tmp_path, node_size):
+    index = SpatialIndex.from_items(random_items, node_size=node_size)
+    index.save(tmp_path / 'spatial_index.npz')
+    index = SpatialIndex.load(tmp_path / 'spatial_index.npz')
+    assert len(index) == len(random_items)
+    assert len(index.node_bboxes) > 1
+
+    for box in get_queries():
+        found = {item_id for item_id, href in index.get_items(index.search(box, footprint=False))}
+        assert found == {item[0] for item in random_items if boxes_intersect(item[2], box)}
+
+        found = {item_id for item_id, href in index.get_items(index.search(box))}
+        assert found == {
+            item[0] for item in random_items
+            if boxes_intersect(item[2], box) and (item[3] is None or triangle_intersects_box(item[2], box))
+        }
+
+
+def test_properties_index(tmp_path):
+    rng = np.random.default_rng(2)
+    origin = datetime(2004, 1, 1, tzinfo=timezone.utc)
+    items_properties = []
+    for i in range(2000):
+        start = origin + timedelta(hours=float(rng.uniform(0, 24 * 365 * 4)))
+        properties = {
+            'start_datetime': start.isoformat(),
+            'end_datetime': (start + timedelta(hours=float(rng.uniform(0, 48)))).isoformat(),
+            'solar_longitude': float(rng.uniform(0, 360)),
+            'martian_year': int(rng.integers(26, 30))
+        }
+        if i % 7 == 0:  # single datetime
+            properties = {'datetime': properties['start_datetime'], 'martian_year': properties['martian_year']}
+        items_properties.append(properties)
+
+    index = PropertiesIndex.from_properties(items_properties)
+    index.save(tmp_path / 'properties_index.npz')
+    index = PropertiesIndex.load(tmp_path / 'properties_index.npz')
+
+    def get_interval(properties):
+        return [to_timestamp(properties.get(name) or properties['datetime']) for name in ['start_datetime', 'end_datetime']]
+
+    def brute_force(datetime=None, solar_longitude=None, martian_year=None):
+        positions = []
+        for position, properties in enumerate(items_properties):
+            if datetime is not None:
+                start, end = get_interval(properties)
+                if end < to_timestamp(datetime[0]) or start > to_timestamp(datetime[1]):
+                    continue
+            if solar_longitude is not None:
+                ls = properties.get('solar_longitude')
+                minimum, maximum = solar_longitude
+                if ls is None or not (minimum <= ls <= maximum if minimum <= maximum else ls >= minimum or ls <= maximum):
+                    continue
+            if martian_year is not None and not martian_year[0] <= properties['martian_year'] <= martian_year[1]:
+                continue
+            positions.append(position)
+        return positions
+
+    searches = [
+        {'datetime': ('2005-01-01T00:00:00Z', '2005-06-30T23:59:59Z')},
+        {'solar_longitude': (180, 270)},
+        {'solar_longitude': (300, 30)},
+        {'martian_year': (27, 27)},
+        {'datetime': ('2006-03-01T00:00:00Z', '2007-03-01T00:00:00Z'), 'solar_longitude': (350, 10), 'martian_year': (27, 28)}
+    ]
+    for search in searches:
+        assert index.search(**search).tolist() == brute_force(**search)
+    assert index.search(datetime='2005-01-01T00:00:00Z/..').tolist() == brute_force(datetime=('2005-01-01T00:00:00Z', '2100-01-01T00:00:00Z'))
+    assert index.search(martian_year='28').tolist() == brute_force(martian_year=(28, 28))
@@ -0,0 +1,53 @@
+"""Memory-bounded builds: streamed source collection files, and flat memory usage of batched transformations."""
+import json
+import shutil
+import tracemalloc
+
+from labtools.builder import CollectionBuilder, create_root_catalog, transform_products_in_batches, layout
+from labtools.ias import psup
+from labtools.memory import MemoryBudget, parse_memory_size
+from labtools.serialization import CatalogWriter
+
+FOOTPRINT = '(' + ','.join(f'({-180 + i * 3.6:.1f},{(-1) ** i * 45.0})' for i in range(50)) + ')'  # 50 points footprint
+
+
+def test_iter_source_collection(tmp_path, write_source_collection):
+    source_collection_file = write_source_collection(tmp_path, [FOOTPRINT] * 50)
+    with open(source_collection_file) as f:
+        json_dict = json.load(f)
+    entries = list(psup.iter_source_collection(source_collection_file, chunk_size=7))
+    assert entries[0] == ('collection', json_dict['collection'])
+    assert [value for key, value in entries[1:]] == json_dict['products']
+    assert psup.read_collection_metadata(source_collection_file).n_products == 50
+
+
+def get_batched_build_peak(definitions, write_source_collection, tmp_path, n_products):
+    """Returns the peak traced memory of the batched transformation and writing of a collection, and its items count."""
+    source_collection_file = write_source_collection(tmp_path / f'source_{n_products}', [FOOTPRINT] * n_products)
+    stac_dir = tmp_path / f'stac_{n_products}'
+    if stac_dir.exists():
+        shutil.rmtree(stac_dir)
+    root_stac_catalog = create_root_catalog(definitions)
+    root_stac_catalog.normalize_hrefs(str(stac_dir), strategy=layout)
+    tracemalloc.start()
+    try:
+        collection_builder = CollectionBuilder(definitions, source_collection_file, root_stac_catalog, stac_dir)
+        memory_budget = MemoryBudget(parse_memory_size('64G'), max_batch_size=32)
+        transform_products_in_batches(collection_builder, memory_budget, CatalogWriter())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert memory_budget.n_batches == -(-n_products // 32)
+    return peak, len(collection_builder.stac_collection.get_links('item'))
+
+
+def test_batched_build_memory_is_flat(definitions, write_source_collection, tmp_path):
+    for n_products in [150, 300]:  # warm up caches
+        get_batched_build_peak(definitions, write_source_collection, tmp_path, n_products)
+    peak, n_items = get_batched_build_peak(definitions, write_source_collection, tmp_path, 150)
+    doubled_peak, doubled_n_items = get_batched_build_peak(definitions, write_source_collection, tmp_path, 300)
+    assert (n_items, doubled_n_items) == (150, 300)
+    assert len(list((tmp_path / 'stac_300').glob('**/hyd_*.json'))) == 300
+
+    # only items links are kept in memory (a few hundred bytes per item), not items nor source products
+    assert (doubled_peak - peak) / 150 < 2048
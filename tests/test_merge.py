@@ -0,0 +1,74 @@
+"""Merging of STAC catalogs built by partitioned builds into staging directories."""
+from pathlib import Path
+import json
+
+import numpy as np
+import pytest
+
+from labtools.builder import build_catalog
+from labtools.merge import merge_catalogs
+
+N_PRODUCTS = 12
+
+
+@pytest.fixture
+def source_collection_file(tmp_path, write_source_collection):
+    footprints = []
+    for i in range(N_PRODUCTS):
+        west, south = -170 + i * 25, -60 + i * 9
+        footprints.append(f'(({west},{south}),({west},{south + 10}),({west + 20},{south + 10}),({west + 20},{south}))')
+    return write_source_collection(tmp_path / 'source', footprints)
+
+
+def read_tree(stac_dir) -> dict:
+    """Returns the JSON files of a STAC catalog, by relative path, with links sorted."""
+    tree = {}
+    for json_file in sorted(Path(stac_dir).glob('**/*.json')):
+        json_dict = json.loads(json_file.read_text())
+        json_dict['links'] = sorted(json_dict.get('links', []), key=lambda link: (link['rel'], link['href']))
+        tree[str(json_file.relative_to(stac_dir))] = json_dict
+    return tree
+
+
+def get_collection_dir(stac_dir) -> Path:
+    return next(Path(stac_dir).glob('**/features_datasets/collection.json')).parent
+
+
+def test_merge_hash_partitions(definitions, source_collection_file, tmp_path):
+    build_catalog(definitions, [source_collection_file], tmp_path / 'serial', n_workers=1, coverage=True)
+    staging_dirs = [tmp_path / 'staging' / str(k) for k in range(3)]
+    for k, staging_dir in enumerate(staging_dirs):
+        build_catalog(definitions, [source_collection_file], staging_dir, n_workers=1, coverage=True, partition=(k, 3),
+                      partition_by='hash')
+    assert all(0 < len(list(get_collection_dir(staging_dir).glob('*/hyd_*.json'))) < N_PRODUCTS for staging_dir in staging_dirs)
+
+    n_items = merge_catalogs(staging_dirs[::-1], tmp_path / 'merged')
+    assert n_items == N_PRODUCTS
+
+    serial_tree, merged_tree = read_tree(tmp_path / 'serial'), read_tree(tmp_path / 'merged')
+    assert merged_tree.keys() == serial_tree.keys()
+    for path, serial_dict in serial_tree.items():
+        assert merged_tree[path] == serial_dict, path
+
+    serial_dir, merged_dir = get_collection_dir(tmp_path / 'serial'), get_collection_dir(tmp_path / 'merged')
+    with np.load(serial_dir / 'coverage.npz') as serial_coverage, np.load(merged_dir / 'coverage.npz') as merged_coverage:
+        assert np.array_equal(merged_coverage['counts'], serial_coverage['counts'])
+    with np.load(serial_dir / 'spatial_index.npz') as serial_index, np.load(merged_dir / 'spatial_index.npz') as merged_index:
+        assert sorted(merged_index['ids']) == sorted(serial_index['ids'])
+
+
+def test_merge_duplicate_items(definitions, source_collection_file, tmp_path, capsys):
+    build_catalog(definitions, [source_collection_file], tmp_path / 'staging' / 'partial', n_workers=1, partition=(0, 2))
+    build_catalog(definitions, [source_collection_file], tmp_path / 'staging' / 'full', n_workers=1)
+    capsys.readouterr()
+
+    n_items = merge_catalogs([tmp_path / 'staging' / 'partial', tmp_path / 'staging' / 'full'], tmp_path / 'merged')
+    assert n_items == N_PRODUCTS
+    assert 'found in several staging catalogs were merged once' in capsys.readouterr().out
+
+    collection_dict = json.loads((get_collection_dir(tmp_path / 'merged') / 'collection.json').read_text())
+    item_hrefs = [link['href'] for link in collection_dict['links'] if link['rel'] == 'item']
+    assert len(item_hrefs) == len(set(item_hrefs)) == N_PRODUCTS
+    full_collection_dict = json.loads((get_collection_dir(tmp_path / 'staging' / 'full') / 'collection.json').read_text())
+    assert collection_dict['extent'] == full_collection_dict['extent']
+    assert read_tree(tmp_path / 'merged').keys() == read_tree(tmp_path / 'staging' / 'full').keys()
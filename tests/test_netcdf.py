@@ -0,0 +1,95 @@
+"""Streaming statistics of NetCDF variables, read by chunk-aligned slabs."""
+import netCDF4
+import numpy as np
+import pytest
+
+from labtools.ias.netcdf import SAMPLE_SIZE, StreamingStatistics, get_variable_statistics, iter_variable_slabs
+
+SHAPE = (10, 7, 5)
+CHUNK_SIZES = (3, 4, 5)  # not dividing the variable shape evenly
+FILL_VALUE = -999.0
+
+
+@pytest.fixture
+def netcdf_file(tmp_path):
+    rng = np.random.default_rng(0)
+    data = rng.normal(10, 3, SHAPE).astype(np.float32)
+    data[rng.random(SHAPE) < 0.1] = np.nan
+    data[rng.random(SHAPE) < 0.1] = FILL_VALUE
+    data[4] = np.nan  # a slab row without any valid value
+    netcdf_file = tmp_path / 'cube.nc'
+    with netCDF4.Dataset(netcdf_file, 'w') as nc_dataset:
+        for name, size in zip(['y', 'x', 'band'], SHAPE):
+            nc_dataset.createDimension(name, size)
+        variable = nc_dataset.createVariable('tau', 'f4', ('y', 'x', 'band'), fill_value=FILL_VALUE, chunksizes=CHUNK_SIZES)
+        variable[:] = data
+    return netcdf_file
+
+
+def get_expected(data):
+    valid = data[(data != FILL_VALUE) & ~np.isnan(data)].astype(np.float64)
+    return {
+        'count': valid.size,
+        'nan_count': int(np.isnan(data).sum()),
+        'valid_fraction': valid.size / data.size,
+        'minimum': valid.min(),
+        'maximum': valid.max(),
+        'mean': valid.mean(),
+        'percentiles': dict(zip([5, 50, 95], np.percentile(valid, [5, 50, 95])))
+    }
+
+
+def read_data(netcdf_file) -> np.ndarray:
+    with netCDF4.Dataset(netcdf_file, 'r') as nc_dataset:
+        variable = nc_dataset['tau']
+        variable.set_auto_mask(False)
+        return variable[:]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 500, 10 ** 6])
+def test_iter_variable_slabs(netcdf_file, chunk_size):
+    with netCDF4.Dataset(netcdf_file, 'r') as nc_dataset:
+        variable = nc_dataset['tau']
+        slabs = list(iter_variable_slabs(variable, chunk_size=chunk_size))
+        assert all(len(slab) % CHUNK_SIZES[0] == 0 for slab in slabs[:-1])  # aligned on variable chunks
+        row_nbytes = SHAPE[1] * SHAPE[2] * 4
+        assert len(slabs[0]) == min(SHAPE[0], max(CHUNK_SIZES[0], chunk_size // row_nbytes // CHUNK_SIZES[0] * CHUNK_SIZES[0]))
+        data = np.ma.concatenate(slabs)
+        assert np.array_equal(np.ma.getmaskarray(data), np.ma.getmaskarray(variable[:]))
+        assert np.array_equal(data.filled(FILL_VALUE), variable[:].filled(FILL_VALUE), equal_nan=True)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 500, 10 ** 6])
+def test_variable_statistics(netcdf_file, chunk_size):
+    expected = get_expected(read_data(netcdf_file))
+    assert expected['count'] < SAMPLE_SIZE  # percentiles are exact
+    with netCDF4.Dataset(netcdf_file, 'r') as nc_dataset:
+        statistics = get_variable_statistics(nc_dataset['tau'], chunk_size=chunk_size)
+    assert statistics['count'] == expected['count']
+    assert statistics['nan_count'] == expected['nan_count']
+    assert statistics['valid_fraction'] == pytest.approx(expected['valid_fraction'])
+    assert statistics['minimum'] == expected['minimum']
+    assert statistics['maximum'] == expected['maximum']
+    assert statistics['mean'] == pytest.approx(expected['mean'])
+    assert statistics['percentiles'] == pytest.approx(expected['percentiles'])
+
+
+def test_sampled_percentiles():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 100, 20000)
+    statistics = StreamingStatistics(sample_size=1000)
+    for slab in np.array_split(values, 7):
+        statistics.update(slab)
+    result = statistics.result()
+    assert result['count'] == values.size
+    assert result['mean'] == pytest.approx(values.mean())
+    assert result['percentiles'][50] == pytest.approx(50, abs=5)  # estimated from a sample of the values
+
+
+def test_no_valid_values():
+    statistics = StreamingStatistics()
+    statistics.update(np.ma.masked_array([np.nan, 1.0, np.nan], mask=[False, True, False]))
+    assert statistics.result() == {
+        'count': 0, 'nan_count': 2, 'valid_fraction': 0.0, 'minimum': None, 'maximum': None, 'mean': None,
+        'percentiles': {}
+    }
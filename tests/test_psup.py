@@ -0,0 +1,22 @@
+"""Parsing of PSUP footprint strings."""
+import pytest
+
+from labtools.ias.psup import get_footprint_bbox, parse_footprint, parse_footprints
+
+
+def test_parse_footprint():
+    ring = parse_footprint('((-180,-90),(-180,90),(180,90),(180,-90))')
+    assert ring == ((-180, -90), (-180, 90), (180, 90), (180, -90), (-180, -90))
+    assert parse_footprint(' ( (1.5, -2e1) ,(3,4),(5,-6.25),(1.5,-2e1) ) ') == ((1.5, -20), (3, 4), (5, -6.25), (1.5, -20))
+    assert get_footprint_bbox('((10,0),(20,0),(20,5))') == [10, 0, 20, 5]
+    with pytest.raises(ValueError):
+        parse_footprint('__import__("os")')
+
+
+def test_parse_footprints():
+    footprints = ['((0,0),(1,0),(1,1))', '((0,0),(1,0),(1,1))', '((0,0),(1,0', '((2,2),(3,2),(3,3))']
+    rings = parse_footprints(footprints)
+    assert len(rings) == 4
+    assert rings[0] is rings[1] == ((0, 0), (1, 0), (1, 1), (0, 0))
+    assert rings[2] is None
+    assert rings[3] == parse_footprint(footprints[3])
@@ -0,0 +1,75 @@
+"""Cost-aware scheduling of tasks over worker processes, with task timeouts and crashed workers replacement."""
+import os
+import threading
+import time
+
+from labtools.scheduling import Scheduler, Task, TaskTimeoutError, WorkerError
+
+
+def get_pid(key):
+    return key, os.getpid()
+
+
+def sleep(duration):
+    time.sleep(duration)
+    return os.getpid()
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+def crash(exit_code):
+    os._exit(exit_code)
+
+
+def crash_once_idle(exit_code):
+    threading.Timer(0.1, os._exit, (exit_code,)).start()
+    return os.getpid()
+
+
+def test_largest_first():
+    scheduler = Scheduler(n_workers=1)
+    tasks = [Task(key, cost, get_pid, (key,)) for key, cost in [('a', 1), ('b', 30), ('c', 2.5), ('d', 10)]]
+    results = list(scheduler.run(tasks))
+    assert [key for key, result, error in results] == ['b', 'd', 'c', 'a']
+    assert all(error is None and result[0] == key for key, result, error in results)
+    assert len({result[1] for key, result, error in results}) == 1  # single worker process
+    assert os.getpid() not in {result[1] for key, result, error in results}
+
+
+def test_task_timeout():
+    scheduler = Scheduler(n_workers=1, task_timeout=0.5)
+    tasks = [Task('stalled', 10, sleep, (30,)), Task('quick', 1, sleep, (0,)), Task('failed', 0, fail, ('invalid',))]
+    start_time = time.monotonic()
+    results = {key: (result, error) for key, result, error in scheduler.run(tasks)}
+    assert time.monotonic() - start_time < 10
+    assert results['stalled'][0] is None and isinstance(results['stalled'][1], TaskTimeoutError)
+    assert results['quick'][1] is None
+    assert isinstance(results['failed'][1], ValueError) and str(results['failed'][1]) == 'invalid'
+    assert scheduler.n_timeouts == 1
+
+
+def test_worker_crash():
+    scheduler = Scheduler(n_workers=2)
+    tasks = [Task('crashed', 10, crash, (3,))] + [Task(i, 1, get_pid, (i,)) for i in range(6)]
+    results = {key: (result, error) for key, result, error in scheduler.run(tasks)}
+    assert isinstance(results['crashed'][1], WorkerError)
+    assert 'exit code 3' in str(results['crashed'][1])
+    assert all(results[i] == ((i, results[i][0][1]), None) for i in range(6))
+    assert scheduler.n_worker_errors == 1
+
+
+def test_worker_crash_while_idle():
+    scheduler = Scheduler(n_workers=1)
+    tasks = [Task('crashing', 10, crash_once_idle, (4,)), Task('assigned', 5, get_pid, ('assigned',)), Task('last', 1, get_pid, ('last',))]
+    results = {}
+    for key, result, error in scheduler.run(tasks):
+        results[key] = (result, error)
+        if key == 'crashing':
+            time.sleep(1)  # worker process exits before being assigned the next task
+    assert results['crashing'][1] is None
+    assert isinstance(results['assigned'][1], WorkerError)
+    assert 'exit code 4' in str(results['assigned'][1])
+    assert results['last'][1] is None and results['last'][0][1] != results['crashing'][0]
+    assert scheduler.n_worker_errors == 1
@@ -0,0 +1,24 @@
+"""Streaming aggregation of collections summaries."""
+from labtools.summaries import DistinctAggregator
+
+
+def test_distinct_values():
+    aggregator = DistinctAggregator(max_values=5)
+    for value in [['OMEGA', 'HRSC'], 'OMEGA', None, 'CRISM']:
+        aggregator.update(value)
+    assert aggregator.result() == ['CRISM', 'HRSC', 'OMEGA']
+
+
+def test_numeric_values_overflow():
+    aggregator = DistinctAggregator(max_values=5)
+    for value in range(20, 0, -1):
+        aggregator.update(value)
+    assert aggregator.result() == {'minimum': 1, 'maximum': 20}
+
+
+def test_non_numeric_values_overflow():
+    aggregator = DistinctAggregator(max_values=5)
+    for i in range(20, 0, -1):
+        aggregator.update(f'mission_{i:02d}')
+    assert aggregator.overflow
+    assert aggregator.result() == [f'mission_{i:02d}' for i in range(1, 6)]  # first values in sorted order
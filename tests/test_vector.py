@@ -0,0 +1,34 @@
+"""Streaming decoding of GeoJSON vector features data files."""
+import json
+
+from labtools.ias.vector import analyze_geojson, iter_geojson_features
+
+
+def create_feature(i, n_points):
+    coordinates = [[-180 + j * 360 / n_points, (-1) ** j * 45.0] for j in range(n_points)]
+    return {'type': 'Feature', 'properties': {'name': f'feature "{i}" [{{'}, 'geometry': {'type': 'LineString', 'coordinates': coordinates}}
+
+
+def test_features_spanning_several_chunks(tmp_path, monkeypatch):
+    features = [create_feature(0, 2), create_feature(1, 5000), create_feature(2, 3), create_feature(3, 2000)]
+    geojson_file = tmp_path / 'features.json'
+    with open(geojson_file, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'name': 'test', 'features': features}, f, indent=1)
+    chunk_size = 256
+    assert len(json.dumps(features[1])) > 100 * chunk_size
+
+    n_decodes = 0
+    raw_decode = json.JSONDecoder.raw_decode
+
+    def counting_raw_decode(self, *args, **kwargs):
+        nonlocal n_decodes
+        n_decodes += 1
+        return raw_decode(self, *args, **kwargs)
+
+    monkeypatch.setattr(json.JSONDecoder, 'raw_decode', counting_raw_decode)
+    assert list(iter_geojson_features(geojson_file, chunk_size=chunk_size)) == features
+    assert n_decodes < 40  # not once per chunk of the large features
+
+    summary = analyze_geojson(str(geojson_file))
+    assert summary['n_features'] == 4
+    assert summary['geometry_types'] == {'LineString': 4}